@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark the JSON codecs
+
+Encodes and decodes realistic Icinga 2 payloads with every installed codec:
+an ``Objects.list('Service')`` response, CheckResult events as read from the
+event stream and ``process-check-result`` request bodies.
+
+usage: python benchmarks/bench_codecs.py [number-of-services]
+'''
+
+from __future__ import print_function
+import json
+import sys
+import time
+
+from icinga2api.codec import available_codecs, get_codec
+from icinga2api.fakeserver import generate_hosts, generate_services
+
+
+def payloads(count):
+    '''
+    create the payloads, the events and check results are ten times fewer
+    '''
+
+    hosts = [host['name'] for host in generate_hosts(max(count // 10, 1))]
+    services = list(generate_services(hosts, 10))[:count]
+    response = json.dumps({'results': services}).encode('utf-8')
+    events = [json.dumps({
+        'type': 'CheckResult',
+        'timestamp': 1500000000.0,
+        'host': service['attrs']['host_name'],
+        'service': service['attrs']['name'],
+        'check_result': service['attrs']['last_check_result'],
+    }) for service in services[:count // 10]]
+    check_results = [{
+        'service': service['name'],
+        'exit_status': service['attrs']['state'],
+        'plugin_output': service['attrs']['last_check_result']['output'],
+        'performance_data':
+            service['attrs']['last_check_result']['performance_data'],
+    } for service in services[:count // 10]]
+    return response, events, check_results
+
+
+def timed(func, repeat=3):
+    '''
+    return the best duration of some runs
+    '''
+
+    durations = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        durations.append(time.time() - start)
+    return min(durations)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    response, events, check_results = payloads(count)
+    print('response: {0:.1f} MiB, {1} events, {2} check results'.format(
+        len(response) / 1024.0 / 1024.0, len(events), len(check_results)))
+    print('{0:<10} {1:>12} {2:>14} {3:>14}'.format(
+        'codec', 'list MiB/s', 'events/s', 'encodes/s'))
+    for name in available_codecs():
+        codec = get_codec(name)
+        decode = timed(lambda: codec.loads(response))
+        stream = timed(lambda: [codec.loads(event) for event in events])
+        encode = timed(lambda: [codec.dumps(payload)
+                                for payload in check_results])
+        print('{0:<10} {1:>12.1f} {2:>14.0f} {3:>14.0f}'.format(
+            name, len(response) / 1024.0 / 1024.0 / decode,
+            len(events) / stream, len(check_results) / encode))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark memory usage of Objects.list and Objects.iter_list
+
+Feeds a synthetic ``v1/objects/services`` response, generated chunk by chunk,
+through the decoding done by ``Objects.list`` (read the whole body, then
+``json.loads``) and through the incremental parser used by
+``Objects.iter_list``, and reports the peak memory of both.
+
+usage: python benchmarks/bench_objects_list.py [number-of-services]
+'''
+
+from __future__ import print_function
+import json
+import sys
+import time
+import tracemalloc
+
+from icinga2api.stream import STREAM_CHUNK_SIZE, iter_json_array
+
+
+def synthetic_service(i):
+    '''
+    create one service object as returned by the API
+    '''
+
+    return {
+        'attrs': {
+            'display_name': 'ping4',
+            'execution_time': 0.0123,
+            'groups': ['linux-services', 'network'],
+            'host_name': 'host{0}.example.com'.format(i // 10),
+            'last_check': 1500000000.0 + i,
+            'last_check_result': {
+                'exit_status': 0,
+                'output': 'PING OK - Packet loss = 0%, RTA = 0.05 ms',
+                'performance_data': [
+                    'rta=0.050000ms;3000.000000;5000.000000;0.000000',
+                    'pl=0%;80;100;0'],
+                'state': 0.0,
+            },
+            'latency': 0.0042,
+            'name': 'ping4-{0}'.format(i % 10),
+            'state': float(i % 4),
+            'vars': {'notes': 'synthetic service number {0}'.format(i)},
+        },
+        'joins': {},
+        'meta': {},
+        'name': 'host{0}.example.com!ping4-{1}'.format(i // 10, i % 10),
+        'type': 'Service',
+    }
+
+
+def synthetic_response(count, chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    yield the response body in chunks without building it completely
+    '''
+
+    pending = [b'{"results":[']
+    size = len(pending[0])
+    for i in range(count):
+        if i:
+            pending.append(b',')
+        data = json.dumps(synthetic_service(i)).encode('utf-8')
+        pending.append(data)
+        size += len(data) + 1
+        if size >= chunk_size:
+            data = b''.join(pending)
+            while len(data) >= chunk_size:
+                yield data[:chunk_size]
+                data = data[chunk_size:]
+            pending = [data]
+            size = len(data)
+    pending.append(b']}')
+    yield b''.join(pending)
+
+
+def list_path(count):
+    '''
+    what Objects.list does: read everything, decode everything
+    '''
+
+    body = b''.join(synthetic_response(count))
+    handled = 0
+    for _ in json.loads(body.decode('utf-8'))['results']:
+        handled += 1
+    return handled
+
+
+def iter_list_path(count):
+    '''
+    what Objects.iter_list does: decode one object at a time
+    '''
+
+    handled = 0
+    for _ in iter_json_array(synthetic_response(count)):
+        handled += 1
+    return handled
+
+
+def run(name, func, count):
+    '''
+    measure duration and peak memory of one path
+    '''
+
+    tracemalloc.start()
+    start = time.time()
+    handled = func(count)
+    duration = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('{0:<10} {1:>8} objects {2:>8.2f}s peak {3:>10.1f} MiB'.format(
+        name, handled, duration, peak / 1024.0 / 1024.0))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    run('list', list_path, count)
+    run('iter_list', iter_list_path, count)
+
+
+if __name__ == '__main__':
+    main()
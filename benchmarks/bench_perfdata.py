@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark the performance data parser
+
+Parses the performance data of synthetic check results with a naive regex
+parser, as found in most consumers, and with ``parse_perfdata``.
+
+Run it from anywhere, it benchmarks the checkout it is part of.
+
+usage: python benchmarks/bench_perfdata.py [number-of-check-results]
+'''
+
+from __future__ import print_function
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from icinga2api.perfdata import parse_perfdata_batch
+
+NAIVE = re.compile(
+    r"('[^']+'|[^ =]+)=([-+0-9.eE]+|U)([^;\s]*);?([^;\s]*);?([^;\s]*);?"
+    r"([^;\s]*);?([^;\s]*)")
+
+
+def naive_batch(batch):
+    '''
+    parse every value with one regex, no caching
+    '''
+
+    results = []
+    for perfdata in batch:
+        values = []
+        for item in perfdata:
+            for match in NAIVE.finditer(item):
+                label, value, unit, warn, crit, min_, max_ = match.groups()
+                values.append((label.strip("'"), float(value), unit, warn,
+                               crit, min_ and float(min_),
+                               max_ and float(max_)))
+        results.append(values)
+    return results
+
+
+def synthetic_batch(count):
+    '''
+    create the performance data of ping, disk and load checks
+    '''
+
+    batch = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            batch.append([
+                'rta={0:.6f}ms;3000.000000;5000.000000;0.000000'.format(i % 97 / 10.0),
+                'pl={0}%;80;100;0'.format(i % 5)])
+        elif kind == 1:
+            batch.append([
+                "'/var lib'={0}MB;15000;18000;0;20000".format(i % 20000),
+                '/={0}MB;15000;18000;0;20000'.format(i % 19000)])
+        else:
+            batch.append([
+                'load1={0:.3f};5;10;0'.format(i % 7 / 3.0),
+                'load5={0:.3f};4;6;0'.format(i % 5 / 3.0),
+                'load15={0:.3f};3;4;0'.format(i % 3 / 3.0)])
+    return batch
+
+
+def run(name, parser, batch):
+    '''
+    run one parser over the whole batch
+    '''
+
+    start = time.time()
+    results = parser(batch)
+    duration = time.time() - start
+    count = sum(len(values) for values in results)
+    print('{0:<10} {1:>8} values {2:>8.3f}s {3:>12.0f} values/s'.format(
+        name, count, duration, count / duration))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch = synthetic_batch(count)
+    run('naive', naive_batch, batch)
+    run('perfdata', parse_perfdata_batch, batch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark the event stream parser
+
+Replays a recorded event stream (one JSON event per line, as written by
+``curl -N .../v1/events``) through the old byte-by-byte parser and the
+buffered parser used by ``Events.subscribe``. Without a file a synthetic
+stream of CheckResult events is generated.
+
+usage: python benchmarks/bench_stream.py [recorded-stream-file]
+'''
+
+from __future__ import print_function
+import io
+import json
+import sys
+import time
+
+from icinga2api.base import Base
+from icinga2api.stream import STREAM_CHUNK_SIZE
+
+
+class ReplayResponse(object):
+    '''
+    minimal stand-in for a streamed requests.Response
+    '''
+
+    def __init__(self, data):
+        self.data = data
+
+    def iter_content(self, chunk_size=1):
+        stream = io.BytesIO(self.data)
+        chunk = stream.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = stream.read(chunk_size)
+
+    def close(self):
+        pass
+
+
+def old_get_message_from_stream(stream):
+    '''
+    the parser shipped up to 0.6.0
+    '''
+
+    message = ''
+    for char in stream.iter_content():
+        char = char.decode()
+        if char == '\n':
+            yield message
+            message = ''
+        else:
+            message += char
+
+
+def synthetic_stream(count):
+    '''
+    create a stream of CheckResult events
+    '''
+
+    lines = []
+    for i in range(count):
+        event = {
+            'check_result': {
+                'active': True,
+                'check_source': 'master1',
+                'command': ['/usr/lib/nagios/plugins/check_ping', '-H', '10.0.0.1'],
+                'execution_end': 1500000000.0 + i,
+                'execution_start': 1500000000.0 + i,
+                'exit_status': i % 3,
+                'output': u'PING OK - Packet loss = 0%, RTA = 0.05 ms ✓',
+                'performance_data': [
+                    'rta=0.050000ms;3000.000000;5000.000000;0.000000',
+                    'pl=0%;80;100;0'],
+                'schedule_end': 1500000000.0 + i,
+                'schedule_start': 1500000000.0 + i,
+                'state': i % 3,
+                'type': 'CheckResult',
+                'vars_after': {'attempt': 1.0, 'reachable': True, 'state': 0.0, 'state_type': 1.0},
+                'vars_before': {'attempt': 1.0, 'reachable': True, 'state': 0.0, 'state_type': 1.0},
+            },
+            'host': 'host{0}.example.com'.format(i % 1000),
+            'service': 'ping4',
+            'timestamp': 1500000000.0 + i,
+            'type': 'CheckResult',
+        }
+        lines.append(json.dumps(event, sort_keys=True, separators=(',', ':')))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def run(name, parser, data):
+    '''
+    run one parser over the whole stream
+    '''
+
+    start = time.time()
+    count = 0
+    for _ in parser(ReplayResponse(data)):
+        count += 1
+    duration = time.time() - start
+    print('{0:<10} {1:>8} events {2:>8.3f}s {3:>12.0f} events/s'.format(
+        name, count, duration, count / duration))
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as recorded:
+            data = recorded.read()
+    else:
+        data = synthetic_stream(5000)
+    print('stream size: {0} bytes, chunk size: {1}'.format(
+        len(data), STREAM_CHUNK_SIZE))
+    run('old', old_get_message_from_stream, data)
+    run('buffered', Base._get_message_from_stream, data)
+
+
+if __name__ == '__main__':
+    main()
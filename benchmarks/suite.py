@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark suite for the client's hot paths
+
+Runs every case against the fake API server (``icinga2api.fakeserver``),
+started in a separate process so it does not compete with the client for the
+GIL, and reports ops/s, p50/p99 latency and the peak memory of the client.
+
+  request          Base._request of a small query on a reused connection
+  request-setup    a new Client, its first connection and one query
+  list-1k/10k/100k Objects.list of 1k, 10k and 100k hosts
+  events           _get_message_from_stream reading CheckResult events
+  bulk-actions     Actions.process_check_results with 10 requests in flight
+
+Results can be saved and compared, the comparison fails if a case got slower
+than the threshold, e.g. before and after an upgrade:
+
+    python benchmarks/suite.py --save before.json
+    pip install --upgrade icinga2api
+    python benchmarks/suite.py --compare before.json
+
+usage: python benchmarks/suite.py [--cases request,events] [--save FILE]
+                                  [--compare FILE] [--threshold 0.2]
+'''
+
+from __future__ import print_function
+import argparse
+import json
+import platform
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import icinga2api
+from icinga2api.client import Client
+from icinga2api.instrumentation import RequestHook
+
+
+class LatencyHook(RequestHook):
+    '''
+    collect the total duration of every request
+    '''
+
+    def __init__(self):
+        self.latencies = []
+
+    def after_response(self, info):
+        self.latencies.append(info.timings.get('total', 0.0))
+
+
+class FakeServer(object):
+    '''
+    the fake API server in a child process
+    '''
+
+    def __init__(self, hosts, services_per_host=0, event_burst=0):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+        self.process = subprocess.Popen([
+            sys.executable, '-m', 'icinga2api.fakeserver',
+            '--port', str(self.port),
+            '--hosts', str(hosts),
+            '--services-per-host', str(services_per_host),
+            '--event-burst', str(event_burst),
+        ], stderr=subprocess.DEVNULL)
+        self.url = 'http://127.0.0.1:{0}/'.format(self.port)
+        self._wait()
+
+    def _wait(self, timeout=120):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('fake server exited')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), 1).close()
+                return
+            except socket.error:
+                time.sleep(0.1)
+        raise RuntimeError('fake server did not start')
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def percentile(values, share):
+    '''
+    return the nearest-rank percentile of values
+    '''
+
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(share * len(values) + 0.5)) - 1, len(values) - 1)
+    return values[max(index, 0)]
+
+
+def client_for(server, hook=None):
+    return Client(server.url, 'root', 'icinga', pool_maxsize=20,
+                  hooks=[hook] if hook else None)
+
+
+# every case takes the server and the number of repetitions and returns the
+# number of operations and the latencies in seconds
+
+def case_request(server, repeat):
+    hook = LatencyHook()
+    client = client_for(server, hook)
+    for _ in range(repeat * 500):
+        client.objects.list('Host', name='host000000.example.com',
+                            attrs=['name', 'state'])
+    return len(hook.latencies), hook.latencies
+
+
+def case_request_setup(server, repeat):
+    latencies = []
+    for _ in range(repeat * 100):
+        start = time.time()
+        client = client_for(server)
+        client.objects.list('Host', name='host000000.example.com',
+                            attrs=['name', 'state'])
+        client.close()
+        latencies.append(time.time() - start)
+    return len(latencies), latencies
+
+
+def case_list(server, repeat):
+    client = client_for(server)
+    latencies = []
+    objects = 0
+    for _ in range(repeat):
+        start = time.time()
+        objects += len(client.objects.list('Host'))
+        latencies.append(time.time() - start)
+    return objects, latencies
+
+
+def case_events(server, repeat):
+    client = client_for(server)
+    latencies = []
+    events = 0
+    for number in range(repeat):
+        start = time.time()
+        for _ in client.events.subscribe(['CheckResult'],
+                                         'bench-{0}'.format(number)):
+            events += 1
+        latencies.append(time.time() - start)
+    return events, latencies
+
+
+def case_bulk_actions(server, repeat):
+    client = client_for(server)
+    results = [{'object_type': 'Service',
+                'name': 'host{0:06d}.example.com!ping4'.format(number % 100),
+                'exit_status': number % 3,
+                'plugin_output': 'PING OK',
+                'performance_data': ['rta=0.5ms;100;500;0', 'pl=0%;80;100']}
+               for number in range(repeat * 1000)]
+    bulk = client.actions.process_check_results(results, max_in_flight=10)
+    if bulk.failed:
+        raise RuntimeError('{0} actions failed'.format(len(bulk.failed)))
+    return len(bulk.items), [item.duration for item in bulk.items]
+
+
+# (name, function, unit, repetitions, server arguments)
+CASES = [
+    ('request', case_request, 'requests', 2, {'hosts': 10}),
+    ('request-setup', case_request_setup, 'clients', 2, {'hosts': 10}),
+    ('list-1k', case_list, 'objects', 20, {'hosts': 1000}),
+    ('list-10k', case_list, 'objects', 5, {'hosts': 10000}),
+    ('list-100k', case_list, 'objects', 2, {'hosts': 100000}),
+    ('events', case_events, 'events', 5,
+     {'hosts': 100, 'services_per_host': 10, 'event_burst': 50000}),
+    ('bulk-actions', case_bulk_actions, 'actions', 2,
+     {'hosts': 100, 'services_per_host': 5}),
+]
+
+
+def run_case(name, function, unit, repeat, server_args):
+    '''
+    time a case, then run it once more with tracemalloc for the peak memory
+    '''
+
+    server = FakeServer(**server_args)
+    try:
+        function(server, 1)  # warm up
+        start = time.time()
+        operations, latencies = function(server, repeat)
+        duration = time.time() - start
+        tracemalloc.start()
+        function(server, 1)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        server.close()
+    return {
+        'case': name,
+        'unit': unit,
+        'operations': operations,
+        'ops_per_sec': operations / duration,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'peak_mib': peak / 1024.0 / 1024.0,
+    }
+
+
+def print_results(results):
+    print('{0:<14} {1:>10} {2:>14} {3:>10} {4:>10} {5:>10}'.format(
+        'case', 'unit', 'ops/s', 'p50 ms', 'p99 ms', 'peak MiB'))
+    for result in results:
+        print('{0:<14} {1:>10} {2:>14.1f} {3:>10.2f} {4:>10.2f} '
+              '{5:>10.1f}'.format(
+                  result['case'], result['unit'], result['ops_per_sec'],
+                  result['p50'] * 1000, result['p99'] * 1000,
+                  result['peak_mib']))
+
+
+def compare(results, baseline, threshold):
+    '''
+    print the changes against a baseline, return the regressed cases
+
+    A case regressed if its ops/s dropped or its p99 latency grew by more
+    than the threshold.
+    '''
+
+    previous = dict((result['case'], result) for result in baseline['results'])
+    regressions = []
+    print()
+    print('compared to {0} (python {1})'.format(
+        baseline.get('version'), baseline.get('python')))
+    for result in results:
+        old = previous.get(result['case'])
+        if old is None:
+            continue
+        speed = result['ops_per_sec'] / old['ops_per_sec'] - 1
+        p99 = result['p99'] / old['p99'] - 1 if old['p99'] else 0.0
+        regressed = speed < -threshold or p99 > threshold
+        if regressed:
+            regressions.append(result['case'])
+        print('{0:<14} ops/s {1:>+7.1%}  p99 {2:>+7.1%}  {3}'.format(
+            result['case'], speed, p99, 'REGRESSION' if regressed else 'ok'))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--cases', help='comma separated case names')
+    parser.add_argument('--save', help='write the results to this file')
+    parser.add_argument('--compare', help='compare to results of this file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown, default 0.2 (20%%)')
+    args = parser.parse_args()
+
+    selected = set(args.cases.split(',')) if args.cases else None
+    results = []
+    for name, function, unit, repeat, server_args in CASES:
+        if selected is None or name in selected:
+            results.append(run_case(name, function, unit, repeat,
+                                    server_args))
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as output:
+            json.dump({'version': icinga2api.__version__,
+                       'python': platform.python_version(),
+                       'time': time.time(),
+                       'results': results}, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline),
+                                  args.threshold)
+        if regressions:
+            print('slower: {0}'.format(', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -31,12 +31,78 @@ programmatic way using HTTP requests.
 
 from __future__ import print_function
 import logging
+import re
+import time
+
+from requests.exceptions import ReadTimeout, RequestException
 
 from icinga2api.base import Base
+from icinga2api.bulk import ChunkSizer, run_bulk, settle_chunks
 from icinga2api.exceptions import Icinga2ApiException
 
 LOG = logging.getLogger(__name__)
 
+# actions creating something on every call, after a read timeout the server
+# may have applied them, so their chunks are not split and sent again
+NON_IDEMPOTENT_ACTIONS = frozenset([
+    'add_comment',
+    'schedule_downtime',
+    'send_custom_notification',
+])
+
+# the object names quoted in the status of an action result
+_QUOTED = re.compile(r"'([^']*)'")
+
+
+def split_results(results, names):
+    '''
+    split the per object results of an action into the applied and the
+    failed objects
+
+    Icinga answers 200 if the action succeeded for any object and reports
+    every object's outcome in its result. Results without a name are
+    matched by the object names quoted in their status, failed results
+    matching no name are attributed to the names without a result.
+
+    :param results: the per object results of the response
+    :type results: list
+    :param names: the object names the action was sent for
+    :type names: list
+    :returns: the results of the applied objects and the error of every
+              failed object name
+    :rtype: tuple of list and dictionary
+    '''
+
+    applied = []
+    errors = {}
+    unnamed = []
+    known = set(names)
+    seen = set()
+    for result in results:
+        name = result.get('name')
+        if name is None:
+            name = next((quoted for quoted in
+                         _QUOTED.findall(result.get('status') or '')
+                         if quoted in known), None)
+        if name is not None:
+            seen.add(name)
+        if 200 <= int(result.get('code', 200)) <= 299:
+            applied.append(result)
+            continue
+        error = Icinga2ApiException(
+            'Action failed with status {0}: {1}'.format(
+                int(result.get('code')), result.get('status')),
+            result)
+        if name is None:
+            unnamed.append(error)
+        else:
+            errors[name] = error
+    if unnamed:
+        for name in names:
+            if name not in seen:
+                errors[name] = unnamed[0]
+    return applied, errors
+
 
 class Actions(Base):
     '''
@@ -66,6 +132,9 @@ class Actions(Base):
         :type filter: integer
         :param plugin_output: plugins main ouput
         :type plugin_output: string
+        :param performance_data: performance data as strings or
+                                 PerfdataValue objects
+        :type performance_data: list
         :param check_command: check command path followed by its arguments
         :type check_command: list
         :param check_source: name of the command_endpoint
@@ -98,6 +167,8 @@ class Actions(Base):
         }
 
         if performance_data:
+            if isinstance(performance_data, (list, tuple)):
+                performance_data = [str(value) for value in performance_data]
             payload['performance_data'] = performance_data
         if check_command:
             payload['check_command'] = check_command
@@ -108,6 +179,133 @@ class Actions(Base):
 
         return self._request('POST', url, payload)
 
+    def process_check_results(self, results, max_in_flight=10):
+        '''
+        Process many check results concurrently.
+
+        Every result is submitted with its own request, at most max_in_flight
+        at the same time. A failing result does not abort the others, check
+        the returned BulkResult for the outcome of every item. Set the
+        client's pool_maxsize to at least max_in_flight so that all
+        connections are reused.
+
+        example 1:
+        bulk = process_check_results(
+            [{'object_type': 'Service',
+              'name': 'myhost.domain!passive',
+              'exit_status': 0,
+              'plugin_output': 'OK'}],
+            max_in_flight=20)
+        for item in bulk.failed:
+            print(item.item, item.error)
+        print(bulk.stats())
+
+        :param results: the keyword arguments of process_check_result for
+                        every check result
+        :type results: iterable of dictionaries
+        :param max_in_flight: maximum number of concurrent requests
+        :type max_in_flight: int
+        :returns: the outcome of every check result
+        :rtype: BulkResult
+        '''
+
+        return run_bulk(
+            lambda result: self.process_check_result(**result),
+            results,
+            max_in_flight
+        )
+
+    def run_chunked(self,
+                    action,
+                    object_type,
+                    names,
+                    chunk_size=500,
+                    max_in_flight=4,
+                    target_duration=2.0,
+                    **kwargs):
+        '''
+        Run an action for a list of objects in chunks.
+
+        Instead of one huge filter or one request per object, the names are
+        sent in chunks as filter_vars of the filter
+        ``host.__name in names`` (``service.__name`` for services), at most
+        max_in_flight chunks at the same time. The chunk size adapts to the
+        response times, see ``icinga2api.bulk.ChunkSizer``. A failing chunk
+        is split in halves and retried until single objects fail. The item
+        of a chunk keeps the results of its applied objects, its error is a
+        ``ChunkError`` with the error of every failed object. Chunks of
+        ``NON_IDEMPOTENT_ACTIONS`` are not split after a read timeout, the
+        server may have applied them; all their objects are reported failed.
+
+        example 1:
+        bulk = run_chunked('remove_acknowledgement', 'Host', host_names)
+        print(bulk.merged_results())
+        print(bulk.object_errors())
+
+        :param action: the name of an action taking object_type, filters and
+                       filter_vars, e.g. ``schedule_downtime``
+        :type action: string
+        :param object_type: Host or Service
+        :type object_type: string
+        :param names: the object names, host!service for services
+        :type names: list
+        :param chunk_size: the initial number of names per request
+        :type chunk_size: int
+        :param max_in_flight: maximum number of concurrent requests
+        :type max_in_flight: int
+        :param target_duration: the desired duration of a request in seconds
+        :type target_duration: float
+        :param kwargs: further arguments of the action
+        :returns: the outcome of every chunk, its item are the names and
+                  its result the per object results
+        :rtype: BulkResult
+        '''
+
+        sizer = ChunkSizer(chunk_size, target_duration=target_duration)
+        return settle_chunks(run_bulk(
+            lambda chunk: self._run_chunk(
+                getattr(self, action), object_type, chunk, sizer, kwargs),
+            sizer.chunks(list(names)),
+            max_in_flight
+        ))
+
+    def _run_chunk(self, action, object_type, names, sizer, kwargs):
+        '''
+        run an action for one chunk of names, split it when it fails
+
+        Objects failing in a successful response are not sent again.
+
+        :returns: the per object results of the applied names and the error
+                  of every failed name
+        :rtype: tuple of list and dictionary
+        '''
+
+        start = time.time()
+        try:
+            result = action(
+                object_type=object_type,
+                filters='{0}.__name in names'.format(object_type.lower()),
+                filter_vars={'names': names},
+                **kwargs
+            )
+        except (Icinga2ApiException, RequestException) as error:
+            sizer.record(len(names), time.time() - start, failed=True)
+            if len(names) == 1 or (
+                    isinstance(error, ReadTimeout) and
+                    action.__name__ in NON_IDEMPOTENT_ACTIONS):
+                return [], dict((name, error) for name in names)
+            LOG.debug("Chunk of %d objects failed, splitting: %s",
+                      len(names), error)
+            half = len(names) // 2
+            results, errors = self._run_chunk(
+                action, object_type, names[:half], sizer, kwargs)
+            more_results, more_errors = self._run_chunk(
+                action, object_type, names[half:], sizer, kwargs)
+            errors.update(more_errors)
+            return results + more_results, errors
+        sizer.record(len(names), time.time() - start)
+        return split_results(result['results'], names)
+
     def reschedule_check(self,
                          object_type,
                          filters,
@@ -291,6 +489,45 @@ class Actions(Base):
 
         return self._request('POST', url, payload)
 
+    def acknowledge_problems(self,
+                             object_type,
+                             names,
+                             author,
+                             comment,
+                             chunk_size=500,
+                             max_in_flight=4,
+                             **kwargs):
+        '''
+        Acknowledge the problems of many objects given by name in chunks,
+        see ``run_chunked``.
+
+        example 1:
+        bulk = acknowledge_problems('Host', host_names, 'icingaadmin',
+                                    'Known issue', sticky=True)
+        print(len(bulk.merged_results()), bulk.object_errors())
+
+        :param object_type: Host or Service
+        :type object_type: string
+        :param names: the object names, host!service for services
+        :type names: list
+        :param author: name of the author
+        :type author: string
+        :param comment: comment text
+        :type comment: string
+        :param chunk_size: the initial number of names per request
+        :type chunk_size: int
+        :param max_in_flight: maximum number of concurrent requests
+        :type max_in_flight: int
+        :param kwargs: further arguments of acknowledge_problem
+        :returns: the outcome of every chunk
+        :rtype: BulkResult
+        '''
+
+        return self.run_chunked(
+            'acknowledge_problem', object_type, names,
+            chunk_size=chunk_size, max_in_flight=max_in_flight,
+            author=author, comment=comment, **kwargs)
+
     def remove_acknowledgement(self,
                                object_type,
                                filters,
@@ -487,6 +724,56 @@ class Actions(Base):
 
         return self._request('POST', url, payload)
 
+    def schedule_downtimes(self,
+                           object_type,
+                           names,
+                           author,
+                           comment,
+                           start_time,
+                           end_time,
+                           duration,
+                           chunk_size=500,
+                           max_in_flight=4,
+                           **kwargs):
+        '''
+        Schedule a downtime for many objects given by name in chunks, see
+        ``run_chunked``.
+
+        example 1:
+        bulk = schedule_downtimes('Host', host_names, 'icingaadmin',
+                                  'Maintenance', 1446388806, 1446389806,
+                                  1000, fixed=True)
+        print(len(bulk.merged_results()), bulk.object_errors())
+
+        :param object_type: Host or Service
+        :type object_type: string
+        :param names: the object names, host!service for services
+        :type names: list
+        :param author: name of the author
+        :type author: string
+        :param comment: comment text
+        :type comment: string
+        :param start_time: timestamp marking the beginning
+        :type start_time: string
+        :param end_time: timestamp marking the end
+        :type end_time: string
+        :param duration: duration of the downtime in seconds
+        :type duration: int
+        :param chunk_size: the initial number of names per request
+        :type chunk_size: int
+        :param max_in_flight: maximum number of concurrent requests
+        :type max_in_flight: int
+        :param kwargs: further arguments of schedule_downtime
+        :returns: the outcome of every chunk
+        :rtype: BulkResult
+        '''
+
+        return self.run_chunked(
+            'schedule_downtime', object_type, names,
+            chunk_size=chunk_size, max_in_flight=max_in_flight,
+            author=author, comment=comment, start_time=start_time,
+            end_time=end_time, duration=duration, **kwargs)
+
     def remove_downtime(self,
                         object_type,
                         name=None,
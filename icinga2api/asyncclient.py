@@ -0,0 +1,990 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API asyncio client
+
+Async counterpart of ``icinga2api.client.Client`` based on aiohttp. The API
+classes inherit from the synchronous ones, so the payloads are built by the
+same code and both clients stay in step.
+'''
+
+import asyncio
+import logging
+import ssl
+import sys
+import time
+
+import aiohttp
+# pylint: disable=import-error,no-name-in-module
+if sys.version_info >= (3, 0):
+    from urllib.parse import urljoin
+else:
+    from urlparse import urljoin
+# pylint: enable=import-error,no-name-in-module
+
+from icinga2api.actions import (
+    NON_IDEMPOTENT_ACTIONS,
+    Actions,
+    split_results
+)
+from icinga2api.base import Base
+from icinga2api.bulk import (
+    BulkItemResult,
+    BulkResult,
+    ChunkSizer,
+    _reindex,
+    settle_chunks
+)
+from icinga2api.cache import MISSING
+from icinga2api.columnar import ColumnarResult
+from icinga2api.endpoints import ROUND_ROBIN, EndpointPool
+from icinga2api.exceptions import (
+    Icinga2ApiCircuitOpenException,
+    Icinga2ApiException
+)
+from icinga2api.client import Client
+from icinga2api.events import Events, SubscriptionStats
+from icinga2api.eventtypes import decode_event
+from icinga2api.instrumentation import RequestInfo, call_hooks
+from icinga2api.objects import Objects
+from icinga2api.retry import FAILURE_STATUSES
+from icinga2api.status import Status
+from icinga2api.stream import (
+    STREAM_CHUNK_SIZE,
+    JsonArrayParser,
+    MessageSplitter
+)
+from icinga2api.sync import diff_objects, query_attrs
+
+LOG = logging.getLogger(__name__)
+
+
+async def run_bulk_async(func, items, max_in_flight=10):
+    '''
+    await func for every item with at most max_in_flight concurrent calls,
+    see ``icinga2api.bulk.run_bulk``
+
+    :param func: the coroutine function to call with each item
+    :type func: callable
+    :param items: the input items
+    :type items: iterable
+    :param max_in_flight: maximum number of concurrent calls
+    :type max_in_flight: int
+    :returns: the results of all items
+    :rtype: BulkResult
+    '''
+
+    start = time.time()
+    results = []
+    items = enumerate(items)
+
+    async def worker():
+        for index, item in items:
+            item_start = time.time()
+            try:
+                result = await func(item)
+            except Exception as error:  # pylint: disable=broad-except
+                LOG.debug("Bulk item #%s failed: %s", index, error)
+                results.append(BulkItemResult(
+                    index, item, error=error,
+                    duration=time.time() - item_start))
+            else:
+                results.append(BulkItemResult(
+                    index, item, result=result,
+                    duration=time.time() - item_start))
+
+    await asyncio.gather(*[worker() for _ in range(max_in_flight)])
+
+    results.sort(key=lambda result: result.index)
+    return BulkResult(results, time.time() - start)
+
+
+async def run_bulk_tiers_async(func, tiers, max_in_flight=10):
+    '''
+    await func for the items of every tier, see
+    ``icinga2api.bulk.run_bulk_tiers``
+    '''
+
+    start = time.time()
+    results = []
+    for tier in tiers:
+        indices = [index for index, _ in tier]
+        tier_result = await run_bulk_async(
+            func, [item for _, item in tier], max_in_flight)
+        results.extend(_reindex(tier_result.items, indices))
+
+    results.sort(key=lambda result: result.index)
+    return BulkResult(results, time.time() - start)
+
+
+class AsyncTransport(object):
+    '''
+    Icinga 2 API asyncio transport class
+
+    Keeps one ``aiohttp.ClientSession`` per client. The session is created on
+    the first request, inside the running event loop.
+    '''
+
+    def __init__(self,
+                 manager,
+                 pool_connections=10,
+                 pool_maxsize=10,
+                 pool_block=True,
+                 max_idle=None,
+                 retry_policy=None,
+                 circuit_breaker=None,
+                 write_url=None,
+                 balancing=ROUND_ROBIN,
+                 health_check_interval=None,
+                 hooks=None):
+        '''
+        initialize object
+
+        :param manager: the client owning this transport
+        :type manager: AsyncClient
+        :param pool_connections: number of hosts to keep connections for
+        :type pool_connections: int
+        :param pool_maxsize: maximum number of connections per host
+        :type pool_maxsize: int
+        :param pool_block: ignored, aiohttp always waits for a free
+                           connection
+        :type pool_block: bool
+        :param max_idle: close keep-alive connections after this many
+                         seconds without a request
+        :type max_idle: float
+        :param retry_policy: retry failed requests
+        :type retry_policy: RetryPolicy
+        :param circuit_breaker: fail fast while the API is down
+        :type circuit_breaker: CircuitBreaker
+        :param write_url: preferred endpoint for writes
+        :type write_url: string
+        :param balancing: spread reads 'round-robin' or by 'least-latency'
+        :type balancing: string
+        :param health_check_interval: check all endpoints in a background
+                                      task every this many seconds
+        :type health_check_interval: float
+        :param hooks: called around every request, see
+                      ``icinga2api.instrumentation.RequestHook``
+        :type hooks: list
+        '''
+
+        self.manager = manager
+        self.hooks = list(hooks or [])
+        self.endpoints = EndpointPool(
+            manager.urls,
+            strategy=balancing,
+            write_url=write_url
+        )
+        self.health_check_interval = health_check_interval
+        self._health_check_task = None
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_idle = max_idle
+        self.session = None
+        self.counters = {
+            'requests': 0,
+            'new_connections': 0,
+            'reused_connections': 0,
+            'retries': 0,
+            'failovers': 0,
+        }
+
+    def _create_ssl_context(self):
+        '''
+        create the ssl context for certificate auth and server verification
+        '''
+
+        if self.manager.ca_certificate:
+            context = ssl.create_default_context(
+                cafile=self.manager.ca_certificate)
+        else:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        # prefer certificate authentification
+        if self.manager.certificate:
+            context.load_cert_chain(self.manager.certificate, self.manager.key)
+        return context
+
+    def _create_trace_config(self):
+        '''
+        count new and reused connections and measure the phases of
+        instrumented requests
+        '''
+
+        counters = self.counters
+
+        def mark(context, name):
+            setattr(context, name, time.time())
+
+        def measure(context, phase, since):
+            info = context.trace_request_ctx
+            start = getattr(context, since, None)
+            if info is not None and start is not None:
+                info.timings[phase] = time.time() - start
+
+        async def on_request_start(session, context, params):
+            counters['requests'] += 1
+
+        async def on_dns_resolvehost_start(session, context, params):
+            mark(context, 'dns_start')
+
+        async def on_dns_resolvehost_end(session, context, params):
+            measure(context, 'dns', 'dns_start')
+
+        async def on_connection_create_start(session, context, params):
+            mark(context, 'connect_start')
+
+        async def on_connection_create_end(session, context, params):
+            counters['new_connections'] += 1
+            measure(context, 'connect', 'connect_start')
+
+        async def on_connection_reuseconn(session, context, params):
+            counters['reused_connections'] += 1
+
+        async def on_request_chunk_sent(session, context, params):
+            mark(context, 'sent')
+
+        async def on_request_headers_sent(session, context, params):
+            if getattr(context, 'sent', None) is None:
+                mark(context, 'sent')
+
+        async def on_request_end(session, context, params):
+            measure(context, 'server', 'sent')
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        trace_config.on_connection_create_start.append(
+            on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+        if hasattr(trace_config, 'on_request_headers_sent'):
+            trace_config.on_request_headers_sent.append(
+                on_request_headers_sent)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    def _create_session(self):
+        '''
+        create a session object
+        '''
+
+        auth = None
+        if not self.manager.certificate and \
+                self.manager.username and self.manager.password:
+            # use username and password
+            auth = aiohttp.BasicAuth(self.manager.username,
+                                     self.manager.password)
+        connector_args = {
+            'limit': self.pool_connections * self.pool_maxsize,
+            'limit_per_host': self.pool_maxsize,
+            'ssl': self._create_ssl_context(),
+        }
+        if self.max_idle is not None:
+            connector_args['keepalive_timeout'] = self.max_idle
+
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(**connector_args),
+            auth=auth,
+            headers={
+                'User-Agent': 'Python-icinga2api/{0}'.format(
+                    self.manager.version),
+                'Accept': 'application/json'
+            },
+            trace_configs=[self._create_trace_config()],
+        )
+
+    async def request(self, method, url_path, payload=None, stream=False,
+                      timeout=None):
+        '''
+        send a request over the pooled session
+
+        :param method: the HTTP method
+        :type method: string
+        :param url_path: the requested url path
+        :type url_path: string
+        :param payload: the payload to send
+        :type payload: dictionary
+        :param stream: do not read the response body
+        :type stream: bool
+        :param timeout: overrides the client's timeout, a tuple sets the
+                        connect and read timeout
+        :type timeout: float or tuple
+        :returns: the response
+        :rtype: aiohttp.ClientResponse
+        '''
+
+        if self.session is None:
+            self.session = self._create_session()
+            if self.health_check_interval:
+                self._health_check_task = asyncio.ensure_future(
+                    self._run_health_checks(self.health_check_interval))
+
+        if isinstance(timeout, tuple):
+            timeout = aiohttp.ClientTimeout(
+                total=None, sock_connect=timeout[0], sock_read=timeout[1])
+        elif stream and not timeout:
+            timeout = aiohttp.ClientTimeout(total=None)
+        else:
+            timeout = timeout or self.manager.timeout
+            timeout = aiohttp.ClientTimeout(
+                total=float(timeout) if timeout else None)
+
+        headers = {'X-HTTP-Method-Override': method.upper()}
+        data = None
+        if payload:
+            data = self.manager.codec.dumps(payload)
+            headers['Content-Type'] = 'application/json'
+
+        # event streams are reads, although sent with POST
+        write = not stream and method.upper() != 'GET'
+        attempt = 0
+        tried = set()
+        while True:
+            endpoint = self.endpoints.select(write, tried)
+            if endpoint is None:
+                tried.clear()
+                endpoint = self.endpoints.select(write)
+            request_url = urljoin(endpoint.url, url_path)
+            LOG.debug("Request URL: %s", request_url)
+
+            if self.circuit_breaker is not None and \
+                    not self.circuit_breaker.allow():
+                raise Icinga2ApiCircuitOpenException(
+                    'Circuit breaker is open, not sending "{0}".'.format(
+                        request_url))
+
+            info = None
+            if self.hooks:
+                info = RequestInfo(method, url_path, endpoint.url, attempt,
+                                   len(data or b''))
+                call_hooks(self.hooks, 'before_send', info)
+
+            start = time.time()
+            try:
+                response = await self.session.post(
+                    request_url,
+                    data=data,
+                    headers=headers,
+                    timeout=timeout,
+                    trace_request_ctx=info,
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                if info is not None:
+                    info.finish()
+                    call_hooks(self.hooks, 'on_error', info, error)
+                self._record(endpoint, False)
+                connect_error = isinstance(
+                    error, aiohttp.ClientConnectorError)
+                if self._failover(endpoint, tried, not write or connect_error):
+                    continue
+                if not await self._retry(method, attempt, error=error,
+                                         connect_error=connect_error):
+                    raise
+                tried.clear()
+                attempt += 1
+                continue
+
+            status = response.status
+            self._record(endpoint, status not in FAILURE_STATUSES,
+                         time.time() - start)
+            response.hook_info = info
+            if info is not None:
+                info.status = status
+            if status in (502, 503, 504) and self._failover(
+                    endpoint, tried, not write or status == 503):
+                self.finish_request(info)
+                response.release()
+                continue
+            if not await self._retry(method, attempt,
+                                     status=status,
+                                     retry_after=response.headers.get(
+                                         'Retry-After'),
+                                     response=response):
+                return response
+            self.finish_request(info)
+            tried.clear()
+            attempt += 1
+
+    def finish_request(self, info, response_size=None):
+        '''
+        call the after_response hooks for a request, see
+        ``Transport.finish_request``
+        '''
+
+        if info is None:
+            return
+        if response_size is not None:
+            info.response_size = response_size
+        info.finish()
+        call_hooks(self.hooks, 'after_response', info)
+
+    def _record(self, endpoint, success, duration=None):
+        '''
+        report the outcome of an attempt to the endpoint pool and the
+        circuit breaker
+        '''
+
+        if success:
+            self.endpoints.record_success(endpoint, duration)
+        else:
+            self.endpoints.record_failure(endpoint)
+        if self.circuit_breaker is None:
+            return
+        if success:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+
+    def _failover(self, endpoint, tried, allowed):
+        '''
+        switch to another endpoint for the same request, see
+        ``Transport._failover``
+        '''
+
+        tried.add(endpoint)
+        if not allowed or not self.endpoints.has_alternative(tried):
+            return False
+        LOG.debug("Failing over from %s", endpoint.url)
+        self.counters['failovers'] += 1
+        return True
+
+    async def check_endpoints(self):
+        '''
+        check the health of every endpoint and update its state
+
+        :returns: True for every healthy endpoint url
+        :rtype: dictionary
+        '''
+
+        if self.session is None:
+            self.session = self._create_session()
+        health = {}
+        for endpoint in self.endpoints.endpoints:
+            start = time.time()
+            try:
+                response = await self.session.post(
+                    urljoin(endpoint.url, 'v1/status/IcingaApplication'),
+                    headers={'X-HTTP-Method-Override': 'GET'},
+                    timeout=aiohttp.ClientTimeout(
+                        total=float(self.manager.timeout)
+                        if self.manager.timeout else None),
+                )
+                response.release()
+                healthy = response.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                LOG.debug("Health check of %s failed: %s", endpoint.url, error)
+                healthy = False
+            if healthy:
+                self.endpoints.record_success(endpoint, time.time() - start)
+            else:
+                self.endpoints.record_failure(endpoint)
+            health[endpoint.url] = healthy
+        return health
+
+    async def _run_health_checks(self, interval):
+        '''
+        check the endpoints until the transport is closed
+        '''
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.check_endpoints()
+            except Exception as error:  # pylint: disable=broad-except
+                LOG.warning("Health check failed: %s", error)
+
+    async def _retry(self, method, attempt, status=None, error=None,
+                     connect_error=False, retry_after=None, response=None):
+        '''
+        wait before retrying if the retry policy allows another attempt
+
+        :returns: True if the request should be sent again
+        :rtype: bool
+        '''
+
+        policy = self.retry_policy
+        if policy is None or not policy.should_retry(
+                method, attempt, status, error, connect_error):
+            return False
+        delay = policy.delay(attempt, retry_after)
+        LOG.debug("Retrying %s request in %.2fs (attempt %s): %s",
+                  method, delay, attempt + 1, error or status)
+        if response is not None:
+            response.release()
+        self.counters['retries'] += 1
+        await asyncio.sleep(delay)
+        return True
+
+    def stats(self):
+        '''
+        return connection reuse counters
+
+        :returns: number of requests, new and reused connections
+        :rtype: dictionary
+        '''
+
+        return dict(self.counters)
+
+    async def close(self):
+        '''
+        close all pooled connections
+        '''
+
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class AsyncBase(Base):
+    '''
+    Icinga 2 API asyncio base class
+    '''
+
+    async def _request(self, method, url_path, payload=None, stream=False,
+                       timeout=None):
+        '''
+        make the request and return the body
+
+        :param method: the HTTP method
+        :type method: string
+        :param url_path: the requested url path
+        :type url_path: string
+        :param payload: the payload to send
+        :type payload: dictionary
+        :param stream: return the response without reading the body
+        :type stream: bool
+        :param timeout: overrides the client's timeout
+        :type timeout: float or tuple
+        :returns: the response as json
+        :rtype: dictionary
+        '''
+
+        response = await self.manager.transport.request(
+            method,
+            url_path,
+            payload,
+            stream=stream,
+            timeout=timeout
+        )
+
+        info = getattr(response, 'hook_info', None)
+        transport = self.manager.transport
+        if not 200 <= response.status <= 299:
+            text = await response.text()
+            response.release()
+            transport.finish_request(info, len(text))
+            raise self._request_failed(response.url, response.status, text)
+
+        if stream:
+            transport.finish_request(info)
+            return response
+        try:
+            content = await response.read()
+        finally:
+            response.release()
+        if info is None:
+            return self.manager.codec.loads(content)
+        start = time.time()
+        result = self.manager.codec.loads(content)
+        info.timings['decode'] = time.time() - start
+        transport.finish_request(info, len(content))
+        return result
+
+    @staticmethod
+    async def _get_message_from_stream(stream):
+        '''
+        split the streamed response into messages
+
+        :param stream: the stream
+        :type stream: aiohttp.ClientResponse
+        :returns: the messages
+        :rtype: string
+        '''
+
+        splitter = MessageSplitter()
+        try:
+            while True:
+                chunk = await stream.content.readany()
+                if not chunk:
+                    break
+                for message in splitter.split(chunk):
+                    yield message
+            for message in splitter.flush():
+                yield message
+        finally:
+            stream.close()
+
+
+class AsyncObjects(AsyncBase, Objects):
+    '''
+    Icinga 2 API asyncio objects class
+
+    ``create``, ``update`` and ``delete`` are inherited and return awaitables.
+    '''
+
+    async def get(self,
+                  object_type,
+                  name,
+                  attrs=None,
+                  joins=None):
+        '''
+        get object by type or name, see ``Objects.get``
+        '''
+
+        return (await self.list(object_type, name, attrs, joins=joins))[0]
+
+    async def list(self,
+                   object_type,
+                   name=None,
+                   attrs=None,
+                   filters=None,
+                   filter_vars=None,
+                   joins=None):
+        '''
+        get object by type or name, see ``Objects.list``
+        '''
+
+        url_path, payload = self._list_request(
+            object_type,
+            name,
+            attrs,
+            filters,
+            filter_vars,
+            joins
+        )
+
+        if self.cache is None:
+            return (await self._request('GET', url_path, payload))['results']
+
+        key = self.cache.make_key(
+            object_type, name, attrs, filters, filter_vars, joins)
+        results = self.cache.get(key)
+        if results is MISSING:
+            results = (await self._request('GET', url_path, payload))['results']
+            self.cache.set(key, results)
+        return results
+
+    async def iter_list(self,
+                        object_type,
+                        name=None,
+                        attrs=None,
+                        filters=None,
+                        filter_vars=None,
+                        joins=None,
+                        chunk_size=STREAM_CHUNK_SIZE):
+        '''
+        get objects by type or name, one at a time, see ``Objects.iter_list``
+
+        example 1:
+        async for service in iter_list('Service', attrs=['state']):
+            print(service['name'], service['attrs']['state'])
+        '''
+
+        url_path, payload = self._list_request(
+            object_type,
+            name,
+            attrs,
+            filters,
+            filter_vars,
+            joins
+        )
+
+        stream = await self._request('GET', url_path, payload, stream=True)
+        parser = JsonArrayParser()
+        try:
+            while not parser.done:
+                chunk = await stream.content.read(chunk_size)
+                for result in parser.feed(chunk, final=not chunk):
+                    yield result
+                if not chunk:
+                    break
+        finally:
+            stream.close()
+
+    async def list_columnar(self,
+                            object_type,
+                            attrs,
+                            name=None,
+                            filters=None,
+                            filter_vars=None,
+                            joins=None):
+        '''
+        get objects by type or name as columns, see ``Objects.list_columnar``
+        '''
+
+        if not attrs:
+            raise Icinga2ApiException('attrs are required for columns.')
+
+        columnar = ColumnarResult(attrs, joins)
+        async for result in self.iter_list(object_type, name, attrs, filters,
+                                           filter_vars, joins):
+            columnar.append(result)
+        return columnar
+
+    async def bulk(self, operations, max_in_flight=10):
+        '''
+        create, update and delete many objects concurrently, see
+        ``Objects.bulk``
+        '''
+
+        return await run_bulk_tiers_async(
+            self._bulk_operation,
+            self._bulk_tiers(operations),
+            max_in_flight
+        )
+
+    async def sync(self,
+                   desired,
+                   filters=None,
+                   filter_vars=None,
+                   delete=False,
+                   cascade=False,
+                   max_in_flight=10,
+                   dry_run=False):
+        '''
+        bring the objects to a desired state with the least requests, see
+        ``Objects.sync``
+        '''
+
+        current = []
+        for object_type, attrs in query_attrs(desired).items():
+            current.extend(await self.list(
+                object_type,
+                attrs=attrs or ['name'],
+                filters=(filters or {}).get(object_type),
+                filter_vars=filter_vars
+            ))
+        operations = diff_objects(desired, current, delete, cascade)
+        if dry_run:
+            return operations
+        return await self.bulk(operations, max_in_flight)
+
+    async def _write(self, object_type, method, url_path, payload,
+                     cascade=False):
+        '''
+        make a modifying request and drop the affected cached results
+        '''
+
+        try:
+            return await self._request(method, url_path, payload)
+        finally:
+            self._invalidate_cache(object_type, cascade)
+
+
+class AsyncActions(AsyncBase, Actions):
+    '''
+    Icinga 2 API asyncio actions class
+
+    All actions are inherited and return awaitables.
+    '''
+
+    async def process_check_results(self, results, max_in_flight=10):
+        '''
+        Process many check results concurrently, see
+        ``Actions.process_check_results``
+        '''
+
+        return await run_bulk_async(
+            lambda result: self.process_check_result(**result),
+            results,
+            max_in_flight
+        )
+
+    async def run_chunked(self,
+                          action,
+                          object_type,
+                          names,
+                          chunk_size=500,
+                          max_in_flight=4,
+                          target_duration=2.0,
+                          **kwargs):
+        '''
+        Run an action for a list of objects in chunks, see
+        ``Actions.run_chunked``
+        '''
+
+        sizer = ChunkSizer(chunk_size, target_duration=target_duration)
+        return settle_chunks(await run_bulk_async(
+            lambda chunk: self._run_chunk(
+                getattr(self, action), object_type, chunk, sizer, kwargs),
+            sizer.chunks(list(names)),
+            max_in_flight
+        ))
+
+    async def _run_chunk(self, action, object_type, names, sizer, kwargs):
+        '''
+        run an action for one chunk of names, split it when it fails, see
+        ``Actions._run_chunk``
+        '''
+
+        start = time.time()
+        try:
+            result = await action(
+                object_type=object_type,
+                filters='{0}.__name in names'.format(object_type.lower()),
+                filter_vars={'names': names},
+                **kwargs
+            )
+        except (Icinga2ApiException, aiohttp.ClientError,
+                asyncio.TimeoutError) as error:
+            sizer.record(len(names), time.time() - start, failed=True)
+            if len(names) == 1 or (
+                    isinstance(error, asyncio.TimeoutError) and
+                    action.__name__ in NON_IDEMPOTENT_ACTIONS):
+                return [], dict((name, error) for name in names)
+            LOG.debug("Chunk of %d objects failed, splitting: %s",
+                      len(names), error)
+            half = len(names) // 2
+            results, errors = await self._run_chunk(
+                action, object_type, names[:half], sizer, kwargs)
+            more_results, more_errors = await self._run_chunk(
+                action, object_type, names[half:], sizer, kwargs)
+            errors.update(more_errors)
+            return results + more_results, errors
+        sizer.record(len(names), time.time() - start)
+        return split_results(result['results'], names)
+
+
+class AsyncEvents(AsyncBase, Events):
+    '''
+    Icinga 2 API asyncio events class
+    '''
+
+    async def subscribe(self,
+                        types,
+                        queue,
+                        filters=None,
+                        filter_vars=None,
+                        decode=False,
+                        reconnect=False,
+                        idle_timeout=None,
+                        on_reconnect=None,
+                        reconnect_delay=1,
+                        reconnect_delay_max=60,
+                        on_connect=None):
+        '''
+        subscribe to an event stream, see ``Events.subscribe``
+
+        ``on_reconnect`` and ``on_connect`` may be coroutine functions.
+
+        example 1:
+        async for event in subscribe(["CheckResult"], "monitor"):
+            print(event)
+        '''
+
+        payload = self._subscribe_payload(types, queue, filters, filter_vars)
+        stats = self.subscriptions.setdefault(queue, SubscriptionStats())
+        delay = reconnect_delay
+
+        try:
+            while True:
+                try:
+                    stream = await self._request(
+                        'POST',
+                        self.base_url_path,
+                        payload,
+                        stream=True,
+                        timeout=self._stream_timeout(idle_timeout)
+                    )
+                    gap = stats.connected()
+                    delay = reconnect_delay
+                    if gap is not None:
+                        LOG.info("Event stream %s reconnected after %.1fs",
+                                 queue, gap)
+                        if on_reconnect is not None:
+                            result = on_reconnect(gap)
+                            if asyncio.iscoroutine(result):
+                                await result
+                    if on_connect is not None:
+                        result = on_connect(gap)
+                        if asyncio.iscoroutine(result):
+                            await result
+                    async for event in self._get_message_from_stream(stream):
+                        stats.event()
+                        if decode:
+                            if event:
+                                yield decode_event(
+                                    event, self.manager.codec.loads)
+                        else:
+                            yield event
+                except (Icinga2ApiException, aiohttp.ClientError,
+                        asyncio.TimeoutError) as error:
+                    if not reconnect:
+                        raise
+                    LOG.warning("Event stream %s broke: %s", queue, error)
+                stats.disconnected()
+                if not reconnect:
+                    return
+                LOG.info("Reconnecting event stream %s in %.1fs", queue, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, reconnect_delay_max)
+        finally:
+            stats.disconnected()
+
+
+class AsyncStatus(AsyncBase, Status):
+    '''
+    Icinga 2 API asyncio status class
+
+    ``list`` is inherited and returns an awaitable.
+    '''
+
+
+class AsyncClient(Client):
+    '''
+    Icinga 2 asyncio Client class
+
+    example 1:
+    async with AsyncClient('https://icinga2:5665', 'user', 'pass') as client:
+        hosts = await client.objects.list('Host')
+    '''
+
+    transport_class = AsyncTransport
+    objects_class = AsyncObjects
+    actions_class = AsyncActions
+    events_class = AsyncEvents
+    status_class = AsyncStatus
+
+    async def close(self):
+        '''
+        close all connections of the client
+        '''
+
+        await self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -27,17 +27,12 @@ Icinga 2 API client base
 '''
 
 from __future__ import print_function
+import json
 import logging
-import sys
-import requests
-# pylint: disable=import-error,no-name-in-module
-if sys.version_info >= (3, 0):
-    from urllib.parse import urljoin
-else:
-    from urlparse import urljoin
-# pylint: enable=import-error,no-name-in-module
+import time
 
 from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.stream import STREAM_CHUNK_SIZE, iter_messages
 
 LOG = logging.getLogger(__name__)
 
@@ -57,31 +52,8 @@ class Base(object):
         self.manager = manager
         self.stream_cache = ""
 
-    def _create_session(self, method='POST'):
-        '''
-        create a session object
-        '''
-
-        session = requests.Session()
-        # prefer certificate authentification
-        if self.manager.certificate and self.manager.key:
-            # certificate and key are in different files
-            session.cert = (self.manager.certificate, self.manager.key)
-        elif self.manager.certificate:
-            # certificate and key are in the same file
-            session.cert = self.manager.certificate
-        elif self.manager.username and self.manager.password:
-            # use username and password
-            session.auth = (self.manager.username, self.manager.password)
-        session.headers = {
-            'User-Agent': 'Python-icinga2api/{0}'.format(self.manager.version),
-            'X-HTTP-Method-Override': method.upper(),
-            'Accept': 'application/json'
-        }
-
-        return session
-
-    def _request(self, method, url_path, payload=None, stream=False):
+    def _request(self, method, url_path, payload=None, stream=False,
+                 timeout=None):
         '''
         make the request and return the body
 
@@ -91,77 +63,89 @@ class Base(object):
         :type url_path: string
         :param payload: the payload to send
         :type payload: dictionary
+        :param stream: return the response without reading the body
+        :type stream: bool
+        :param timeout: overrides the client's timeout
+        :type timeout: float or tuple
         :returns: the response as json
         :rtype: dictionary
         '''
 
-        request_url = urljoin(self.manager.url, url_path)
-        LOG.debug("Request URL: %s", request_url)
-
-        # create session
-        session = self._create_session(method)
-
-        # create arguments for the request
-        request_args = {
-            'url': request_url,
-            'timeout': self.manager.timeout,
-        }
-        if payload:
-            request_args['json'] = payload
-        if self.manager.ca_certificate:
-            request_args['verify'] = self.manager.ca_certificate
-        else:
-            request_args['verify'] = False
-        if stream:
-            request_args['stream'] = True
-
-        # do the request
-        response = session.post(**request_args)
-
-        if not stream:
-            session.close()
-        # # for debugging
-        # from pprint import pprint
-        # pprint(request_url)
-        # pprint(payload)
-        # pprint(response)
-
+        # do the request over the pooled transport of the client
+        response = self.manager.transport.request(
+            method,
+            url_path,
+            payload,
+            stream=stream,
+            timeout=timeout
+        )
+
+        info = getattr(response, 'hook_info', None)
+        transport = self.manager.transport
         if not 200 <= response.status_code <= 299:
-            try:
-                upstream_error=response.json()
-            except ValueError:
-                upstream_error=None
-            raise Icinga2ApiException(
-                'Request "{}" failed with status {}: {}'.format(
-                    response.url,
-                    response.status_code,
-                    response.text,
-                ),
-                upstream_error=upstream_error,
+            transport.finish_request(info, len(response.content))
+            raise self._request_failed(
+                response.url,
+                response.status_code,
+                response.text
             )
 
         if stream:
+            transport.finish_request(info)
             return response
-        else:
-            return response.json()
+        elif info is None:
+            return self.manager.codec.loads(response.content)
+
+        content = response.content
+        start = time.time()
+        result = self.manager.codec.loads(content)
+        info.timings['decode'] = time.time() - start
+        transport.finish_request(info, len(content))
+        return result
 
     @staticmethod
-    def _get_message_from_stream(stream):
+    def _request_failed(url, status_code, text):
+        '''
+        create the exception for a failed request
+
+        :param url: the requested url
+        :type url: string
+        :param status_code: the HTTP status code
+        :type status_code: int
+        :param text: the response body
+        :type text: string
+        :returns: the exception to raise
+        :rtype: Icinga2ApiException
         '''
-        make the request and return the body
+
+        try:
+            upstream_error = json.loads(text)
+        except ValueError:
+            upstream_error = None
+        return Icinga2ApiException(
+            'Request "{}" failed with status {}: {}'.format(
+                url,
+                status_code,
+                text,
+            ),
+            upstream_error=upstream_error,
+        )
+
+    @staticmethod
+    def _get_message_from_stream(stream, chunk_size=STREAM_CHUNK_SIZE):
+        '''
+        split the streamed response into messages
 
         :param stream: the stream
-        :type method: request
-        :returns: the message
-        :rtype: dictionary
+        :type stream: requests.Response
+        :param chunk_size: number of bytes to read at once
+        :type chunk_size: int
+        :returns: the messages
+        :rtype: string
         '''
 
-        # TODO: test iter_lines()
-        message = ''
-        for char in stream.iter_content():
-            char = char.decode()
-            if char == '\n':
+        try:
+            for message in iter_messages(stream.iter_content(chunk_size)):
                 yield message
-                message = ''
-            else:
-                message += char
+        finally:
+            stream.close()
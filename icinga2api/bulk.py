@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API bulk operations
+
+Run one API call per item concurrently with a bounded number of requests in
+flight, collecting the outcome of every item instead of aborting on the first
+error.
+'''
+
+from __future__ import division, print_function
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+
+class ChunkError(Icinga2ApiException):
+    '''
+    error of a chunk of a chunked action, some or all of its objects failed
+    '''
+
+    def __init__(self, errors):
+        '''
+        initialize object
+
+        :param errors: the error of every failed object name
+        :type errors: dictionary
+        '''
+
+        super(ChunkError, self).__init__(
+            '{0} object(s) failed, first: {1}'.format(
+                len(errors), next(iter(errors.values()))))
+        self.errors = errors
+
+
+class BulkItemResult(object):
+    '''
+    outcome of a single item of a bulk operation
+    '''
+
+    __slots__ = ('index', 'item', 'result', 'error', 'duration')
+
+    def __init__(self, index, item, result=None, error=None, duration=None):
+        '''
+        initialize object
+
+        :param index: position of the item in the input
+        :type index: int
+        :param item: the input item
+        :param result: the API response
+        :type result: dictionary
+        :param error: the exception raised for this item
+        :type error: Exception
+        :param duration: duration of the request in seconds
+        :type duration: float
+        '''
+
+        self.index = index
+        self.item = item
+        self.result = result
+        self.error = error
+        self.duration = duration
+
+    @property
+    def ok(self):
+        '''
+        True if the request for this item succeeded
+        '''
+
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return '<BulkItemResult #{0} ok>'.format(self.index)
+        return '<BulkItemResult #{0} error={1!r}>'.format(
+            self.index, str(self.error))
+
+
+class BulkResult(object):
+    '''
+    outcome of a bulk operation
+    '''
+
+    def __init__(self, items, duration):
+        '''
+        initialize object
+
+        :param items: the results of all items in input order
+        :type items: list
+        :param duration: wall clock duration of the bulk operation in seconds
+        :type duration: float
+        '''
+
+        self.items = items
+        self.duration = duration
+
+    @property
+    def succeeded(self):
+        '''
+        the results of all successful items
+        '''
+
+        return [item for item in self.items if item.ok]
+
+    @property
+    def failed(self):
+        '''
+        the results of all failed items
+        '''
+
+        return [item for item in self.items if not item.ok]
+
+    def merged_results(self):
+        '''
+        return the per object results of all chunks of a chunked action in
+        one list, including the applied objects of failed chunks, see
+        ``Actions.run_chunked``
+
+        :rtype: list
+        '''
+
+        return [result
+                for item in self.items if item.result
+                for result in item.result]
+
+    def object_errors(self):
+        '''
+        return the error of every object of a chunked action that failed
+
+        :returns: the errors by object name
+        :rtype: dictionary
+        '''
+
+        errors = {}
+        for item in self.items:
+            if isinstance(item.error, ChunkError):
+                errors.update(item.error.errors)
+        return errors
+
+    def stats(self):
+        '''
+        return throughput statistics
+
+        :returns: item counts, duration, throughput and request latencies
+        :rtype: dictionary
+        '''
+
+        durations = sorted(
+            item.duration for item in self.items if item.duration is not None)
+        failed = len(self.failed)
+
+        def percentile(fraction):
+            if not durations:
+                return None
+            return durations[min(len(durations) - 1,
+                                 int(fraction * len(durations)))]
+
+        return {
+            'total': len(self.items),
+            'succeeded': len(self.items) - failed,
+            'failed': failed,
+            'duration': self.duration,
+            'throughput': len(self.items) / self.duration
+                          if self.duration else None,
+            'latency_avg': sum(durations) / len(durations)
+                           if durations else None,
+            'latency_p50': percentile(0.5),
+            'latency_p99': percentile(0.99),
+        }
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __repr__(self):
+        return '<BulkResult total={0} failed={1}>'.format(
+            len(self.items), len(self.failed))
+
+
+class ChunkSizer(object):
+    '''
+    adapts the number of objects per request to the observed response times
+
+    Every successful chunk moves the size towards the number of objects
+    the server handles in target_duration, every failed chunk halves it.
+    '''
+
+    def __init__(self, size=500, min_size=1, max_size=5000,
+                 target_duration=2.0):
+        '''
+        initialize object
+
+        :param size: the initial chunk size
+        :type size: int
+        :param min_size: the smallest chunk size
+        :type min_size: int
+        :param max_size: the largest chunk size
+        :type max_size: int
+        :param target_duration: the desired duration of a request in seconds
+        :type target_duration: float
+        '''
+
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_duration = target_duration
+        self._lock = threading.Lock()
+
+    def record(self, count, duration, failed=False):
+        '''
+        adapt the size to the outcome of a chunk
+
+        :param count: the number of objects of the chunk
+        :type count: int
+        :param duration: the duration of the request in seconds
+        :type duration: float
+        :param failed: the request failed
+        :type failed: bool
+        '''
+
+        with self._lock:
+            if failed:
+                size = self.size // 2
+            elif duration > 0:
+                # move half way to the size hitting the target duration
+                size = (self.size + count * self.target_duration / duration) \
+                    // 2
+            else:
+                size = self.size * 2
+            self.size = int(max(self.min_size, min(self.max_size, size)))
+
+    def chunks(self, items):
+        '''
+        split items into chunks of the current size
+
+        The size is read when a chunk is taken, so consuming the chunks
+        lazily follows the adaptation.
+
+        :param items: the items
+        :type items: list
+        :returns: the chunks
+        :rtype: list
+        '''
+
+        position = 0
+        while position < len(items):
+            size = self.size
+            yield items[position:position + size]
+            position += size
+
+
+def _run_item(func, index, item):
+    '''
+    call func for one item and never raise
+    '''
+
+    start = time.time()
+    try:
+        result = func(item)
+    except Exception as error:  # pylint: disable=broad-except
+        LOG.debug("Bulk item #%s failed: %s", index, error)
+        return BulkItemResult(index, item, error=error,
+                              duration=time.time() - start)
+    return BulkItemResult(index, item, result=result,
+                          duration=time.time() - start)
+
+
+def run_bulk(func, items, max_in_flight=10):
+    '''
+    call func for every item with at most max_in_flight concurrent calls
+
+    The items are consumed lazily, so generators of any size can be passed.
+
+    :param func: the function to call with each item
+    :type func: callable
+    :param items: the input items
+    :type items: iterable
+    :param max_in_flight: maximum number of concurrent calls
+    :type max_in_flight: int
+    :returns: the results of all items
+    :rtype: BulkResult
+    '''
+
+    start = time.time()
+    results = []
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for index, item in enumerate(items):
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+            pending.add(executor.submit(_run_item, func, index, item))
+        results.extend(future.result() for future in pending)
+
+    results.sort(key=lambda result: result.index)
+    return BulkResult(results, time.time() - start)
+
+
+def settle_chunks(bulk):
+    '''
+    turn the (results, errors) of every chunk of a chunked action into the
+    result and error of its item
+
+    :param bulk: the outcome of the chunks
+    :type bulk: BulkResult
+    :returns: the same object
+    :rtype: BulkResult
+    '''
+
+    for item in bulk.items:
+        if item.error is not None:
+            continue
+        item.result, errors = item.result
+        if errors:
+            item.error = ChunkError(errors)
+    return bulk
+
+
+def _reindex(results, indices):
+    '''
+    map the item positions of a tier back to the positions in the input
+    '''
+
+    for result in results:
+        result.index = indices[result.index]
+    return results
+
+
+def run_bulk_tiers(func, tiers, max_in_flight=10):
+    '''
+    call func for the items of every tier with ``run_bulk``, a tier starts
+    when the previous one is finished
+
+    :param func: the function to call with each item
+    :type func: callable
+    :param tiers: lists of (position in the input, item)
+    :type tiers: list
+    :param max_in_flight: maximum number of concurrent calls
+    :type max_in_flight: int
+    :returns: the results of all items
+    :rtype: BulkResult
+    '''
+
+    start = time.time()
+    results = []
+    for tier in tiers:
+        indices = [index for index, _ in tier]
+        tier_result = run_bulk(
+            func, [item for _, item in tier], max_in_flight)
+        results.extend(_reindex(tier_result.items, indices))
+
+    results.sort(key=lambda result: result.index)
+    return BulkResult(results, time.time() - start)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API object cache
+
+Client-side cache for Objects.list/get results with a TTL and LRU eviction.
+'''
+
+from __future__ import print_function
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+LOG = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class ObjectCache(object):
+    '''
+    Icinga 2 API object cache class
+    '''
+
+    def __init__(self, ttl=60, max_entries=1024):
+        '''
+        initialize object
+
+        :param ttl: seconds a cached result stays valid
+        :type ttl: float
+        :param max_entries: maximum number of cached results, the least
+                            recently used result is evicted first
+        :type max_entries: int
+        '''
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(object_type,
+                 name=None,
+                 attrs=None,
+                 filters=None,
+                 filter_vars=None,
+                 joins=None):
+        '''
+        build the cache key of a list request
+
+        :returns: a hashable key
+        :rtype: tuple
+        '''
+
+        if filter_vars:
+            filter_vars = json.dumps(filter_vars, sort_keys=True)
+        if joins and not isinstance(joins, bool):
+            joins = tuple(joins)
+        return (
+            object_type,
+            name,
+            tuple(attrs) if attrs else None,
+            filters,
+            filter_vars or None,
+            joins or None,
+        )
+
+    def get(self, key):
+        '''
+        return the cached result or MISSING
+
+        :param key: the cache key
+        :type key: tuple
+        :returns: the cached result
+        :rtype: list
+        '''
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            # mark as most recently used
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        '''
+        cache a result
+
+        :param key: the cache key
+        :type key: tuple
+        :param value: the result
+        :type value: list
+        '''
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, object_type=None):
+        '''
+        drop the cached results of an object type
+
+        Results requested with joins are dropped as well, they may contain
+        attributes of the changed object.
+
+        :param object_type: the changed object type, None drops everything
+        :type object_type: string
+        '''
+
+        with self._lock:
+            if object_type is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                return
+            stale = [key for key in self._entries
+                     if key[0] == object_type or key[5]]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        '''
+        drop all cached results
+        '''
+
+        self.invalidate()
+
+    def stats(self):
+        '''
+        return cache statistics
+
+        :returns: size, hits, misses, evictions, expirations, invalidations
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
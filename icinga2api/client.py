@@ -34,11 +34,13 @@ import logging
 
 import icinga2api
 from icinga2api.actions import Actions
+from icinga2api.codec import get_codec
 from icinga2api.configfile import ClientConfigFile
 from icinga2api.events import Events
 from icinga2api.exceptions import Icinga2ApiException
 from icinga2api.objects import Objects
 from icinga2api.status import Status
+from icinga2api.transport import Transport
 
 LOG = logging.getLogger(__name__)
 
@@ -48,6 +50,12 @@ class Client(object):
     Icinga 2 Client class
     '''
 
+    transport_class = Transport
+    objects_class = Objects
+    actions_class = Actions
+    events_class = Events
+    status_class = Status
+
     def __init__(self,
                  url=None,
                  username=None,
@@ -56,15 +64,70 @@ class Client(object):
                  certificate=None,
                  key=None,
                  ca_certificate=None,
-                 config_file=None):
+                 config_file=None,
+                 pool_connections=10,
+                 pool_maxsize=10,
+                 pool_block=False,
+                 max_idle=None,
+                 retry_policy=None,
+                 circuit_breaker=None,
+                 write_url=None,
+                 balancing='round-robin',
+                 health_check_interval=None,
+                 hooks=None,
+                 codec=None,
+                 pause_gc=False):
         '''
         initialize object
+
+        :param url: the API url, a list or a comma separated string of urls
+                    to spread the requests across several endpoints
+        :type url: string or list
+        :param pool_connections: number of per-host connection pools to keep
+        :type pool_connections: int
+        :param pool_maxsize: maximum number of keep-alive connections per host
+        :type pool_maxsize: int
+        :param pool_block: never open more than pool_maxsize connections
+                           per host, wait for a free one instead
+        :type pool_block: bool
+        :param max_idle: close pooled connections after this many seconds
+                         without a request
+        :type max_idle: float
+        :param retry_policy: retry failed requests with backoff
+        :type retry_policy: RetryPolicy
+        :param circuit_breaker: fail fast while the API is down
+        :type circuit_breaker: CircuitBreaker
+        :param write_url: send requests modifying objects to this endpoint
+                          while it is available
+        :type write_url: string
+        :param balancing: spread reads 'round-robin' or by 'least-latency'
+        :type balancing: string
+        :param health_check_interval: check all endpoints in a background
+                                      thread every this many seconds
+        :type health_check_interval: float
+        :param hooks: called before and after every request, e.g. a
+                      ``icinga2api.instrumentation.MetricsCollector``
+        :type hooks: list
+        :param codec: the JSON codec, e.g. ``orjson`` or ``auto`` for the
+                      fastest installed one, see ``icinga2api.codec``
+        :type codec: string or JsonCodec
+        :param pause_gc: pause the garbage collector while responses of 1 MiB
+                         or more are decoded, see ``icinga2api.codec``
+        :type pause_gc: bool
         '''
         config_from_file = ClientConfigFile(config_file)
         if config_file:
             config_from_file.parse()
-        self.url = url or \
+        url = url or \
             config_from_file.url
+        if isinstance(url, (list, tuple)):
+            self.urls = list(url)
+        else:
+            self.urls = [part.strip() for part in (url or '').split(',')
+                         if part.strip()]
+        self.url = self.urls[0] if self.urls else None
+        if not self.url:
+            raise Icinga2ApiException('No "url" defined.')
         self.username = username or \
             config_from_file.username
         self.password = password or \
@@ -77,15 +140,40 @@ class Client(object):
             config_from_file.key
         self.ca_certificate = ca_certificate or \
             config_from_file.ca_certificate
-        self.objects = Objects(self)
-        self.actions = Actions(self)
-        self.events = Events(self)
-        self.status = Status(self)
+        self.codec = get_codec(codec, pause_gc)
+        self.transport = self.transport_class(
+            self,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_idle=max_idle,
+            retry_policy=retry_policy,
+            circuit_breaker=circuit_breaker,
+            write_url=write_url,
+            balancing=balancing,
+            health_check_interval=health_check_interval,
+            hooks=hooks
+        )
+        self.objects = self.objects_class(self)
+        self.actions = self.actions_class(self)
+        self.events = self.events_class(self)
+        self.status = self.status_class(self)
         self.version = icinga2api.__version__
 
-        if not self.url:
-            raise Icinga2ApiException('No "url" defined.')
         if not self.username and not self.password and not self.certificate:
             raise Icinga2ApiException(
                 'Neither username/password nor certificate defined.'
             )
+
+    def close(self):
+        '''
+        close all connections of the client
+        '''
+
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API JSON codecs
+
+The client encodes request bodies and decodes responses and events with a
+codec. The standard library is used by default, orjson, msgspec and ujson are
+faster when installed.
+
+Decoding large responses mostly runs the garbage collector over the millions
+of new objects. Codecs created with ``pause_gc`` pause its automatic runs
+while bodies of at least GC_PAUSE_SIZE bytes are decoded.
+'''
+
+from __future__ import print_function
+import contextlib
+import gc
+import json
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+from icinga2api.columnar import STRING_TYPES
+from icinga2api.exceptions import Icinga2ApiException
+
+GC_PAUSE_SIZE = 1024 * 1024
+
+_GC_LOCK = threading.Lock()
+# the number of running decodes and the thresholds before the first
+_gc_paused = [0, None]
+
+
+@contextlib.contextmanager
+def _pause_gc():
+    '''
+    pause the automatic garbage collection until the last concurrent decode
+    ends
+
+    Only the collection threshold is changed, gc.disable() and gc.enable()
+    of the application keep their effect. The threshold is not restored if
+    the application changed it meanwhile.
+    '''
+
+    with _GC_LOCK:
+        if not _gc_paused[0]:
+            thresholds = gc.get_threshold()
+            _gc_paused[1] = thresholds
+            gc.set_threshold(0, *thresholds[1:])
+        _gc_paused[0] += 1
+    try:
+        yield
+    finally:
+        with _GC_LOCK:
+            _gc_paused[0] -= 1
+            thresholds = _gc_paused[1]
+            if not _gc_paused[0] and \
+                    gc.get_threshold() == (0,) + tuple(thresholds[1:]):
+                gc.set_threshold(*thresholds)
+
+
+class JsonCodec(object):
+    '''
+    JSON codec of the standard library
+    '''
+
+    name = 'json'
+
+    def __init__(self, pause_gc=False):
+        '''
+        initialize object
+
+        :param pause_gc: pause the garbage collector while large bodies
+                         are decoded
+        :type pause_gc: bool
+        '''
+
+        self.pause_gc = pause_gc
+
+    @staticmethod
+    def dumps(payload):
+        '''
+        encode a request payload
+
+        :param payload: the payload
+        :type payload: dictionary
+        :returns: the UTF-8 encoded JSON
+        :rtype: bytes
+        '''
+
+        return json.dumps(payload).encode('utf-8')
+
+    def loads(self, data):
+        '''
+        decode a response body or an event
+
+        :param data: the JSON
+        :type data: bytes or string
+        :returns: the decoded data
+        :rtype: dictionary
+        '''
+
+        if not self.pause_gc or len(data) < GC_PAUSE_SIZE:
+            return self._loads(data)
+        with _pause_gc():
+            return self._loads(data)
+
+    @staticmethod
+    def _loads(data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    '''
+    JSON codec using orjson
+    '''
+
+    name = 'orjson'
+
+    def __init__(self, pause_gc=False):
+        if orjson is None:
+            raise Icinga2ApiException('orjson is not installed.')
+        super(OrjsonCodec, self).__init__(pause_gc)
+
+    @staticmethod
+    def dumps(payload):
+        return orjson.dumps(payload)
+
+    @staticmethod
+    def _loads(data):
+        return orjson.loads(data)
+
+
+class MsgspecCodec(JsonCodec):
+    '''
+    JSON codec using msgspec
+    '''
+
+    name = 'msgspec'
+
+    def __init__(self, pause_gc=False):
+        if msgspec is None:
+            raise Icinga2ApiException('msgspec is not installed.')
+        super(MsgspecCodec, self).__init__(pause_gc)
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, payload):
+        return self._encoder.encode(payload)
+
+    def _loads(self, data):
+        return self._decoder.decode(data)
+
+
+class UjsonCodec(JsonCodec):
+    '''
+    JSON codec using ujson
+    '''
+
+    name = 'ujson'
+
+    def __init__(self, pause_gc=False):
+        if ujson is None:
+            raise Icinga2ApiException('ujson is not installed.')
+        super(UjsonCodec, self).__init__(pause_gc)
+
+    @staticmethod
+    def dumps(payload):
+        return ujson.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def _loads(data):
+        return ujson.loads(data)
+
+
+# the codecs by name, fastest first
+CODECS = (
+    ('orjson', OrjsonCodec),
+    ('msgspec', MsgspecCodec),
+    ('ujson', UjsonCodec),
+    ('json', JsonCodec),
+)
+
+
+def available_codecs():
+    '''
+    return the names of the installed codecs, fastest first
+
+    :rtype: list
+    '''
+
+    modules = {'orjson': orjson, 'msgspec': msgspec, 'ujson': ujson}
+    return [name for name, _ in CODECS
+            if name == 'json' or modules[name] is not None]
+
+
+def get_codec(codec=None, pause_gc=False):
+    '''
+    return a codec by name
+
+    example 1:
+    get_codec('orjson')
+
+    example 2:
+    get_codec('auto')
+
+    :param codec: ``json``, ``orjson``, ``msgspec``, ``ujson``, ``auto`` for
+                  the fastest installed one or a codec object, None for
+                  ``json``
+    :type codec: string or JsonCodec
+    :param pause_gc: pause the garbage collector while bodies of at least
+                     GC_PAUSE_SIZE bytes are decoded, for codecs by name
+    :type pause_gc: bool
+    :returns: the codec
+    :rtype: JsonCodec
+    '''
+
+    if codec is None:
+        codec = 'json'
+    if not isinstance(codec, STRING_TYPES):
+        return codec
+    if codec == 'auto':
+        codec = available_codecs()[0]
+    codecs = dict(CODECS)
+    if codec not in codecs:
+        raise Icinga2ApiException('Unknown JSON codec "{0}".'.format(codec))
+    return codecs[codec](pause_gc)
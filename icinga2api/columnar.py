@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API columnar results
+
+Column-oriented storage for Objects.list results: one typed array per numeric
+attribute and interned strings for names, so aggregates over hundreds of
+thousands of objects need neither per-object dictionaries nor Python floats.
+NumPy is used for the aggregates when it is installed.
+'''
+
+from __future__ import division, print_function
+import logging
+import math
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+# pylint: disable=undefined-variable
+if sys.version_info >= (3, 0):
+    NUMERIC_TYPES = (bool, int, float)
+    STRING_TYPES = (str,)
+    _intern = sys.intern
+else:
+    NUMERIC_TYPES = (bool, int, long, float)
+    STRING_TYPES = (basestring,)
+
+    def _intern(value):
+        '''
+        intern byte strings, unicode strings can not be interned
+        '''
+
+        return intern(value) if isinstance(value, str) else value
+# pylint: enable=undefined-variable
+
+
+class _Column(object):
+    '''
+    one column, typed by its first value which is not None
+    '''
+
+    __slots__ = ('kind', 'data', 'pending')
+
+    def __init__(self):
+        self.kind = None
+        self.data = None
+        # number of leading None values before the kind was known
+        self.pending = 0
+
+    def append(self, value):
+        if self.kind is None:
+            if value is None:
+                self.pending += 1
+                return
+            if isinstance(value, NUMERIC_TYPES):
+                self.kind = 'number'
+                self.data = array('d', [float('nan')] * self.pending)
+            elif isinstance(value, STRING_TYPES):
+                self.kind = 'string'
+                self.data = [None] * self.pending
+            else:
+                self.kind = 'object'
+                self.data = [None] * self.pending
+
+        if self.kind == 'number':
+            if value is None:
+                self.data.append(float('nan'))
+            elif isinstance(value, NUMERIC_TYPES):
+                self.data.append(value)
+            else:
+                # mixed column, fall back to plain values
+                self.kind = 'object'
+                self.data = [None if math.isnan(item) else item
+                             for item in self.data]
+                self.data.append(value)
+        elif self.kind == 'string' and isinstance(value, STRING_TYPES):
+            self.data.append(_intern(value))
+        else:
+            self.data.append(value)
+
+    def values(self, length):
+        if self.kind is None:
+            return [None] * length
+        return self.data
+
+
+class ColumnarResult(object):
+    '''
+    Icinga 2 API columnar result class
+
+    Numeric attributes are stored in ``array('d')`` columns with NaN for
+    missing values, strings are interned. Joined attributes are named like
+    the join, e.g. ``host.zone``.
+    '''
+
+    def __init__(self, attrs, joins=None):
+        '''
+        initialize object
+
+        :param attrs: the attribute columns
+        :type attrs: list
+        :param joins: the joined attribute columns, e.g. ['host.zone']
+        :type joins: list
+        '''
+
+        self.attrs = list(attrs)
+        self.joins = [join for join in (joins or ())
+                      if isinstance(join, STRING_TYPES) and '.' in join]
+        self.names = []
+        self._columns = dict(
+            (name, _Column()) for name in self.attrs + self.joins)
+
+    @classmethod
+    def from_results(cls, results, attrs, joins=None):
+        '''
+        build the columns from Objects.list / iter_list results
+
+        :param results: the objects
+        :type results: iterable
+        :param attrs: the attribute columns
+        :type attrs: list
+        :param joins: the joined attribute columns
+        :type joins: list
+        :returns: the columnar result
+        :rtype: ColumnarResult
+        '''
+
+        columnar = cls(attrs, joins)
+        for result in results:
+            columnar.append(result)
+        return columnar
+
+    def append(self, result):
+        '''
+        add one object
+
+        :param result: the object as returned by Objects.list
+        :type result: dictionary
+        '''
+
+        self.names.append(_intern(result['name']))
+        attrs = result.get('attrs') or {}
+        for name in self.attrs:
+            self._columns[name].append(attrs.get(name))
+        if self.joins:
+            joined = result.get('joins') or {}
+            for name in self.joins:
+                join_type, attr = name.split('.', 1)
+                self._columns[name].append(
+                    (joined.get(join_type) or {}).get(attr))
+
+    def column(self, name):
+        '''
+        return one column
+
+        :param name: the attribute name
+        :type name: string
+        :returns: array('d') for numeric attributes, else a list
+        :rtype: array or list
+        '''
+
+        if name == 'name':
+            return self.names
+        if name not in self._columns:
+            raise Icinga2ApiException('No column "{0}".'.format(name))
+        return self._columns[name].values(len(self.names))
+
+    def to_numpy(self, name):
+        '''
+        return one column as NumPy array, without copying numeric columns
+
+        :param name: the attribute name
+        :type name: string
+        :returns: the column
+        :rtype: numpy.ndarray
+        '''
+
+        if numpy is None:
+            raise Icinga2ApiException('NumPy is not installed.')
+        values = self.column(name)
+        if isinstance(values, array):
+            return numpy.frombuffer(values, dtype=numpy.float64)
+        return numpy.array(values, dtype=object)
+
+    def group_indices(self, name):
+        '''
+        return the row indices per distinct value of a column
+
+        :param name: the attribute name
+        :type name: string
+        :returns: row indices by value
+        :rtype: dictionary
+        '''
+
+        groups = {}
+        for index, value in enumerate(self.column(name)):
+            if isinstance(value, list):
+                value = tuple(value)
+            groups.setdefault(value, []).append(index)
+        return groups
+
+    def _aggregate(self, name, func, by):
+        '''
+        apply func to the non-NaN values of a column, optionally per group
+        '''
+
+        values = self.column(name)
+        if not isinstance(values, array):
+            raise Icinga2ApiException(
+                'Column "{0}" is not numeric.'.format(name))
+        if numpy is not None:
+            values = numpy.frombuffer(values, dtype=numpy.float64)
+        if by is None:
+            return func(values, None)
+        return dict((key, func(values, indices))
+                    for key, indices in self.group_indices(by).items())
+
+    def mean(self, name, by=None):
+        '''
+        return the mean of a numeric column, ignoring missing values
+
+        example 1:
+        mean('latency', by='zone')
+
+        :param name: the numeric column
+        :type name: string
+        :param by: group by this column
+        :type by: string
+        :returns: the mean, or the means by group
+        :rtype: float or dictionary
+        '''
+
+        return self._aggregate(name, _mean, by)
+
+    def percentile(self, name, percent, by=None):
+        '''
+        return a percentile of a numeric column, ignoring missing values
+
+        example 1:
+        percentile('execution_time', 99)
+
+        :param name: the numeric column
+        :type name: string
+        :param percent: the percentile between 0 and 100
+        :type percent: float
+        :param by: group by this column
+        :type by: string
+        :returns: the percentile, or the percentiles by group
+        :rtype: float or dictionary
+        '''
+
+        return self._aggregate(
+            name, lambda values, indices: _percentile(values, indices,
+                                                      percent), by)
+
+    def __len__(self):
+        return len(self.names)
+
+
+def _select(values, indices):
+    '''
+    return the non-NaN values at indices
+    '''
+
+    if numpy is not None:
+        if indices is not None:
+            values = values[indices]
+        return values[~numpy.isnan(values)]
+    if indices is not None:
+        values = [values[index] for index in indices]
+    return [value for value in values if not math.isnan(value)]
+
+
+def _mean(values, indices):
+    values = _select(values, indices)
+    if not len(values):  # pylint: disable=len-as-condition
+        return None
+    if numpy is not None:
+        return float(values.mean())
+    return math.fsum(values) / len(values)
+
+
+def _percentile(values, indices, percent):
+    values = _select(values, indices)
+    if not len(values):  # pylint: disable=len-as-condition
+        return None
+    if numpy is not None:
+        return float(numpy.percentile(values, percent))
+    values = sorted(values)
+    # linear interpolation like numpy.percentile
+    position = (len(values) - 1) * percent / 100.0
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
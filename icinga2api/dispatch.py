@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API event dispatcher
+
+Reads an event stream on one thread and hands the events to pools of worker
+threads, so slow handlers do not hold up the stream.
+'''
+
+from __future__ import print_function
+import logging
+import threading
+
+# pylint: disable=import-error
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+# pylint: enable=import-error
+
+from icinga2api.eventtypes import Event, decode_event
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop-oldest'
+SAMPLE = 'sample'
+
+_STOP = object()
+
+
+class HandlerPool(object):
+    '''
+    worker threads running one handler
+
+    Every worker has its own bounded queue and events of the same object are
+    always routed to the same worker, so they are handled in order.
+    '''
+
+    def __init__(self,
+                 handler,
+                 types=None,
+                 workers=1,
+                 queue_size=1000,
+                 policy=BLOCK,
+                 sample_rate=10,
+                 name=None):
+        '''
+        initialize object
+
+        :param handler: called with every event
+        :type handler: callable
+        :param types: the event types to handle, all if None
+        :type types: list
+        :param workers: the number of worker threads
+        :type workers: int
+        :param queue_size: the maximum number of queued events per worker
+        :type queue_size: int
+        :param policy: what to do when a queue is full, ``block``,
+                       ``drop-oldest`` or ``sample``
+        :type policy: string
+        :param sample_rate: with ``sample``, only every n-th event is queued
+                            while a queue is more than half full
+        :type sample_rate: int
+        :param name: the name used in logs and metrics
+        :type name: string
+        '''
+
+        if policy not in (BLOCK, DROP_OLDEST, SAMPLE):
+            raise Icinga2ApiException(
+                'Unknown backpressure policy "{0}".'.format(policy))
+        self.handler = handler
+        self.types = set(types) if types else None
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.name = name or getattr(handler, '__name__', repr(handler))
+        self.queues = [queue.Queue(queue_size) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._skipped = [0] * workers
+        self.dispatched = 0
+        self.handled = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        '''
+        start the worker threads
+        '''
+
+        for number, work_queue in enumerate(self.queues):
+            thread = threading.Thread(
+                target=self._work,
+                args=(work_queue,),
+                name='icinga2api-{0}-{1}'.format(self.name, number)
+            )
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        '''
+        let the workers finish the queued events and stop them
+
+        :param timeout: seconds to wait for every worker
+        :type timeout: float
+        '''
+
+        for work_queue in self.queues:
+            work_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def put(self, event, key):
+        '''
+        queue an event for the worker of its object
+
+        :param event: the event
+        :type event: Event
+        :param key: the routing key, e.g. the object name
+        :type key: string
+        :returns: False if the event was dropped
+        :rtype: bool
+        '''
+
+        number = hash(key) % len(self.queues)
+        work_queue = self.queues[number]
+        self.dispatched += 1
+
+        if self.policy == SAMPLE and \
+                work_queue.qsize() * 2 > work_queue.maxsize:
+            self._skipped[number] += 1
+            if self._skipped[number] % self.sample_rate:
+                self._drop()
+                return False
+        if self.policy == BLOCK:
+            work_queue.put(event)
+            return True
+        try:
+            work_queue.put_nowait(event)
+            return True
+        except queue.Full:
+            pass
+        if self.policy == SAMPLE:
+            self._drop()
+            return False
+
+        # drop-oldest, the dispatcher is the only producer so there is room
+        # after taking one event out
+        try:
+            work_queue.get_nowait()
+            self._drop()
+        except queue.Empty:
+            pass
+        work_queue.put_nowait(event)
+        return True
+
+    def _drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def _work(self, work_queue):
+        '''
+        handle the events of one queue until stopped
+        '''
+
+        while True:
+            event = work_queue.get()
+            if event is _STOP:
+                return
+            try:
+                self.handler(event)
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception("Handler %s failed", self.name)
+                with self._lock:
+                    self.errors += 1
+            with self._lock:
+                self.handled += 1
+
+    def stats(self):
+        '''
+        return pool metrics
+
+        :returns: dispatched, handled, dropped and failed events and the
+                  current queue depths
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            return {
+                'dispatched': self.dispatched,
+                'handled': self.handled,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'queued': [work_queue.qsize() for work_queue in self.queues],
+            }
+
+
+class EventDispatcher(object):
+    '''
+    fan out an event stream to handler pools
+
+    example 1:
+    dispatcher = EventDispatcher()
+    dispatcher.register(create_ticket, types=['StateChange'], workers=4)
+    dispatcher.register(store_metrics, types=['CheckResult'],
+                        policy='drop-oldest')
+    dispatcher.start(client, ['CheckResult', 'StateChange'], 'dispatcher')
+    '''
+
+    def __init__(self):
+        '''
+        initialize object
+        '''
+
+        self.pools = []
+        self._routes = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._started = False
+        self.events = 0
+
+    def register(self, handler, types=None, **kwargs):
+        '''
+        add a handler pool
+
+        :param handler: called with every decoded event on a worker thread
+        :type handler: callable
+        :param types: the event types to handle, all if None
+        :type types: list
+        :param kwargs: the options of ``HandlerPool``
+        :returns: the pool
+        :rtype: HandlerPool
+        '''
+
+        pool = HandlerPool(handler, types, **kwargs)
+        self.pools.append(pool)
+        self._routes.clear()
+        if self._started:
+            pool.start()
+        return pool
+
+    def _pools_for(self, event_type):
+        '''
+        return the pools handling an event type
+        '''
+
+        pools = self._routes.get(event_type)
+        if pools is None:
+            pools = [pool for pool in self.pools
+                     if pool.types is None or event_type in pool.types]
+            self._routes[event_type] = pools
+        return pools
+
+    def dispatch(self, event):
+        '''
+        route one event to its handler pools
+
+        :param event: the event, decoded or as JSON string
+        :type event: Event or string
+        '''
+
+        if not isinstance(event, Event):
+            if not event:
+                return
+            event = decode_event(event)
+        self.events += 1
+        key = event.object_name
+        for pool in self._pools_for(event.type):
+            pool.put(event, key)
+
+    def run(self, events):
+        '''
+        dispatch events on the calling thread until the iterable ends or
+        the dispatcher is stopped
+
+        :param events: the events
+        :type events: iterable
+        '''
+
+        self._start_pools()
+        for event in events:
+            self.dispatch(event)
+            if self._stop.is_set():
+                break
+
+    def start(self, client, types, queue_name, **kwargs):
+        '''
+        subscribe and dispatch the events on a background thread
+
+        The subscription reconnects by itself, see ``Events.subscribe``.
+
+        :param client: the client
+        :type client: Client
+        :param types: the event types to subscribe for
+        :type types: list
+        :param queue_name: the event queue name
+        :type queue_name: string
+        :param kwargs: further arguments for ``Events.subscribe``
+        '''
+
+        kwargs.setdefault('reconnect', True)
+        kwargs['decode'] = True
+        self._stop.clear()
+        self._start_pools()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(client.events.subscribe(types, queue_name, **kwargs),),
+            name='icinga2api-dispatcher'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, events):
+        try:
+            self.run(events)
+        except Exception as error:  # pylint: disable=broad-except
+            LOG.error("Event dispatcher stopped: %s", error)
+
+    def _start_pools(self):
+        if self._started:
+            return
+        self._started = True
+        for pool in self.pools:
+            pool.start()
+
+    def stop(self, timeout=None):
+        '''
+        stop reading and let the handlers finish the queued events
+
+        The reader notices the stop with the next event.
+
+        :param timeout: seconds to wait for every thread
+        :type timeout: float
+        '''
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        for pool in self.pools:
+            pool.stop(timeout)
+        self._started = False
+
+    def stats(self):
+        '''
+        return dispatcher metrics
+
+        :returns: the number of read events and the metrics of every pool
+        :rtype: dictionary
+        '''
+
+        return {
+            'events': self.events,
+            'pools': dict((pool.name, pool.stats()) for pool in self.pools),
+        }
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API endpoints
+
+Load balancing and failover across several API endpoints, e.g. an HA master
+pair and satellites.
+'''
+
+from __future__ import print_function
+import itertools
+import logging
+import threading
+import time
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+ROUND_ROBIN = 'round-robin'
+LEAST_LATENCY = 'least-latency'
+
+
+class Endpoint(object):
+    '''
+    one API endpoint and its health
+    '''
+
+    __slots__ = ('url', 'latency', 'failures', 'down_until', 'requests',
+                 'errors')
+
+    def __init__(self, url):
+        '''
+        initialize object
+
+        :param url: the base url, e.g. https://master1:5665
+        :type url: string
+        '''
+
+        self.url = url
+        # exponentially weighted moving average of the response time
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0
+        self.requests = 0
+        self.errors = 0
+
+    def available(self, now):
+        '''
+        return True if the endpoint is not marked down
+        '''
+
+        return self.down_until <= now
+
+    def __repr__(self):
+        return '<Endpoint {0}>'.format(self.url)
+
+
+class EndpointPool(object):
+    '''
+    Icinga 2 API endpoint pool class
+
+    Reads are spread across all available endpoints, writes go to the
+    preferred write endpoint while it is available. An endpoint is marked
+    down for down_time seconds after max_failures consecutive failures.
+    '''
+
+    def __init__(self,
+                 urls,
+                 strategy=ROUND_ROBIN,
+                 write_url=None,
+                 max_failures=3,
+                 down_time=30,
+                 latency_weight=0.3):
+        '''
+        initialize object
+
+        :param urls: the endpoint urls
+        :type urls: list
+        :param strategy: 'round-robin' or 'least-latency'
+        :type strategy: string
+        :param write_url: preferred endpoint for writes
+        :type write_url: string
+        :param max_failures: consecutive failures marking an endpoint down
+        :type max_failures: int
+        :param down_time: seconds an endpoint stays marked down
+        :type down_time: float
+        :param latency_weight: weight of the newest response time in the
+                               latency average
+        :type latency_weight: float
+        '''
+
+        if strategy not in (ROUND_ROBIN, LEAST_LATENCY):
+            raise Icinga2ApiException(
+                'Unknown load balancing strategy "{0}".'.format(strategy))
+        self.endpoints = [Endpoint(url) for url in urls]
+        if not self.endpoints:
+            raise Icinga2ApiException('No "url" defined.')
+        self.strategy = strategy
+        self.write_endpoint = None
+        if write_url:
+            self.write_endpoint = self._find(write_url)
+        self.max_failures = max_failures
+        self.down_time = down_time
+        self.latency_weight = latency_weight
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _find(self, url):
+        '''
+        return the endpoint with url, adding it if necessary
+        '''
+
+        for endpoint in self.endpoints:
+            if endpoint.url == url:
+                return endpoint
+        endpoint = Endpoint(url)
+        self.endpoints.append(endpoint)
+        return endpoint
+
+    def select(self, write=False, exclude=()):
+        '''
+        select the endpoint for the next request
+
+        If every endpoint is down, the one coming back first is returned.
+
+        :param write: the request modifies objects
+        :type write: bool
+        :param exclude: endpoints already tried for this request
+        :type exclude: collection
+        :returns: the endpoint or None if all are excluded
+        :rtype: Endpoint
+        '''
+
+        now = time.time()
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints
+                          if endpoint not in exclude]
+            if not candidates:
+                return None
+            available = [endpoint for endpoint in candidates
+                         if endpoint.available(now)]
+            if not available:
+                return min(candidates,
+                           key=lambda endpoint: endpoint.down_until)
+            if write and self.write_endpoint in available:
+                return self.write_endpoint
+            if self.strategy == LEAST_LATENCY:
+                # endpoints without measurement first, to measure them
+                return min(available, key=lambda endpoint: (
+                    endpoint.latency is not None, endpoint.latency))
+            return available[next(self._counter) % len(available)]
+
+    def has_alternative(self, exclude):
+        '''
+        return True if an available endpoint is not excluded
+
+        :param exclude: endpoints already tried
+        :type exclude: collection
+        :rtype: bool
+        '''
+
+        now = time.time()
+        with self._lock:
+            return any(endpoint.available(now)
+                       for endpoint in self.endpoints
+                       if endpoint not in exclude)
+
+    def record_success(self, endpoint, duration=None):
+        '''
+        record a successful request
+
+        :param endpoint: the endpoint
+        :type endpoint: Endpoint
+        :param duration: the response time in seconds
+        :type duration: float
+        '''
+
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.failures = 0
+            endpoint.down_until = 0
+            if duration is not None:
+                if endpoint.latency is None:
+                    endpoint.latency = duration
+                else:
+                    endpoint.latency += self.latency_weight * (
+                        duration - endpoint.latency)
+
+    def record_failure(self, endpoint):
+        '''
+        record a failed request, mark the endpoint down if it failed too
+        often
+
+        :param endpoint: the endpoint
+        :type endpoint: Endpoint
+        '''
+
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.errors += 1
+            endpoint.failures += 1
+            if endpoint.failures >= self.max_failures:
+                if endpoint.available(time.time()):
+                    LOG.warning("Endpoint %s marked down for %ss",
+                                endpoint.url, self.down_time)
+                endpoint.down_until = time.time() + self.down_time
+
+    def stats(self):
+        '''
+        return the state of every endpoint
+
+        :returns: url, availability, latency and counters by endpoint
+        :rtype: list
+        '''
+
+        now = time.time()
+        with self._lock:
+            return [{
+                'url': endpoint.url,
+                'available': endpoint.available(now),
+                'write': endpoint is self.write_endpoint,
+                'latency': endpoint.latency,
+                'requests': endpoint.requests,
+                'errors': endpoint.errors,
+            } for endpoint in self.endpoints]
@@ -28,12 +28,93 @@ Icinga 2 API events
 
 from __future__ import print_function
 import logging
+import time
+
+from requests.exceptions import RequestException
 
 from icinga2api.base import Base
+from icinga2api.eventtypes import decode_event
+from icinga2api.exceptions import Icinga2ApiException
 
 LOG = logging.getLogger(__name__)
 
 
+class SubscriptionStats(object):
+    '''
+    connection metrics of one event queue
+    '''
+
+    def __init__(self):
+        '''
+        initialize object
+        '''
+
+        self.connects = 0
+        self.reconnects = 0
+        self.events = 0
+        self.last_event = None
+        self.disconnected_since = None
+        self.gap_last = None
+        self.gap_max = 0.0
+        self.gap_total = 0.0
+
+    def connected(self):
+        '''
+        record an established stream
+
+        :returns: the duration of the gap before, if it was a reconnect
+        :rtype: float
+        '''
+
+        self.connects += 1
+        if self.disconnected_since is None:
+            return None
+        gap = time.time() - self.disconnected_since
+        self.disconnected_since = None
+        self.reconnects += 1
+        self.gap_last = gap
+        self.gap_max = max(self.gap_max, gap)
+        self.gap_total += gap
+        return gap
+
+    def disconnected(self):
+        '''
+        record a lost stream
+        '''
+
+        if self.disconnected_since is None:
+            self.disconnected_since = time.time()
+
+    def event(self):
+        '''
+        record a received event
+        '''
+
+        self.events += 1
+        self.last_event = time.time()
+
+    def as_dict(self):
+        '''
+        return the metrics
+
+        :rtype: dictionary
+        '''
+
+        return {
+            'connected': self.connects > 0 and
+                         self.disconnected_since is None,
+            'connects': self.connects,
+            'reconnects': self.reconnects,
+            'events': self.events,
+            'last_event': self.last_event,
+            'gap_current': time.time() - self.disconnected_since
+                           if self.disconnected_since is not None else None,
+            'gap_last': self.gap_last,
+            'gap_max': self.gap_max,
+            'gap_total': self.gap_total,
+        }
+
+
 class Events(Base):
     '''
     Icinga 2 API events class
@@ -41,11 +122,26 @@ class Events(Base):
 
     base_url_path = 'v1/events'
 
+    def __init__(self, manager):
+        '''
+        initialize object
+        '''
+
+        super(Events, self).__init__(manager)
+        self.subscriptions = {}
+
     def subscribe(self,
                   types,
                   queue,
                   filters=None,
-                  filter_vars=None):
+                  filter_vars=None,
+                  decode=False,
+                  reconnect=False,
+                  idle_timeout=None,
+                  on_reconnect=None,
+                  reconnect_delay=1,
+                  reconnect_delay_max=60,
+                  on_connect=None):
         '''
         subscribe to an event stream
 
@@ -56,6 +152,16 @@ class Events(Base):
         for event in subscribe(types, queue, filters):
             print event
 
+        example 2:
+        for event in subscribe(["CheckResult"], "monitor", decode=True):
+            print event.host, event.state, event.check_result.output
+
+        example 3:
+        for event in subscribe(["CheckResult"], "monitor", reconnect=True,
+                               idle_timeout=300,
+                               on_reconnect=lambda gap: resync()):
+            print event
+
         :param types: the event types to return
         :type types: array
         :param queue: the queue name to subscribe to
@@ -64,9 +170,109 @@ class Events(Base):
         :type filters: string
         :param filter_vars: variables used in the filters expression
         :type filter_vars: dict
+        :param decode: return typed event objects instead of JSON strings
+        :type decode: bool
+        :param reconnect: reconnect with the same queue name when the stream
+                          ends or breaks, instead of raising
+        :type reconnect: bool
+        :param idle_timeout: consider the stream dead after this many seconds
+                             without data
+        :type idle_timeout: float
+        :param on_reconnect: called with the gap duration in seconds after a
+                             reconnect, before the next event is returned
+        :type on_reconnect: callable
+        :param reconnect_delay: seconds to wait before the first reconnect,
+                                doubled after every failed attempt
+        :type reconnect_delay: float
+        :param reconnect_delay_max: maximum seconds between two reconnects
+        :type reconnect_delay_max: float
+        :param on_connect: called after every connect, including the first,
+                           before the first event is read, with the gap
+                           duration or None for the first connect
+        :type on_connect: callable
         :returns: the events
-        :rtype: string
+        :rtype: string or Event
+        '''
+        payload = self._subscribe_payload(types, queue, filters, filter_vars)
+        stats = self.subscriptions.setdefault(queue, SubscriptionStats())
+        delay = reconnect_delay
+
+        try:
+            while True:
+                try:
+                    stream = self._request(
+                        'POST',
+                        self.base_url_path,
+                        payload,
+                        stream=True,
+                        timeout=self._stream_timeout(idle_timeout)
+                    )
+                    gap = stats.connected()
+                    delay = reconnect_delay
+                    if gap is not None:
+                        LOG.info("Event stream %s reconnected after %.1fs",
+                                 queue, gap)
+                        if on_reconnect is not None:
+                            on_reconnect(gap)
+                    if on_connect is not None:
+                        on_connect(gap)
+                    for event in self._get_message_from_stream(stream):
+                        stats.event()
+                        if decode:
+                            if event:
+                                yield decode_event(
+                                    event, self.manager.codec.loads)
+                        else:
+                            yield event
+                except (Icinga2ApiException, RequestException) as error:
+                    if not reconnect:
+                        raise
+                    LOG.warning("Event stream %s broke: %s", queue, error)
+                stats.disconnected()
+                if not reconnect:
+                    return
+                LOG.info("Reconnecting event stream %s in %.1fs", queue, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, reconnect_delay_max)
+        finally:
+            stats.disconnected()
+
+    def _stream_timeout(self, idle_timeout):
+        '''
+        return the connect and read timeout of the event stream
         '''
+
+        if idle_timeout is None:
+            return None
+        connect_timeout = self.manager.timeout
+        if connect_timeout is not None:
+            connect_timeout = float(connect_timeout)
+        return (connect_timeout, idle_timeout)
+
+    def stats(self, queue=None):
+        '''
+        return the connection metrics of the subscriptions
+
+        :param queue: only return the metrics of this queue
+        :type queue: string
+        :returns: connects, reconnects, events and gap durations by queue
+        :rtype: dictionary
+        '''
+
+        if queue is not None:
+            return self.subscriptions[queue].as_dict()
+        return dict((name, stats.as_dict())
+                    for name, stats in self.subscriptions.items())
+
+    @staticmethod
+    def _subscribe_payload(types, queue, filters=None, filter_vars=None):
+        '''
+        build the payload of a subscribe request
+
+        :returns: the payload
+        :rtype: dictionary
+        '''
+
         payload = {
             "types": types,
             "queue": queue,
@@ -76,11 +282,4 @@ class Events(Base):
         if filter_vars:
             payload["filter_vars"] = filter_vars
 
-        stream = self._request(
-            'POST',
-            self.base_url_path,
-            payload,
-            stream=True
-        )
-        for event in self._get_message_from_stream(stream):
-            yield event
+        return payload
@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API event types
+
+Typed, read-only views on the JSON events returned by the event stream.
+Nested structures like the check result are only wrapped when accessed.
+'''
+
+from __future__ import print_function
+import json
+import logging
+
+from icinga2api.perfdata import parse_perfdata
+
+LOG = logging.getLogger(__name__)
+
+
+def _field(name):
+    '''
+    create a read-only property for a top level event field
+    '''
+
+    return property(lambda self: self._data.get(name))
+
+
+class CheckResult(object):
+    '''
+    check result as contained in CheckResult, StateChange and Notification
+    events
+    '''
+
+    __slots__ = ('_data', '_perfdata')
+
+    def __init__(self, data):
+        '''
+        initialize object
+
+        :param data: the decoded check result
+        :type data: dictionary
+        '''
+
+        self._data = data
+        self._perfdata = None
+
+    active = _field('active')
+    check_source = _field('check_source')
+    command = _field('command')
+    execution_end = _field('execution_end')
+    execution_start = _field('execution_start')
+    exit_status = _field('exit_status')
+    output = _field('output')
+    performance_data = _field('performance_data')
+    schedule_end = _field('schedule_end')
+    schedule_start = _field('schedule_start')
+    state = _field('state')
+    vars_after = _field('vars_after')
+    vars_before = _field('vars_before')
+
+    @property
+    def perfdata(self):
+        '''
+        the parsed performance data as a list of PerfdataValue objects,
+        parsed on first access
+        '''
+
+        if self._perfdata is None:
+            self._perfdata = parse_perfdata(
+                self._data.get('performance_data'))
+        return self._perfdata
+
+    @property
+    def execution_time(self):
+        '''
+        the plugin's execution time in seconds
+        '''
+
+        start = self._data.get('execution_start')
+        end = self._data.get('execution_end')
+        if start is None or end is None:
+            return None
+        return end - start
+
+    @property
+    def latency(self):
+        '''
+        the time between scheduling and executing the check in seconds
+        '''
+
+        schedule_start = self._data.get('schedule_start')
+        schedule_end = self._data.get('schedule_end')
+        execution_time = self.execution_time
+        if schedule_start is None or schedule_end is None or \
+                execution_time is None:
+            return None
+        return schedule_end - schedule_start - execution_time
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def get(self, key, default=None):
+        '''
+        return a raw field of the check result
+        '''
+
+        return self._data.get(key, default)
+
+    def __repr__(self):
+        return '<CheckResult state={0!r} exit_status={1!r}>'.format(
+            self.state, self.exit_status)
+
+
+class Event(object):
+    '''
+    Icinga 2 API event base class
+
+    The event also behaves like the decoded dictionary, so ``event['host']``
+    keeps working.
+    '''
+
+    __slots__ = ('_data', '_check_result')
+
+    event_type = None
+
+    def __init__(self, data):
+        '''
+        initialize object
+
+        :param data: the decoded event
+        :type data: dictionary
+        '''
+
+        self._data = data
+        self._check_result = None
+
+    type = _field('type')
+    timestamp = _field('timestamp')
+    host = _field('host')
+    service = _field('service')
+
+    @property
+    def data(self):
+        '''
+        the decoded event
+        '''
+
+        return self._data
+
+    @property
+    def object_name(self):
+        '''
+        the full name of the host or service the event belongs to
+        '''
+
+        host = self.host
+        service = self.service
+        if service:
+            return '{0}!{1}'.format(host, service)
+        return host
+
+    @property
+    def check_result(self):
+        '''
+        the check result wrapped on first access
+        '''
+
+        if self._check_result is None:
+            data = self._data.get('check_result')
+            if data is not None:
+                self._check_result = CheckResult(data)
+        return self._check_result
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        '''
+        return a raw field of the event
+        '''
+
+        return self._data.get(key, default)
+
+    def __repr__(self):
+        return '<{0} {1!r}>'.format(self.__class__.__name__, self.object_name)
+
+
+class CheckResultEvent(Event):
+    '''
+    CheckResult event
+    '''
+
+    __slots__ = ()
+    event_type = 'CheckResult'
+
+    acknowledgement = _field('acknowledgement')
+    downtime_depth = _field('downtime_depth')
+
+    @property
+    def state(self):
+        '''
+        the state of the check result, without wrapping the check result
+        '''
+
+        check_result = self._data.get('check_result')
+        if check_result is None:
+            return None
+        return check_result.get('state')
+
+
+class StateChangeEvent(Event):
+    '''
+    StateChange event
+    '''
+
+    __slots__ = ()
+    event_type = 'StateChange'
+
+    state = _field('state')
+    state_type = _field('state_type')
+    acknowledgement = _field('acknowledgement')
+    downtime_depth = _field('downtime_depth')
+
+
+class NotificationEvent(Event):
+    '''
+    Notification event
+    '''
+
+    __slots__ = ()
+    event_type = 'Notification'
+
+    command = _field('command')
+    users = _field('users')
+    notification_type = _field('notification_type')
+    author = _field('author')
+    text = _field('text')
+
+
+class FlappingEvent(Event):
+    '''
+    Flapping event
+    '''
+
+    __slots__ = ()
+    event_type = 'Flapping'
+
+    state = _field('state')
+    state_type = _field('state_type')
+    is_flapping = _field('is_flapping')
+    flapping_current = _field('flapping_current')
+    threshold_low = _field('threshold_low')
+    threshold_high = _field('threshold_high')
+
+
+class AcknowledgementSetEvent(Event):
+    '''
+    AcknowledgementSet event
+    '''
+
+    __slots__ = ()
+    event_type = 'AcknowledgementSet'
+
+    state = _field('state')
+    state_type = _field('state_type')
+    author = _field('author')
+    comment = _field('comment')
+    acknowledgement_type = _field('acknowledgement_type')
+    notify = _field('notify')
+    expiry = _field('expiry')
+
+
+class AcknowledgementClearedEvent(Event):
+    '''
+    AcknowledgementCleared event
+    '''
+
+    __slots__ = ()
+    event_type = 'AcknowledgementCleared'
+
+    state = _field('state')
+    state_type = _field('state_type')
+
+
+class CommentEvent(Event):
+    '''
+    CommentAdded and CommentRemoved events
+    '''
+
+    __slots__ = ()
+
+    comment = _field('comment')
+
+    @property
+    def host(self):
+        return (self._data.get('comment') or {}).get('host_name')
+
+    @property
+    def service(self):
+        return (self._data.get('comment') or {}).get('service_name')
+
+
+class CommentAddedEvent(CommentEvent):
+    '''
+    CommentAdded event
+    '''
+
+    __slots__ = ()
+    event_type = 'CommentAdded'
+
+
+class CommentRemovedEvent(CommentEvent):
+    '''
+    CommentRemoved event
+    '''
+
+    __slots__ = ()
+    event_type = 'CommentRemoved'
+
+
+class DowntimeEvent(Event):
+    '''
+    DowntimeAdded, DowntimeRemoved, DowntimeStarted and DowntimeTriggered
+    events
+    '''
+
+    __slots__ = ()
+
+    downtime = _field('downtime')
+
+    @property
+    def host(self):
+        return (self._data.get('downtime') or {}).get('host_name')
+
+    @property
+    def service(self):
+        return (self._data.get('downtime') or {}).get('service_name')
+
+
+class DowntimeAddedEvent(DowntimeEvent):
+    '''
+    DowntimeAdded event
+    '''
+
+    __slots__ = ()
+    event_type = 'DowntimeAdded'
+
+
+class DowntimeRemovedEvent(DowntimeEvent):
+    '''
+    DowntimeRemoved event
+    '''
+
+    __slots__ = ()
+    event_type = 'DowntimeRemoved'
+
+
+class DowntimeStartedEvent(DowntimeEvent):
+    '''
+    DowntimeStarted event
+    '''
+
+    __slots__ = ()
+    event_type = 'DowntimeStarted'
+
+
+class DowntimeTriggeredEvent(DowntimeEvent):
+    '''
+    DowntimeTriggered event
+    '''
+
+    __slots__ = ()
+    event_type = 'DowntimeTriggered'
+
+
+class ObjectEvent(Event):
+    '''
+    ObjectCreated, ObjectModified and ObjectDeleted events
+    '''
+
+    __slots__ = ()
+
+    object_type = _field('object_type')
+    object_name = _field('object_name')
+
+
+class ObjectCreatedEvent(ObjectEvent):
+    '''
+    ObjectCreated event
+    '''
+
+    __slots__ = ()
+    event_type = 'ObjectCreated'
+
+
+class ObjectModifiedEvent(ObjectEvent):
+    '''
+    ObjectModified event
+    '''
+
+    __slots__ = ()
+    event_type = 'ObjectModified'
+
+
+class ObjectDeletedEvent(ObjectEvent):
+    '''
+    ObjectDeleted event
+    '''
+
+    __slots__ = ()
+    event_type = 'ObjectDeleted'
+
+
+EVENT_TYPES = dict(
+    (cls.event_type, cls) for cls in (
+        CheckResultEvent,
+        StateChangeEvent,
+        NotificationEvent,
+        FlappingEvent,
+        AcknowledgementSetEvent,
+        AcknowledgementClearedEvent,
+        CommentAddedEvent,
+        CommentRemovedEvent,
+        DowntimeAddedEvent,
+        DowntimeRemovedEvent,
+        DowntimeStartedEvent,
+        DowntimeTriggeredEvent,
+        ObjectCreatedEvent,
+        ObjectModifiedEvent,
+        ObjectDeletedEvent,
+    )
+)
+
+
+def decode_event(message, loads=json.loads):
+    '''
+    decode a message of the event stream into a typed event
+
+    :param message: one line of the event stream
+    :type message: string
+    :param loads: the JSON decoder, e.g. of the client's codec
+    :type loads: callable
+    :returns: the event, ``Event`` for unknown event types
+    :rtype: Event
+    '''
+
+    data = loads(message)
+    return EVENT_TYPES.get(data.get('type'), Event)(data)
@@ -51,3 +51,9 @@ class Icinga2ApiConfigFileException(Exception):
 
     def __str__(self):
         return str(self.error)
+
+
+class Icinga2ApiCircuitOpenException(Icinga2ApiException):
+    '''
+    Icinga 2 API exception raised while the circuit breaker is open
+    '''
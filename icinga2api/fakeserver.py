@@ -0,0 +1,1138 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Fake Icinga 2 API server
+
+An in-process HTTP server implementing the endpoints used by the library:
+``v1/objects``, ``v1/actions``, ``v1/status`` and the streamed ``v1/events``.
+It serves synthetic hosts and services, applies filters with
+``icinga2api.filters`` and can add latency and inject errors, for offline
+load tests and benchmarks.
+
+Every response is written with one write call, the headers are not sent ahead
+of the body, so keep-alive requests do not wait for delayed ACKs.
+
+usage: python -m icinga2api.fakeserver --hosts 100000 --port 5665
+'''
+
+from __future__ import print_function
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+
+# pylint: disable=import-error,no-name-in-module
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import unquote
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+# pylint: enable=import-error,no-name-in-module
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.filters import compile_filter, match_event
+from icinga2api.objects import OBJECT_TYPES
+
+LOG = logging.getLogger(__name__)
+
+TYPE_OF_URL_PATH = dict(
+    (url_path, object_type) for object_type, url_path in OBJECT_TYPES.items())
+
+# actions that only report success
+_PLAIN_ACTIONS = ('reschedule-check', 'send-custom-notification',
+                  'delay-notification')
+
+# queued for a new event stream to send the burst of synthetic events
+_BURST = object()
+
+# the checks of the generated services and their performance data
+SERVICE_CHECKS = (
+    ('ping4', lambda n: [
+        'rta={0:.6f}ms;3000.000000;5000.000000;0.000000'.format(n % 97 / 10.0),
+        'pl={0}%;80;100;0'.format(n % 3)]),
+    ('disk', lambda n: [
+        '/={0}MB;15000;18000;0;20000'.format(n % 20000),
+        '/var={0}MB;15000;18000;0;20000'.format(n % 19000)]),
+    ('load', lambda n: [
+        'load1={0:.3f};5;10;0'.format(n % 7 / 3.0),
+        'load5={0:.3f};4;6;0'.format(n % 5 / 3.0),
+        'load15={0:.3f};3;4;0'.format(n % 3 / 3.0)]),
+    ('http', lambda n: [
+        'time={0:.6f}s;1;5;0'.format(n % 13 / 100.0),
+        'size={0}B;;;0'.format(1000 + n % 500)]),
+    ('ssh', lambda n: ['time={0:.6f}s;;;0.000000;10.000000'.format(
+        n % 11 / 100.0)]),
+)
+
+
+def _check_result(state, output, performance_data, timestamp):
+    '''
+    create a check result
+    '''
+
+    return {
+        'active': True,
+        'check_source': 'fake-master',
+        'command': None,
+        'execution_end': timestamp,
+        'execution_start': timestamp,
+        'exit_status': state,
+        'output': output,
+        'performance_data': performance_data,
+        'schedule_end': timestamp,
+        'schedule_start': timestamp,
+        'state': state,
+        'type': 'CheckResult',
+        'vars_after': {'attempt': 1.0, 'reachable': True,
+                       'state': state, 'state_type': 1.0},
+        'vars_before': {'attempt': 1.0, 'reachable': True,
+                        'state': state, 'state_type': 1.0},
+    }
+
+
+def generate_hosts(count, timestamp=1500000000.0):
+    '''
+    generate synthetic hosts
+
+    Every 20th host is down, the hosts are spread over ten host groups.
+
+    :param count: the number of hosts
+    :type count: int
+    :param timestamp: the time of the last check results
+    :type timestamp: float
+    :returns: the hosts as returned by ``Objects.list``
+    :rtype: generator
+    '''
+
+    for number in range(count):
+        name = 'host{0:06d}.example.com'.format(number)
+        state = 1 if number % 20 == 19 else 0
+        yield {
+            'name': name,
+            'type': 'Host',
+            'meta': {},
+            'attrs': {
+                '__name': name,
+                'name': name,
+                'display_name': name,
+                'address': '10.{0}.{1}.{2}'.format(
+                    number >> 16 & 255, number >> 8 & 255, number & 255),
+                'check_command': 'hostalive',
+                'check_interval': 60.0,
+                'groups': ['linux-servers', 'group{0}'.format(number % 10)],
+                'vars': {'os': 'Linux', 'rack': number % 42},
+                'state': state,
+                'state_type': 1,
+                'last_check': timestamp,
+                'last_check_result': _check_result(
+                    state,
+                    'PING OK' if not state else 'PING CRITICAL',
+                    ['rta=0.05ms;3000;5000;0', 'pl=0%;80;100;0'],
+                    timestamp),
+                'acknowledgement': 0,
+                'downtime_depth': 0,
+                'enable_active_checks': True,
+                'zone': 'master',
+            },
+        }
+
+
+def generate_services(hosts, per_host, timestamp=1500000000.0):
+    '''
+    generate synthetic services for hosts
+
+    Every 10th service is WARNING and every 50th CRITICAL.
+
+    :param hosts: the names of the hosts
+    :type hosts: iterable
+    :param per_host: the number of services per host
+    :type per_host: int
+    :param timestamp: the time of the last check results
+    :type timestamp: float
+    :returns: the services as returned by ``Objects.list``
+    :rtype: generator
+    '''
+
+    number = 0
+    for host in hosts:
+        for index in range(per_host):
+            check, perfdata = SERVICE_CHECKS[index % len(SERVICE_CHECKS)]
+            short_name = check if index < len(SERVICE_CHECKS) else \
+                '{0}-{1}'.format(check, index)
+            name = '{0}!{1}'.format(host, short_name)
+            state = 2 if number % 50 == 49 else (1 if number % 10 == 9 else 0)
+            yield {
+                'name': name,
+                'type': 'Service',
+                'meta': {},
+                'attrs': {
+                    '__name': name,
+                    'name': short_name,
+                    'display_name': short_name,
+                    'host_name': host,
+                    'check_command': check,
+                    'check_interval': 60.0,
+                    'groups': [check],
+                    'vars': {},
+                    'state': state,
+                    'state_type': 1,
+                    'last_check': timestamp,
+                    'last_check_result': _check_result(
+                        state,
+                        '{0} {1}'.format(check.upper(),
+                                         ('OK', 'WARNING', 'CRITICAL')[state]),
+                        perfdata(number),
+                        timestamp),
+                    'acknowledgement': 0,
+                    'downtime_depth': 0,
+                    'enable_active_checks': True,
+                    'zone': 'master',
+                },
+            }
+            number += 1
+
+
+class FakeDataset(object):
+    '''
+    the objects of the fake server by type and name
+    '''
+
+    def __init__(self, hosts=100, services_per_host=10):
+        '''
+        initialize object
+
+        :param hosts: the number of generated hosts
+        :type hosts: int
+        :param services_per_host: the number of generated services per host
+        :type services_per_host: int
+        '''
+
+        self.lock = threading.RLock()
+        self.objects = {}
+        self.encoded = {}
+        self.serial = 0
+        host_names = []
+        host_store = self.store('Host')
+        for host in generate_hosts(hosts):
+            host_store[host['name']] = host
+            host_names.append(host['name'])
+        service_store = self.store('Service')
+        for service in generate_services(host_names, services_per_host):
+            service_store[service['name']] = service
+
+    def store(self, object_type):
+        '''
+        return the objects of a type by name
+        '''
+
+        return self.objects.setdefault(object_type, {})
+
+    def get(self, object_type, name):
+        '''
+        return an object, None if it does not exist
+        '''
+
+        return self.objects.get(object_type, {}).get(name)
+
+    def encode(self, results):
+        '''
+        return the JSON of a list response, the objects are encoded once
+        until they change
+        '''
+
+        encoded = self.encoded
+        parts = []
+        for result in results:
+            key = (result['type'], result['name'])
+            data = encoded.get(key)
+            if data is None:
+                data = encoded[key] = json.dumps(result).encode('utf-8')
+            parts.append(data)
+        return b'{"results":[' + b','.join(parts) + b']}'
+
+    def changed(self, result):
+        '''
+        drop the cached JSON of a changed object
+        '''
+
+        self.encoded.pop((result['type'], result['name']), None)
+
+    def variables(self, result):
+        '''
+        return the filter variables of an object, services also get their
+        host
+        '''
+
+        variables = {result['type'].lower(): result['attrs']}
+        host_name = result['attrs'].get('host_name')
+        if host_name and result['type'] != 'Host':
+            host = self.get('Host', host_name)
+            if host is not None:
+                variables['host'] = host['attrs']
+        return variables
+
+    def select(self, object_type, name=None, filters=None, filter_vars=None):
+        '''
+        return the objects of a type matching a name or a filter
+        '''
+
+        if name is not None:
+            result = self.get(object_type, name)
+            return [result] if result is not None else []
+        results = list(self.store(object_type).values())
+        if filters:
+            function = compile_filter(filters)
+            results = [result for result in results
+                       if function(self.variables(result), filter_vars)]
+        return results
+
+    def create(self, object_type, name, attrs):
+        '''
+        create an object
+        '''
+
+        attrs = dict(attrs or {})
+        attrs['__name'] = name
+        if object_type == 'Service' and '!' in name:
+            attrs['host_name'], attrs['name'] = name.split('!', 1)
+        else:
+            attrs.setdefault('name', name)
+        attrs.setdefault('state', 0)
+        attrs.setdefault('acknowledgement', 0)
+        attrs.setdefault('downtime_depth', 0)
+        result = {'name': name, 'type': object_type, 'meta': {},
+                  'attrs': attrs}
+        self.store(object_type)[name] = result
+        self.changed(result)
+        return result
+
+    def delete(self, result, cascade=False):
+        '''
+        delete an object and, with cascade, the objects referencing it
+        '''
+
+        deleted = [result]
+        self.store(result['type']).pop(result['name'], None)
+        self.changed(result)
+        if cascade and result['type'] == 'Host':
+            for object_type in ('Service', 'Downtime', 'Comment'):
+                for other in list(self.store(object_type).values()):
+                    if other['attrs'].get('host_name') == result['name']:
+                        deleted.extend(self.delete(other, cascade))
+        return deleted
+
+    def next_name(self, object_name):
+        '''
+        return a unique name for a downtime or comment
+        '''
+
+        self.serial += 1
+        return '{0}!fake-{1}'.format(object_name, self.serial)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    '''
+    request handler of the fake server
+    '''
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'Icinga/fake'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOG.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self._handle()
+
+    do_POST = do_PUT = do_DELETE = do_GET
+
+    def _respond(self, status, body, headers=None):
+        '''
+        send a complete response with one write
+        '''
+
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        lines = [
+            'HTTP/1.1 {0} {1}'.format(status, self.responses.get(
+                status, ('Unknown',))[0]),
+            'Server: {0}'.format(self.server_version),
+            'Content-Type: application/json',
+            'Content-Length: {0}'.format(len(body)),
+        ]
+        for header in (headers or {}).items():
+            lines.append('{0}: {1}'.format(*header))
+        self.wfile.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') +
+                         body)
+        self.server.fake.count(status)
+
+    def _error(self, status, message):
+        self._respond(status, {'error': status, 'status': message})
+
+    def _handle(self):
+        fake = self.server.fake
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            payload = json.loads(body.decode('utf-8')) if body else {}
+        except ValueError:
+            self._error(400, 'Invalid request body.')
+            return
+        method = (self.headers.get('X-HTTP-Method-Override') or
+                  self.command).upper()
+        path = [unquote(part) for part in
+                self.path.split('?', 1)[0].strip('/').split('/')]
+
+        fake.delay()
+        status = fake.injected_error()
+        if status:
+            self._error(status, 'Injected error.')
+            return
+
+        try:
+            if path[:2] == ['v1', 'objects'] and len(path) > 2:
+                self._objects(fake, method, path[2], path[3:], payload)
+            elif path[:2] == ['v1', 'actions'] and len(path) == 3:
+                self._respond(*fake.action(path[2], payload))
+            elif path[:2] == ['v1', 'status']:
+                self._respond(*fake.status(
+                    path[2] if len(path) > 2 else None))
+            elif path == ['v1', 'events']:
+                self._events(fake, payload)
+            else:
+                self._error(404, 'The requested path could not be found.')
+        except Icinga2ApiException as error:
+            self._error(400, str(error))
+
+    def _objects(self, fake, method, url_path, name, payload):
+        object_type = TYPE_OF_URL_PATH.get(url_path)
+        if object_type is None:
+            self._error(404, 'Invalid type specified.')
+            return
+        name = '/'.join(name) or None
+        if method == 'GET':
+            self._respond(*fake.list(object_type, name, payload))
+        elif method == 'PUT' and name:
+            self._respond(*fake.create(object_type, name, payload))
+        elif method == 'POST' and name:
+            self._respond(*fake.update(object_type, name, payload))
+        elif method == 'DELETE':
+            self._respond(*fake.delete(object_type, name, payload))
+        else:
+            self._error(400, 'Invalid request.')
+
+    def _events(self, fake, payload):
+        '''
+        stream events in chunks until the server stops
+        '''
+
+        types = payload.get('types')
+        if not types or not payload.get('queue'):
+            self._error(400, "'types' and 'queue' are required.")
+            return
+        subscriber = fake.subscribe(types, payload.get('filter'))
+        self.close_connection = True
+        self.wfile.write(
+            'HTTP/1.1 200 OK\r\nServer: {0}\r\n'
+            'Content-Type: application/json\r\n'
+            'Transfer-Encoding: chunked\r\n\r\n'.format(
+                self.server_version).encode('latin-1'))
+        try:
+            for data in fake.stream(subscriber):
+                self.wfile.write(
+                    '{0:x}\r\n'.format(len(data)).encode('latin-1') +
+                    data + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except (IOError, OSError):
+            LOG.debug("Event subscriber disconnected")
+        finally:
+            fake.unsubscribe(subscriber)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeIcinga2Server(object):
+    '''
+    in-process fake Icinga 2 API
+
+    Any user name and password is accepted.
+
+    example 1:
+    with FakeIcinga2Server(hosts=100000, services_per_host=10) as server:
+        client = Client(server.url, 'root', 'icinga')
+        client.objects.list('Service', filters='service.state == 2')
+
+    example 2:
+    server = FakeIcinga2Server(latency=(0.01, 0.05), error_rate=0.01,
+                               event_rate=1000)
+    server.start()
+    '''
+
+    def __init__(self,
+                 hosts=100,
+                 services_per_host=10,
+                 address='127.0.0.1',
+                 port=0,
+                 latency=0,
+                 error_rate=0.0,
+                 error_status=503,
+                 event_rate=0,
+                 event_burst=0,
+                 seed=None):
+        '''
+        initialize object
+
+        :param hosts: the number of generated hosts
+        :type hosts: int
+        :param services_per_host: the number of generated services per host
+        :type services_per_host: int
+        :param address: the listen address
+        :type address: string
+        :param port: the listen port, 0 picks a free one
+        :type port: int
+        :param latency: seconds added to every request, (min, max) for a
+                        random latency
+        :type latency: float or tuple
+        :param error_rate: the share of requests answered with an error
+        :type error_rate: float
+        :param error_status: the HTTP status of injected errors
+        :type error_status: int
+        :param event_rate: synthetic CheckResult events per second sent to
+                           the event streams
+        :type event_rate: float
+        :param event_burst: synthetic CheckResult events sent at once to
+                            every new CheckResult stream without a filter,
+                            which then ends
+        :type event_burst: int
+        :param seed: the seed of latencies, errors and synthetic events
+        :type seed: int
+        '''
+
+        self.dataset = FakeDataset(hosts, services_per_host)
+        self.address = address
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.event_rate = event_rate
+        self.event_burst = event_burst
+        self.random = random.Random(seed)
+        self._started = time.time()
+        self._server = None
+        self._threads = []
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.requests = 0
+        self.errors = 0
+        self.events = 0
+
+    @property
+    def url(self):
+        '''
+        the URL of the API, e.g. ``http://127.0.0.1:35123/``
+        '''
+
+        return 'http://{0}:{1}/'.format(self.address, self.port)
+
+    def start(self):
+        '''
+        start serving on background threads
+        '''
+
+        self._stop.clear()
+        self._server = _Server((self.address, self.port), _Handler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        targets = [self._server.serve_forever]
+        if self.event_rate:
+            targets.append(self._generate_events)
+        for target in targets:
+            thread = threading.Thread(target=target,
+                                      name='icinga2api-fakeserver')
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        LOG.info("Fake Icinga 2 API listening on %s", self.url)
+        return self
+
+    def stop(self):
+        '''
+        stop serving and end the event streams
+        '''
+
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def count(self, status):
+        '''
+        count a response
+        '''
+
+        with self._lock:
+            self.requests += 1
+            if status >= 400:
+                self.errors += 1
+
+    def delay(self):
+        '''
+        wait the configured latency
+        '''
+
+        latency = self.latency
+        if isinstance(latency, (list, tuple)):
+            latency = self.random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def injected_error(self):
+        '''
+        return the status of an injected error, None for none
+        '''
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self.error_status
+        return None
+
+    def stats(self):
+        '''
+        return server metrics
+
+        :returns: answered requests, errors, sent events and the number of
+                  event streams
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'events': self.events,
+                'subscribers': len(self._subscribers),
+            }
+
+    # objects
+
+    def _result(self, result, attrs, joins):
+        '''
+        shape an object like the API does for the requested attrs and joins
+        '''
+
+        data = {'name': result['name'], 'type': result['type'],
+                'meta': result.get('meta', {}), 'joins': {}}
+        if attrs:
+            data['attrs'] = dict((attr, result['attrs'].get(attr))
+                                 for attr in attrs)
+        else:
+            data['attrs'] = result['attrs']
+        for join in joins:
+            target, _, attr = join.partition('.')
+            variables = self.dataset.variables(result)
+            if target not in variables or target == result['type'].lower():
+                continue
+            joined = data['joins'].setdefault(target, {})
+            if attr:
+                joined[attr] = variables[target].get(attr)
+            else:
+                joined.update(variables[target])
+        return data
+
+    def list(self, object_type, name, payload):
+        '''
+        answer an object query
+        '''
+
+        with self.dataset.lock:
+            results = self.dataset.select(
+                object_type, name, payload.get('filter'),
+                payload.get('filter_vars'))
+            if name is not None and not results:
+                return 404, {'error': 404, 'status': 'No objects found.'}
+            joins = payload.get('joins') or []
+            if payload.get('all_joins'):
+                joins = ['host']
+            attrs = payload.get('attrs')
+            if not attrs and not joins:
+                return 200, self.dataset.encode(results)
+            # encoded while locked, updates change the attrs in place
+            return 200, json.dumps({'results': [
+                self._result(result, attrs, joins) for result in results
+            ]}).encode('utf-8')
+
+    def create(self, object_type, name, payload):
+        '''
+        create an object
+        '''
+
+        with self.dataset.lock:
+            if self.dataset.get(object_type, name) is not None:
+                return 500, {'results': [{
+                    'code': 500,
+                    'errors': ['Object already exists.'],
+                    'status': 'Object could not be created.'}]}
+            self.dataset.create(object_type, name, payload.get('attrs'))
+        return 200, {'results': [{'code': 200,
+                                  'status': 'Object was created'}]}
+
+    def update(self, object_type, name, payload):
+        '''
+        update the attributes of an object
+        '''
+
+        attrs = payload.get('attrs')
+        if not isinstance(attrs, dict):
+            return 400, {'error': 400,
+                         'status': "Invalid request body: 'attrs' missing."}
+        with self.dataset.lock:
+            result = self.dataset.get(object_type, name)
+            if result is None:
+                return 404, {'error': 404, 'status': 'No objects found.'}
+            result['attrs'].update(attrs)
+            self.dataset.changed(result)
+        return 200, {'results': [{'code': 200, 'name': name,
+                                  'status': 'Attributes updated.',
+                                  'type': object_type}]}
+
+    def delete(self, object_type, name, payload):
+        '''
+        delete objects by name or filter
+        '''
+
+        with self.dataset.lock:
+            results = self.dataset.select(
+                object_type, name, payload.get('filter'),
+                payload.get('filter_vars'))
+            if not results:
+                return 404, {'error': 404, 'status': 'No objects found.'}
+            deleted = []
+            for result in results:
+                deleted.extend(self.dataset.delete(
+                    result, bool(payload.get('cascade'))))
+        return 200, {'results': [{'code': 200, 'name': result['name'],
+                                  'status': 'Object was deleted.',
+                                  'type': result['type']}
+                                 for result in deleted]}
+
+    # actions
+
+    def _targets(self, payload):
+        '''
+        return the objects an action applies to
+        '''
+
+        object_type = payload.get('type')
+        if not object_type:
+            # process-check-result names the object without a type
+            object_type = 'Service' if payload.get('service') else 'Host'
+        name = payload.get(object_type.lower())
+        if not name and not payload.get('type'):
+            raise Icinga2ApiException("Parameter 'type' is required.")
+        return self.dataset.select(object_type, name or None,
+                                   payload.get('filter'),
+                                   payload.get('filter_vars'))
+
+    def action(self, action, payload):
+        '''
+        run an action on its targets
+        '''
+
+        if action in ('shutdown-process', 'restart-process'):
+            return 200, {'results': [{'code': 200, 'status': 'Ignored.'}]}
+        handler = getattr(self, '_action_' + action.replace('-', '_'), None)
+        if handler is None and action not in _PLAIN_ACTIONS:
+            return 404, {'error': 404, 'status': 'Action not found.'}
+        with self.dataset.lock:
+            targets = self._targets(payload)
+            if not targets:
+                return 404, {'error': 404, 'status': 'No objects found.'}
+            results = []
+            for target in targets:
+                status = handler(target, payload) if handler else \
+                    'Successfully executed {0}.'.format(action)
+                self.dataset.changed(target)
+                results.append({'code': 200, 'status': status})
+        return 200, {'results': results}
+
+    def _action_process_check_result(self, target, payload):
+        attrs = target['attrs']
+        state = int(payload.get('exit_status', 0))
+        performance_data = payload.get('performance_data') or []
+        if not isinstance(performance_data, list):
+            performance_data = performance_data.split()
+        timestamp = time.time()
+        check_result = _check_result(
+            state, payload.get('plugin_output', ''), performance_data,
+            timestamp)
+        changed = attrs.get('state') != state
+        attrs.update(state=state, last_check=timestamp,
+                     last_check_result=check_result)
+        self._publish_check_result(target, check_result, changed)
+        return "Successfully processed check result for object '{0}'.".format(
+            target['name'])
+
+    def _action_acknowledge_problem(self, target, payload):
+        target['attrs']['acknowledgement'] = 2 if payload.get('sticky') else 1
+        return "Successfully acknowledged problem for object '{0}'.".format(
+            target['name'])
+
+    def _action_remove_acknowledgement(self, target, payload):
+        target['attrs']['acknowledgement'] = 0
+        return "Successfully removed acknowledgement for object '{0}'.".format(
+            target['name'])
+
+    def _action_schedule_downtime(self, target, payload):
+        name = self.dataset.next_name(target['name'])
+        self.dataset.create('Downtime', name, {
+            'author': payload.get('author'),
+            'comment': payload.get('comment'),
+            'start_time': payload.get('start_time'),
+            'end_time': payload.get('end_time'),
+            'host_name': target['attrs'].get('host_name') or target['name'],
+            'service_name': target['attrs']['name']
+                            if target['type'] == 'Service' else '',
+            'object': target['name'],
+        })
+        target['attrs']['downtime_depth'] = \
+            target['attrs'].get('downtime_depth', 0) + 1
+        return "Successfully scheduled downtime '{0}' for object '{1}'.".format(
+            name, target['name'])
+
+    def _action_remove_downtime(self, target, payload):
+        # downtimes are removed directly or for the objects given
+        downtimes = [target] if target['type'] == 'Downtime' else [
+            downtime for downtime in self.dataset.store('Downtime').values()
+            if downtime['attrs'].get('object') == target['name']]
+        for downtime in downtimes:
+            self.dataset.delete(downtime)
+            owner = self._owner(downtime)
+            if owner is not None:
+                owner['attrs']['downtime_depth'] = max(
+                    owner['attrs'].get('downtime_depth', 1) - 1, 0)
+                self.dataset.changed(owner)
+        return "Successfully removed all downtimes for object '{0}'.".format(
+            target['name'])
+
+    def _action_add_comment(self, target, payload):
+        name = self.dataset.next_name(target['name'])
+        self.dataset.create('Comment', name, {
+            'author': payload.get('author'),
+            'text': payload.get('comment'),
+            'host_name': target['attrs'].get('host_name') or target['name'],
+            'object': target['name'],
+        })
+        return "Successfully added comment '{0}' for object '{1}'.".format(
+            name, target['name'])
+
+    def _action_remove_comment(self, target, payload):
+        comments = [target] if target['type'] == 'Comment' else [
+            comment for comment in self.dataset.store('Comment').values()
+            if comment['attrs'].get('object') == target['name']]
+        for comment in comments:
+            self.dataset.delete(comment)
+        return "Successfully removed all comments for object '{0}'.".format(
+            target['name'])
+
+    def _owner(self, result):
+        '''
+        return the host or service of a downtime or comment
+        '''
+
+        name = result['attrs'].get('object')
+        return self.dataset.get('Service', name) or \
+            self.dataset.get('Host', name)
+
+    # status
+
+    def status(self, component=None):
+        '''
+        answer a status query
+        '''
+
+        with self.dataset.lock:
+            hosts = self.dataset.store('Host').values()
+            services = self.dataset.store('Service').values()
+            host_states = [0, 0]
+            service_states = [0, 0, 0, 0]
+            for host in hosts:
+                host_states[min(host['attrs'].get('state', 0), 1)] += 1
+            for service in services:
+                service_states[min(service['attrs'].get('state', 0), 3)] += 1
+        results = [
+            {'name': 'IcingaApplication', 'perfdata': [], 'status': {
+                'icingaapplication': {'app': {
+                    'node_name': 'fake-master',
+                    'program_start': self._started,
+                    'version': 'v2.14.0-fake',
+                    'enable_notifications': True,
+                    'enable_event_handlers': True,
+                    'enable_flapping': True,
+                    'enable_host_checks': True,
+                    'enable_service_checks': True,
+                    'enable_perfdata': True,
+                }}}},
+            {'name': 'CIB', 'perfdata': [], 'status': {
+                'num_hosts_up': host_states[0],
+                'num_hosts_down': host_states[1],
+                'num_services_ok': service_states[0],
+                'num_services_warning': service_states[1],
+                'num_services_critical': service_states[2],
+                'num_services_unknown': service_states[3],
+                'uptime': time.time() - self._started,
+            }},
+            {'name': 'ApiListener', 'perfdata': [], 'status': {'api': {
+                'identity': 'fake-master',
+                'num_conn_endpoints': 0,
+                'num_endpoints': 1,
+                'num_not_conn_endpoints': 0,
+            }}},
+        ]
+        if component:
+            results = [result for result in results
+                       if result['name'] == component]
+        return 200, {'results': results}
+
+    # events
+
+    def subscribe(self, types, filters=None):
+        '''
+        register an event stream
+        '''
+
+        subscriber = (set(types), filters, queue.Queue(10000))
+        with self._lock:
+            self._subscribers.append(subscriber)
+        if self.event_burst and 'CheckResult' in types and not filters:
+            subscriber[2].put(_BURST)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        '''
+        remove an event stream
+        '''
+
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def publish(self, event):
+        '''
+        send an event to the matching event streams
+
+        Events for full streams are dropped, like Icinga 2 does for slow
+        clients.
+
+        :param event: the event
+        :type event: dictionary
+        '''
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for types, filters, events in subscribers:
+            if event.get('type') not in types:
+                continue
+            if filters and not match_event(event, filters):
+                continue
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def _publish_check_result(self, target, check_result, changed):
+        attrs = target['attrs']
+        host = attrs.get('host_name') or target['name']
+        event = {
+            'type': 'CheckResult',
+            'timestamp': check_result['execution_end'],
+            'host': host,
+            'check_result': check_result,
+            'acknowledgement': bool(attrs.get('acknowledgement')),
+            'downtime_depth': attrs.get('downtime_depth', 0),
+        }
+        if target['type'] == 'Service':
+            event['service'] = attrs['name']
+        self.publish(event)
+        if changed:
+            event = dict(event, type='StateChange',
+                         state=check_result['state'], state_type=1)
+            del event['downtime_depth']
+            self.publish(event)
+
+    def synthetic_events(self, count):
+        '''
+        return synthetic CheckResult events of the generated services
+
+        :param count: the number of events
+        :type count: int
+        :returns: the JSON encoded events, one per line
+        :rtype: bytes
+        '''
+
+        with self.dataset.lock:
+            services = list(self.dataset.store('Service').values())
+        if not services:
+            return b''
+        lines = []
+        timestamp = time.time()
+        for number in range(count):
+            attrs = services[number % len(services)]['attrs']
+            check_result = dict(attrs['last_check_result'],
+                                execution_end=timestamp,
+                                schedule_end=timestamp)
+            lines.append(json.dumps({
+                'type': 'CheckResult',
+                'timestamp': timestamp,
+                'host': attrs['host_name'],
+                'service': attrs['name'],
+                'check_result': check_result,
+                'acknowledgement': False,
+                'downtime_depth': 0,
+            }))
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _generate_events(self):
+        '''
+        publish synthetic CheckResult events at the event rate
+        '''
+
+        with self.dataset.lock:
+            names = list(self.dataset.store('Service'))
+        interval = max(1.0 / self.event_rate, 0.001)
+        per_tick = max(int(self.event_rate * interval), 1)
+        number = 0
+        while names and not self._stop.wait(interval):
+            for _ in range(per_tick):
+                with self.dataset.lock:
+                    target = self.dataset.get('Service',
+                                              names[number % len(names)])
+                    number += 1
+                    if target is None:
+                        continue
+                    attrs = target['attrs']
+                    check_result = dict(attrs['last_check_result'])
+                    check_result['execution_end'] = time.time()
+                self._publish_check_result(target, check_result, False)
+
+    def stream(self, subscriber):
+        '''
+        yield the chunks of an event stream, queued events are sent together
+
+        :returns: JSON encoded events, one per line
+        :rtype: generator
+        '''
+
+        events = subscriber[2]
+        while not self._stop.is_set():
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if event is _BURST:
+                data = self.synthetic_events(self.event_burst)
+                self._sent(self.event_burst)
+                yield data
+                return
+            lines = [json.dumps(event)]
+            while len(lines) < 1000:
+                try:
+                    lines.append(json.dumps(events.get_nowait()))
+                except queue.Empty:
+                    break
+            self._sent(len(lines))
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _sent(self, count):
+        with self._lock:
+            self.events += count
+
+
+def main():
+    '''
+    run the fake server until interrupted
+    '''
+
+    parser = argparse.ArgumentParser(description='Fake Icinga 2 API server')
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5665)
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--services-per-host', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--event-rate', type=float, default=0,
+                        help='synthetic CheckResult events per second')
+    parser.add_argument('--event-burst', type=int, default=0,
+                        help='synthetic CheckResult events sent to every '
+                             'new event stream, which then ends')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeIcinga2Server(
+        hosts=args.hosts,
+        services_per_host=args.services_per_host,
+        address=args.address,
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        event_rate=args.event_rate,
+        event_burst=args.event_burst,
+    )
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
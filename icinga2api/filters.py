@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API filter expressions
+
+Evaluates the common subset of the Icinga 2 filter language locally, e.g. on
+mirrored objects or received events:
+
+    host.name == "web01" && service.state != ServiceOK
+    match("web*", host.name) || regex("^db[0-9]+$", host.name)
+    "linux-servers" in host.groups && !(host.vars.os in ["Windows"])
+
+Every expression is compiled once into a Python function and cached by its text.
+'''
+
+from __future__ import print_function
+import collections
+import fnmatch
+import logging
+import re
+import threading
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+CONSTANTS = {
+    'true': True,
+    'false': False,
+    'null': None,
+    'HostUp': 0,
+    'HostDown': 1,
+    'ServiceOK': 0,
+    'ServiceWarning': 1,
+    'ServiceCritical': 2,
+    'ServiceUnknown': 3,
+    'StateTypeSoft': 0,
+    'StateTypeHard': 1,
+    'MatchAll': 'MatchAll',
+    'MatchAny': 'MatchAny',
+}
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<number>\d+(?:\.\d+)?)
+        |(?P<string>"(?:[^"\\]|\\.)*")
+        |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+        |(?P<operator>==|!=|<=|>=|&&|\|\||[<>!()\[\],.])
+    )''', re.VERBOSE)
+
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\'}
+
+_COMPARISONS = {
+    '==': '_eq',
+    '!=': '_ne',
+    '<': '_lt',
+    '>': '_gt',
+    '<=': '_le',
+    '>=': '_ge',
+    'in': '_in',
+}
+
+
+def _tokenize(expression):
+    '''
+    split an expression into (kind, value) tokens
+    '''
+
+    tokens = []
+    position = 0
+    length = len(expression.rstrip())
+    while position < length:
+        found = _TOKEN.match(expression, position)
+        if found is None:
+            raise Icinga2ApiException(
+                'Invalid filter "{0}" at position {1}.'.format(
+                    expression, position))
+        kind = found.lastgroup
+        value = found.group(kind)
+        if kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'string':
+            value = re.sub(r'\\(.)',
+                           lambda escape: _ESCAPES.get(escape.group(1),
+                                                       escape.group(1)),
+                           value[1:-1])
+        tokens.append((kind, value))
+        position = found.end()
+    tokens.append(('end', None))
+    return tokens
+
+
+class _Parser(object):
+    '''
+    recursive descent parser translating an expression into Python source
+    '''
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def error(self, message):
+        return Icinga2ApiException('Invalid filter "{0}": {1}.'.format(
+            self.expression, message))
+
+    def peek(self, offset=0):
+        return self.tokens[self.position + offset]
+
+    def take(self, kind=None, value=None):
+        token = self.tokens[self.position]
+        if (kind is not None and token[0] != kind) or \
+                (value is not None and token[1] != value):
+            raise self.error('expected {0}, got {1}'.format(
+                value or kind, token[1] if token[1] is not None else 'end'))
+        self.position += 1
+        return token
+
+    def accept(self, kind, value):
+        if self.tokens[self.position] == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        source = self.parse_or()
+        self.take('end')
+        return source
+
+    def parse_or(self):
+        source = self.parse_and()
+        while self.accept('operator', '||'):
+            source = '({0} or {1})'.format(source, self.parse_and())
+        return source
+
+    def parse_and(self):
+        source = self.parse_comparison()
+        while self.accept('operator', '&&'):
+            source = '({0} and {1})'.format(source, self.parse_comparison())
+        return source
+
+    def parse_comparison(self):
+        source = self.parse_unary()
+        while True:
+            kind, value = self.peek()
+            negate = False
+            if (kind, value) == ('operator', '!') and \
+                    self.peek(1) == ('name', 'in'):
+                self.position += 1
+                negate = True
+                kind, value = self.peek()
+            if (kind == 'operator' and value in _COMPARISONS) or \
+                    (kind, value) == ('name', 'in'):
+                self.position += 1
+                source = '{0}({1}, {2})'.format(
+                    _COMPARISONS[value], source, self.parse_unary())
+                if negate:
+                    source = '(not {0})'.format(source)
+            else:
+                return source
+
+    def parse_unary(self):
+        if self.accept('operator', '!'):
+            return '(not {0})'.format(self.parse_unary())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, value = self.take()
+        if kind in ('number', 'string'):
+            return repr(value)
+        if (kind, value) == ('operator', '('):
+            source = self.parse_or()
+            self.take('operator', ')')
+            return source
+        if (kind, value) == ('operator', '['):
+            items = []
+            if not self.accept('operator', ']'):
+                items.append(self.parse_or())
+                while self.accept('operator', ','):
+                    items.append(self.parse_or())
+                self.take('operator', ']')
+            return '({0},)'.format(', '.join(items)) if items else '()'
+        if kind == 'end':
+            raise self.error('unexpected end')
+        if kind != 'name':
+            raise self.error('unexpected "{0}"'.format(value))
+        if self.accept('operator', '('):
+            return self.parse_call(value)
+        path = [value]
+        while self.accept('operator', '.'):
+            path.append(self.take('name')[1])
+        return '_path(v, fv, {0!r})'.format(tuple(path))
+
+    def parse_call(self, function):
+        if function not in ('match', 'regex'):
+            raise self.error('unsupported function "{0}"'.format(function))
+        arguments = [self.parse_or()]
+        while self.accept('operator', ','):
+            arguments.append(self.parse_or())
+        self.take('operator', ')')
+        if not 2 <= len(arguments) <= 3:
+            raise self.error('{0}() takes 2 or 3 arguments'.format(function))
+        return '_{0}({1})'.format(function, ', '.join(arguments))
+
+
+def _path(variables, filter_vars, path):
+    '''
+    resolve an attribute path like host.vars.os, None if it does not exist
+    '''
+
+    name = path[0]
+    if name in variables:
+        value = variables[name]
+    elif filter_vars and name in filter_vars:
+        value = filter_vars[name]
+    else:
+        value = CONSTANTS.get(name)
+    for key in path[1:]:
+        try:
+            value = value[key]
+        except (KeyError, TypeError, IndexError):
+            return None
+    return value
+
+
+def _compare(operator):
+    def compare(left, right):
+        try:
+            return operator(left, right)
+        except TypeError:
+            return False
+    return compare
+
+
+def _in(value, container):
+    try:
+        return value in container
+    except TypeError:
+        return False
+
+
+_PATTERNS = {}
+
+
+def _pattern(pattern, wildcard):
+    '''
+    return the compiled regular expression of a pattern
+    '''
+
+    key = (pattern, wildcard)
+    compiled = _PATTERNS.get(key)
+    if compiled is None:
+        if len(_PATTERNS) > 1024:
+            _PATTERNS.clear()
+        source = fnmatch.translate(pattern) if wildcard else pattern
+        compiled = _PATTERNS[key] = re.compile(source)
+    return compiled
+
+
+def _matches(compiled, method, value, mode):
+    if isinstance(value, (list, tuple)):
+        if mode == 'MatchAny':
+            return any(_matches(compiled, method, item, None)
+                       for item in value)
+        return all(_matches(compiled, method, item, None) for item in value)
+    if value is None:
+        return False
+    return getattr(compiled, method)(str(value)) is not None
+
+
+def _match(pattern, value, mode='MatchAll'):
+    return _matches(_pattern(pattern, True), 'match', value, mode)
+
+
+def _regex(pattern, value, mode='MatchAll'):
+    return _matches(_pattern(pattern, False), 'search', value, mode)
+
+
+_GLOBALS = {
+    '__builtins__': {'bool': bool},
+    '_path': _path,
+    '_eq': lambda left, right: left == right,
+    '_ne': lambda left, right: left != right,
+    '_lt': _compare(lambda left, right: left < right),
+    '_gt': _compare(lambda left, right: left > right),
+    '_le': _compare(lambda left, right: left <= right),
+    '_ge': _compare(lambda left, right: left >= right),
+    '_in': _in,
+    '_match': _match,
+    '_regex': _regex,
+}
+
+_CACHE = collections.OrderedDict()
+_CACHE_LOCK = threading.Lock()
+CACHE_SIZE = 1024
+
+
+def compile_filter(expression):
+    '''
+    compile a filter expression into a function
+
+    The function takes the variables, e.g. ``{'host': attrs}``, and optionally
+    the filter_vars and returns True if the expression matches.
+
+    example 1:
+    is_critical = compile_filter('service.state == ServiceCritical')
+    is_critical({'service': {'state': 2}})
+
+    example 2:
+    in_group = compile_filter('group in host.groups')
+    in_group({'host': {'groups': ['linux']}}, {'group': 'linux'})
+
+    :param expression: the filter expression
+    :type expression: string
+    :returns: the compiled filter
+    :rtype: function
+    '''
+
+    with _CACHE_LOCK:
+        function = _CACHE.pop(expression, None)
+        if function is not None:
+            _CACHE[expression] = function
+            return function
+
+    source = _Parser(expression).parse()
+    LOG.debug("Compiled filter %s to %s", expression, source)
+    function = eval(  # pylint: disable=eval-used
+        'lambda v, fv=None: bool({0})'.format(source), _GLOBALS)
+
+    with _CACHE_LOCK:
+        _CACHE[expression] = function
+        while len(_CACHE) > CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    return function
+
+
+def object_variables(result):
+    '''
+    return the filter variables of an object as returned by
+    ``Objects.list``, e.g. ``service`` and the joined ``host`` of a service
+
+    :param result: the object
+    :type result: dictionary
+    :rtype: dictionary
+    '''
+
+    variables = dict(result.get('joins') or {})
+    variables[result['type'].lower()] = result['attrs']
+    return variables
+
+
+def event_variables(event):
+    '''
+    return the filter variables of an event, its data as ``event``
+
+    :param event: the event
+    :type event: Event or dictionary
+    :rtype: dictionary
+    '''
+
+    return {'event': getattr(event, 'data', event)}
+
+
+def filter_objects(results, filters, filter_vars=None):
+    '''
+    return the objects matching a filter expression
+
+    example 1:
+    filter_objects(mirror.services.values(),
+                   'service.state != ServiceOK && "linux" in host.groups')
+
+    :param results: the objects as returned by ``Objects.list``
+    :type results: iterable
+    :param filters: the filter expression
+    :type filters: string
+    :param filter_vars: variables used by the expression
+    :type filter_vars: dictionary
+    :returns: the matching objects
+    :rtype: list
+    '''
+
+    function = compile_filter(filters)
+    return [result for result in results
+            if function(object_variables(result), filter_vars)]
+
+
+def match_event(event, filters, filter_vars=None):
+    '''
+    return True if an event matches a filter expression
+
+    example 1:
+    match_event(event, 'event.check_result.exit_status == 2')
+
+    :param event: the event
+    :type event: Event or dictionary
+    :param filters: the filter expression
+    :type filters: string
+    :param filter_vars: variables used by the expression
+    :type filter_vars: dictionary
+    :rtype: bool
+    '''
+
+    return compile_filter(filters)(event_variables(event), filter_vars)
@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API instrumentation
+
+Hooks around every request sent by the transport, a metrics collector with
+per endpoint latency histograms and exporters for Prometheus and OpenTelemetry.
+'''
+
+from __future__ import division, print_function
+import bisect
+import logging
+import threading
+import time
+
+# pylint: disable=import-error
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+# pylint: enable=import-error
+
+try:
+    from opentelemetry import metrics as otel_metrics
+except ImportError:
+    otel_metrics = None
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+# the default buckets of the Prometheus client libraries
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+class RequestInfo(object):
+    '''
+    one attempt of a request as seen by the hooks
+
+    ``timings`` holds the durations in seconds of the phases that could be
+    measured: ``dns``, ``connect`` (including TLS), ``server`` (until the
+    response headers arrived), ``decode`` (JSON) and ``total``. The
+    synchronous transport cannot see inside the connection setup, there
+    ``server`` includes ``dns`` and ``connect`` of new connections.
+    '''
+
+    __slots__ = ('method', 'url_path', 'endpoint', 'attempt', 'payload_size',
+                 'response_size', 'status', 'start', 'timings')
+
+    def __init__(self, method, url_path, endpoint, attempt=0,
+                 payload_size=0):
+        '''
+        initialize object
+
+        :param method: the HTTP method
+        :type method: string
+        :param url_path: the requested url path
+        :type url_path: string
+        :param endpoint: the base url of the endpoint
+        :type endpoint: string
+        :param attempt: the number of the retry, 0 for the first attempt
+        :type attempt: int
+        :param payload_size: the size of the request body in bytes
+        :type payload_size: int
+        '''
+
+        self.method = method.upper()
+        self.url_path = url_path
+        self.endpoint = endpoint
+        self.attempt = attempt
+        self.payload_size = payload_size
+        self.response_size = None
+        self.status = None
+        self.start = time.time()
+        self.timings = {}
+
+    def finish(self):
+        '''
+        set the total duration
+        '''
+
+        self.timings['total'] = time.time() - self.start
+
+    def __repr__(self):
+        return '<RequestInfo {0} {1}{2} status={3}>'.format(
+            self.method, self.endpoint, self.url_path, self.status)
+
+
+class RequestHook(object):
+    '''
+    base class of request hooks, override the methods of interest
+
+    Hooks are called on the thread or task sending the request and must
+    not raise.
+    '''
+
+    def before_send(self, info):
+        '''
+        called before every attempt is sent
+
+        :param info: the request
+        :type info: RequestInfo
+        '''
+
+    def after_response(self, info):
+        '''
+        called when a response arrived and, unless streamed, was decoded
+
+        :param info: the request with status, sizes and timings
+        :type info: RequestInfo
+        '''
+
+    def on_error(self, info, error):
+        '''
+        called when an attempt failed without a response
+
+        :param info: the request with the timings so far
+        :type info: RequestInfo
+        :param error: the exception
+        :type error: Exception
+        '''
+
+
+def call_hooks(hooks, name, *args):
+    '''
+    call a method of all hooks, log and ignore their errors
+    '''
+
+    for hook in hooks:
+        try:
+            getattr(hook, name)(*args)
+        except Exception:  # pylint: disable=broad-except
+            LOG.exception("Request hook %r failed", hook)
+
+
+class Histogram(object):
+    '''
+    cumulative histogram of durations
+    '''
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        '''
+        initialize object
+
+        :param buckets: the upper bounds of the buckets in seconds
+        :type buckets: tuple
+        '''
+
+        self.buckets = buckets
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        '''
+        add a duration
+        '''
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        '''
+        return (upper bound, number of values up to it) for every bucket
+        '''
+
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def percentile(self, fraction):
+        '''
+        return the upper bound of the bucket holding the percentile
+        '''
+
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return float('inf')
+
+    def stats(self):
+        '''
+        return count, sum, average, p50 and p99
+        '''
+
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else None,
+            'p50': self.percentile(0.5),
+            'p99': self.percentile(0.99),
+        }
+
+
+def _api_path(url_path):
+    '''
+    return the API endpoint of a url path without the object name, e.g.
+    v1/objects/hosts for v1/objects/hosts/web01, to keep the number of
+    label values bounded
+    '''
+
+    return '/'.join(url_path.split('?', 1)[0].strip('/').split('/')[:3])
+
+
+class MetricsCollector(RequestHook):
+    '''
+    collect request counts, sizes and latency histograms per endpoint and
+    API path
+
+    example 1:
+    metrics = MetricsCollector()
+    client = Client('https://icinga2:5665', 'user', 'pass', hooks=[metrics])
+    client.objects.list('Host')
+    metrics.stats()
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        '''
+        initialize object
+
+        :param buckets: the upper bounds of the histogram buckets in seconds
+        :type buckets: tuple
+        '''
+
+        self.buckets = buckets
+        self.requests = {}
+        self.errors = {}
+        self.bytes_sent = {}
+        self.bytes_received = {}
+        self.latency = {}
+        self._lock = threading.Lock()
+
+    def after_response(self, info):
+        with self._lock:
+            key = (info.endpoint, _api_path(info.url_path), info.method,
+                   info.status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self._count_bytes(info)
+            self._observe(info)
+
+    def on_error(self, info, error):
+        with self._lock:
+            key = (info.endpoint, _api_path(info.url_path),
+                   type(error).__name__)
+            self.errors[key] = self.errors.get(key, 0) + 1
+            self._count_bytes(info)
+            self._observe(info)
+
+    def _count_bytes(self, info):
+        self.bytes_sent[info.endpoint] = \
+            self.bytes_sent.get(info.endpoint, 0) + (info.payload_size or 0)
+        self.bytes_received[info.endpoint] = \
+            self.bytes_received.get(info.endpoint, 0) + \
+            (info.response_size or 0)
+
+    def _observe(self, info):
+        path = _api_path(info.url_path)
+        for phase, duration in info.timings.items():
+            key = (info.endpoint, path, phase)
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(self.buckets)
+            histogram.observe(duration)
+
+    def stats(self):
+        '''
+        return the metrics by endpoint
+
+        :returns: bytes sent and received and by API path the request
+                  counts by method and status, the error counts by type and
+                  the latency of every phase
+        :rtype: dictionary
+        '''
+
+        endpoints = {}
+
+        def path_stats(endpoint, path):
+            paths = endpoints.setdefault(endpoint, {
+                'bytes_sent': self.bytes_sent.get(endpoint, 0),
+                'bytes_received': self.bytes_received.get(endpoint, 0),
+                'paths': {},
+            })['paths']
+            return paths.setdefault(path, {
+                'requests': {},
+                'errors': {},
+                'latency': {},
+            })
+
+        with self._lock:
+            for (endpoint, path, method, status), count in \
+                    self.requests.items():
+                path_stats(endpoint, path)['requests'][
+                    '{0} {1}'.format(method, status)] = count
+            for (endpoint, path, error), count in self.errors.items():
+                path_stats(endpoint, path)['errors'][error] = count
+            for (endpoint, path, phase), histogram in self.latency.items():
+                path_stats(endpoint, path)['latency'][phase] = \
+                    histogram.stats()
+        return endpoints
+
+
+def _labels(**labels):
+    return ','.join(
+        '{0}="{1}"'.format(name, str(value).replace('\\', '\\\\')
+                           .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in sorted(labels.items()))
+
+
+class PrometheusExporter(object):
+    '''
+    expose the metrics of a collector in the Prometheus text format
+
+    example 1:
+    exporter = PrometheusExporter(metrics)
+    exporter.serve(9464)
+    '''
+
+    def __init__(self, collector, prefix='icinga2api'):
+        '''
+        initialize object
+
+        :param collector: the metrics to expose
+        :type collector: MetricsCollector
+        :param prefix: the prefix of the metric names
+        :type prefix: string
+        '''
+
+        self.collector = collector
+        self.prefix = prefix
+        self._server = None
+
+    def render(self):
+        '''
+        return the metrics in the Prometheus text exposition format
+
+        :rtype: string
+        '''
+
+        collector = self.collector
+        prefix = self.prefix
+        lines = []
+        with collector._lock:  # pylint: disable=protected-access
+            lines.append('# TYPE {0}_requests_total counter'.format(prefix))
+            for (endpoint, path, method, status), count in sorted(
+                    collector.requests.items(), key=str):
+                lines.append('{0}_requests_total{{{1}}} {2}'.format(
+                    prefix,
+                    _labels(endpoint=endpoint, path=path, method=method,
+                            status=status),
+                    count))
+            lines.append('# TYPE {0}_request_errors_total counter'.format(
+                prefix))
+            for (endpoint, path, error), count in sorted(
+                    collector.errors.items()):
+                lines.append('{0}_request_errors_total{{{1}}} {2}'.format(
+                    prefix, _labels(endpoint=endpoint, path=path, error=error),
+                    count))
+            for name, values in (('sent', collector.bytes_sent),
+                                 ('received', collector.bytes_received)):
+                lines.append('# TYPE {0}_bytes_{1}_total counter'.format(
+                    prefix, name))
+                for endpoint, count in sorted(values.items()):
+                    lines.append('{0}_bytes_{1}_total{{{2}}} {3}'.format(
+                        prefix, name, _labels(endpoint=endpoint), count))
+            lines.append(
+                '# TYPE {0}_request_duration_seconds histogram'.format(
+                    prefix))
+            for (endpoint, path, phase), histogram in sorted(
+                    collector.latency.items()):
+                labels = _labels(endpoint=endpoint, path=path, phase=phase)
+                for bound, total in histogram.cumulative():
+                    lines.append(
+                        '{0}_request_duration_seconds_bucket{{{1},le="{2}"}} '
+                        '{3}'.format(prefix, labels,
+                                     '+Inf' if bound == float('inf')
+                                     else repr(bound), total))
+                lines.append('{0}_request_duration_seconds_sum{{{1}}} {2!r}'
+                             .format(prefix, labels, histogram.sum))
+                lines.append('{0}_request_duration_seconds_count{{{1}}} {2}'
+                             .format(prefix, labels, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=9464, address=''):
+        '''
+        serve the metrics over HTTP on a background thread
+
+        :param port: the port to listen on
+        :type port: int
+        :param address: the address to listen on, all by default
+        :type address: string
+        :returns: the server, call shutdown() to stop it
+        :rtype: HTTPServer
+        '''
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                LOG.debug("Metrics request from %s", self.client_address[0])
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self._server = Server((address, port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever,
+                                  name='icinga2api-metrics')
+        thread.daemon = True
+        thread.start()
+        return self._server
+
+
+class OpenTelemetryHook(RequestHook):
+    '''
+    record requests with the OpenTelemetry metrics API
+
+    Needs the opentelemetry-api package, the SDK configured by the
+    application decides where the metrics go.
+    '''
+
+    def __init__(self, meter=None):
+        '''
+        initialize object
+
+        :param meter: the meter to create the instruments with, by default
+                      the one of the global meter provider
+        :type meter: opentelemetry.metrics.Meter
+        '''
+
+        if otel_metrics is None:
+            raise Icinga2ApiException('OpenTelemetry is not installed.')
+        meter = meter or otel_metrics.get_meter('icinga2api')
+        self.duration = meter.create_histogram(
+            'icinga2api.request.duration', unit='s',
+            description='Duration of the phases of API requests')
+        self.requests = meter.create_counter(
+            'icinga2api.requests', description='API requests')
+        self.errors = meter.create_counter(
+            'icinga2api.request.errors', description='Failed API requests')
+        self.size = meter.create_counter(
+            'icinga2api.request.bytes', unit='By',
+            description='Bytes sent and received')
+
+    def after_response(self, info):
+        attributes = {'endpoint': info.endpoint,
+                      'path': _api_path(info.url_path),
+                      'method': info.method, 'status': info.status}
+        self.requests.add(1, attributes)
+        self._record(info, attributes)
+
+    def on_error(self, info, error):
+        attributes = {'endpoint': info.endpoint,
+                      'path': _api_path(info.url_path),
+                      'method': info.method, 'error': type(error).__name__}
+        self.errors.add(1, attributes)
+        self._record(info, attributes)
+
+    def _record(self, info, attributes):
+        for phase, duration in info.timings.items():
+            phase_attributes = dict(attributes, phase=phase)
+            self.duration.record(duration, phase_attributes)
+        self.size.add(info.payload_size or 0,
+                      dict(attributes, direction='sent'))
+        self.size.add(info.response_size or 0,
+                      dict(attributes, direction='received'))
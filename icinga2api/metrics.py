@@ -0,0 +1,757 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API performance data export
+
+Extracts the performance data of CheckResult events into points, buffers them
+and writes them in batches to Graphite, InfluxDB, files or sockets. Every
+batch is formatted into one payload and written with one call.
+'''
+
+from __future__ import print_function
+import collections
+import logging
+import re
+import socket
+import threading
+import time
+
+import requests
+
+from icinga2api.dispatch import BLOCK, DROP_OLDEST
+from icinga2api.eventtypes import Event, decode_event
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+# characters replaced in Graphite paths, like the GraphiteWriter does
+_GRAPHITE_ESCAPE = re.compile(r'[^A-Za-z0-9_\-]')
+_INFLUX_TAG_ESCAPE = re.compile(r'([,= ])')
+_INFLUX_MEASUREMENT_ESCAPE = re.compile(r'([, ])')
+_CACHE_SIZE = 4096
+_ESCAPED = {}
+
+
+def _escape(pattern, replacement, text):
+    '''
+    escape a host, service or label name, names repeat so they are cached
+    '''
+
+    key = (pattern, text)
+    try:
+        return _ESCAPED[key]
+    except KeyError:
+        pass
+    escaped = pattern.sub(replacement, text)
+    if len(_ESCAPED) > _CACHE_SIZE:
+        _ESCAPED.clear()
+    _ESCAPED[key] = escaped
+    return escaped
+
+
+class Point(object):
+    '''
+    one performance data value of a check result
+    '''
+
+    __slots__ = ('host', 'service', 'label', 'value', 'unit', 'timestamp',
+                 'warn', 'crit', 'min', 'max', 'check_command')
+
+    def __init__(self, host, service, label, value, timestamp, unit=None,
+                 warn=None, crit=None, min=None,
+                 max=None,  # pylint: disable=redefined-builtin
+                 check_command=None):
+        '''
+        initialize object
+
+        :param host: the host name
+        :type host: string
+        :param service: the service name, None for host checks
+        :type service: string
+        :param label: the performance data label
+        :type label: string
+        :param value: the value
+        :type value: float
+        :param timestamp: the time of the check result in seconds
+        :type timestamp: float
+        :param unit: the unit of measurement
+        :type unit: string
+        :param warn: the upper warning threshold
+        :type warn: float
+        :param crit: the upper critical threshold
+        :type crit: float
+        :param min: the minimum value
+        :type min: float
+        :param max: the maximum value
+        :type max: float
+        :param check_command: the name of the check command, if known
+        :type check_command: string
+        '''
+
+        self.host = host
+        self.service = service
+        self.label = label
+        self.value = value
+        self.timestamp = timestamp
+        self.unit = unit
+        self.warn = warn
+        self.crit = crit
+        self.min = min
+        self.max = max
+        self.check_command = check_command
+
+    def __repr__(self):
+        return '<Point {0}!{1} {2}={3!r}>'.format(
+            self.host, self.service, self.label, self.value)
+
+
+def points_from_event(event, check_command=None):
+    '''
+    extract the performance data of a CheckResult event
+
+    Unknown values (``U``) are skipped.
+
+    :param event: the event
+    :type event: Event
+    :param check_command: the name of the check command of the event's host
+                          or service, the events do not contain it
+    :type check_command: string
+    :returns: the points
+    :rtype: list of Point
+    '''
+
+    check_result = event.check_result
+    if check_result is None:
+        return []
+    timestamp = check_result.execution_end or event.timestamp or time.time()
+    host = event.host
+    service = event.service
+    return [
+        Point(host, service, value.label, value.value, timestamp, value.unit,
+              value.warn.end if value.warn is not None else None,
+              value.crit.end if value.crit is not None else None,
+              value.min, value.max, check_command)
+        for value in check_result.perfdata if value.value is not None
+    ]
+
+
+def format_graphite(points, prefix='icinga2'):
+    '''
+    format points in the Graphite plaintext protocol
+
+    The paths follow the GraphiteWriter of Icinga 2,
+    ``<prefix>.<host>.services.<service>.<check_command>`` and
+    ``<prefix>.<host>.host.<check_command>`` followed by
+    ``.perfdata.<label>.value``, thresholds and limits are written as ``warn``, ``crit``, ``min`` and
+    ``max``. The check command segment is left out for points without
+    ``check_command``.
+
+    :param points: the points
+    :type points: list of Point
+    :param prefix: the path prefix
+    :type prefix: string
+    :returns: the lines
+    :rtype: string
+    '''
+
+    lines = []
+    append = lines.append
+    escape = _GRAPHITE_ESCAPE
+    for point in points:
+        path = '{0}.{1}.{2}{3}.perfdata.{4}.'.format(
+            prefix,
+            _escape(escape, '_', point.host),
+            'services.' + _escape(escape, '_', point.service)
+            if point.service else 'host',
+            '.' + _escape(escape, '_', point.check_command)
+            if point.check_command else '',
+            _escape(escape, '_', point.label))
+        timestamp = int(point.timestamp)
+        append('{0}value {1!r} {2}\n'.format(path, point.value, timestamp))
+        for name in ('warn', 'crit', 'min', 'max'):
+            value = getattr(point, name)
+            if value is not None:
+                append('{0}{1} {2!r} {3}\n'.format(path, name, value,
+                                                   timestamp))
+    return ''.join(lines)
+
+
+def format_influx(points, measurement='icinga2'):
+    '''
+    format points in the InfluxDB line protocol
+
+    Every point becomes one line with the tags ``hostname``, ``service`` and
+    ``metric``, the fields ``value``, ``unit``, ``warn``, ``crit``, ``min``
+    and ``max`` and the timestamp in nanoseconds.
+
+    :param points: the points
+    :type points: list of Point
+    :param measurement: the measurement
+    :type measurement: string
+    :returns: the lines
+    :rtype: string
+    '''
+
+    lines = []
+    append = lines.append
+    escape = _INFLUX_TAG_ESCAPE
+    measurement = _escape(_INFLUX_MEASUREMENT_ESCAPE, r'\\\1', measurement)
+    for point in points:
+        tags = ',hostname=' + _escape(escape, r'\\\1', point.host)
+        if point.service:
+            tags += ',service=' + _escape(escape, r'\\\1', point.service)
+        tags += ',metric=' + _escape(escape, r'\\\1', point.label)
+        fields = 'value={0!r}'.format(point.value)
+        if point.unit:
+            fields += ',unit="{0}"'.format(point.unit.replace('"', '\\"'))
+        for name in ('warn', 'crit', 'min', 'max'):
+            value = getattr(point, name)
+            if value is not None:
+                fields += ',{0}={1!r}'.format(name, value)
+        append('{0}{1} {2} {3}\n'.format(measurement, tags, fields,
+                                         int(point.timestamp * 1e9)))
+    return ''.join(lines)
+
+
+class Sink(object):
+    '''
+    metrics sink base class
+
+    ``write()`` is called with every batch from the flusher thread. The
+    ``name`` is used in logs and ``MetricsPipeline.stats``.
+    '''
+
+    name = 'sink'
+
+    def write(self, points):
+        '''
+        write a batch of points
+
+        :param points: the points
+        :type points: list of Point
+        '''
+
+        raise NotImplementedError()
+
+    def close(self):
+        '''
+        release the sink's resources
+        '''
+
+        pass
+
+
+class SocketSink(Sink):
+    '''
+    write formatted batches to a TCP or Unix socket
+
+    The connection is opened on the first batch and again after an error.
+    '''
+
+    name = 'socket'
+
+    def __init__(self, address, formatter=format_graphite, timeout=10,
+                 name=None):
+        '''
+        initialize object
+
+        :param address: (host, port) or the path of a Unix socket
+        :type address: tuple or string
+        :param formatter: formats a batch, e.g. ``format_graphite`` or
+                          ``format_influx``
+        :type formatter: callable
+        :param timeout: the connect and send timeout in seconds
+        :type timeout: float
+        :param name: the name in logs and stats
+        :type name: string
+        '''
+
+        if name is not None:
+            self.name = name
+        self.address = address
+        self.formatter = formatter
+        self.timeout = timeout
+        self._socket = None
+
+    def _connect(self):
+        if isinstance(self.address, tuple):
+            return socket.create_connection(self.address, self.timeout)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.address)
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def write(self, points):
+        data = self.formatter(points).encode('utf-8')
+        if self._socket is None:
+            self._socket = self._connect()
+        try:
+            self._socket.sendall(data)
+        except socket.error:
+            self.close()
+            raise
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class GraphiteSink(SocketSink):
+    '''
+    write batches to Graphite (carbon) in the plaintext protocol
+    '''
+
+    name = 'graphite'
+
+    def __init__(self, host, port=2003, prefix='icinga2', timeout=10,
+                 name=None):
+        '''
+        initialize object
+
+        :param host: the carbon host
+        :type host: string
+        :param port: the plaintext port
+        :type port: int
+        :param prefix: the path prefix
+        :type prefix: string
+        :param timeout: the connect and send timeout in seconds
+        :type timeout: float
+        :param name: the name in logs and stats
+        :type name: string
+        '''
+
+        super(GraphiteSink, self).__init__(
+            (host, port),
+            lambda points: format_graphite(points, prefix),
+            timeout,
+            name)
+
+
+class InfluxSink(Sink):
+    '''
+    write batches to the InfluxDB HTTP API in the line protocol
+    '''
+
+    name = 'influx'
+
+    def __init__(self,
+                 url,
+                 database,
+                 measurement='icinga2',
+                 username=None,
+                 password=None,
+                 timeout=10,
+                 verify=True,
+                 name=None):
+        '''
+        initialize object
+
+        :param url: the InfluxDB URL, e.g. ``http://localhost:8086``
+        :type url: string
+        :param database: the database
+        :type database: string
+        :param measurement: the measurement
+        :type measurement: string
+        :param username: the user name
+        :type username: string
+        :param password: the password
+        :type password: string
+        :param timeout: the request timeout in seconds
+        :type timeout: float
+        :param verify: verify the TLS certificate, or the path of a CA
+                       bundle
+        :type verify: bool or string
+        :param name: the name in logs and stats
+        :type name: string
+        '''
+
+        if name is not None:
+            self.name = name
+        self.url = '{0}/write'.format(url.rstrip('/'))
+        self.params = {'db': database, 'precision': 'ns'}
+        self.measurement = measurement
+        self.timeout = timeout
+        # passed with every request, as REQUESTS_CA_BUNDLE and CURL_CA_BUNDLE
+        # override the session's verify setting
+        self.verify = verify
+        self.session = requests.Session()
+        if username is not None:
+            self.session.auth = (username, password)
+
+    def write(self, points):
+        response = self.session.post(
+            self.url,
+            params=self.params,
+            data=format_influx(points, self.measurement).encode('utf-8'),
+            timeout=self.timeout,
+            verify=self.verify
+        )
+        if response.status_code >= 300:
+            raise Icinga2ApiException(
+                'InfluxDB write failed with {0}: {1}'.format(
+                    response.status_code, response.text))
+
+    def close(self):
+        self.session.close()
+
+
+class FileSink(Sink):
+    '''
+    append formatted batches to a file
+    '''
+
+    name = 'file'
+
+    def __init__(self, path, formatter=format_influx, name=None):
+        '''
+        initialize object
+
+        :param path: the file
+        :type path: string
+        :param formatter: formats a batch, e.g. ``format_graphite`` or
+                          ``format_influx``
+        :type formatter: callable
+        :param name: the name in logs and stats
+        :type name: string
+        '''
+
+        if name is not None:
+            self.name = name
+        self.path = path
+        self.formatter = formatter
+        self._file = None
+
+    def write(self, points):
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write(self.formatter(points))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class MetricsPipeline(object):
+    '''
+    buffer performance data points and flush them in batches to sinks
+
+    A batch is flushed when ``batch_size`` points are buffered or
+    ``flush_interval`` seconds after the last flush. When the buffer is full,
+    ``block`` holds up the producer, i.e. the event stream, and
+    ``drop-oldest`` drops the oldest points.
+
+    example 1:
+    pipeline = MetricsPipeline([GraphiteSink('graphite.example.com')])
+    pipeline.start(client, 'metrics')
+    ...
+    pipeline.stop()
+
+    example 2:
+    dispatcher.register(pipeline.handle, types=['CheckResult'])
+    pipeline.start()
+    '''
+
+    def __init__(self,
+                 sinks,
+                 batch_size=1000,
+                 flush_interval=10,
+                 buffer_size=100000,
+                 policy=BLOCK,
+                 check_command=None):
+        '''
+        initialize object
+
+        :param sinks: the sinks every batch is written to
+        :type sinks: list of Sink
+        :param batch_size: the maximum number of points per batch
+        :type batch_size: int
+        :param flush_interval: the maximum seconds between flushes
+        :type flush_interval: float
+        :param buffer_size: the maximum number of buffered points
+        :type buffer_size: int
+        :param policy: what to do when the buffer is full, ``block`` or
+                       ``drop-oldest``
+        :type policy: string
+        :param check_command: called with every event, returns the name of
+                              the check command of its host or service for
+                              the Graphite paths, or None
+        :type check_command: callable
+        '''
+
+        if policy not in (BLOCK, DROP_OLDEST):
+            raise Icinga2ApiException(
+                'Unknown backpressure policy "{0}".'.format(policy))
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer_size = max(buffer_size, batch_size)
+        self.policy = policy
+        self.check_command = check_command
+        self._buffer = collections.deque()
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._subscriber = None
+        self._running = False
+        self._stopping = False
+        self._last_flush = time.time()
+        self.received = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.flushed = 0
+        self.batches = 0
+        # sinks sharing a name are told apart by their position
+        names = [sink.name for sink in self.sinks]
+        self._sink_names = [
+            name if names.count(name) == 1 else
+            '{0}-{1}'.format(name, index)
+            for index, name in enumerate(names)]
+        self._sink_stats = [
+            {'batches': 0, 'points': 0, 'errors': 0, 'failed': 0}
+            for _ in self.sinks]
+
+    def handle(self, event):
+        '''
+        buffer the performance data of a CheckResult event
+
+        :param event: the event, decoded or as JSON string
+        :type event: Event or string
+        '''
+
+        if not isinstance(event, Event):
+            if not event:
+                return
+            event = decode_event(event)
+        points = points_from_event(
+            event,
+            self.check_command(event) if self.check_command else None)
+        if points:
+            self.add(points)
+
+    def add(self, points):
+        '''
+        buffer points
+
+        Without a running flusher thread a full batch is flushed on the
+        calling thread.
+
+        :param points: the points
+        :type points: list of Point
+        '''
+
+        buffer = self._buffer
+        with self._condition:
+            self.received += len(points)
+            if len(buffer) + len(points) > self.buffer_size:
+                if self.policy == BLOCK and self._running:
+                    self.blocked += 1
+                    while len(buffer) + len(points) > self.buffer_size and \
+                            self._running:
+                        self._condition.wait()
+                else:
+                    overflow = min(
+                        len(buffer) + len(points) - self.buffer_size,
+                        len(buffer))
+                    for _ in range(overflow):
+                        buffer.popleft()
+                    self.dropped += overflow
+            before = len(buffer)
+            buffer.extend(points)
+            full = len(buffer) >= self.batch_size
+            if full and before < self.batch_size:
+                self._condition.notify_all()
+        if full and not self._running:
+            self.flush()
+
+    def _take(self):
+        '''
+        take the next batch from the buffer, the condition is held
+        '''
+
+        buffer = self._buffer
+        count = min(len(buffer), self.batch_size)
+        batch = [buffer.popleft() for _ in range(count)]
+        self._last_flush = time.time()
+        self._condition.notify_all()
+        return batch
+
+    def flush(self):
+        '''
+        write all buffered points to the sinks on the calling thread
+        '''
+
+        while True:
+            with self._condition:
+                batch = self._take()
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        '''
+        write one batch to every sink
+        '''
+
+        with self._write_lock:
+            for index, sink in enumerate(self.sinks):
+                stats = self._sink_stats[index]
+                try:
+                    sink.write(batch)
+                    stats['batches'] += 1
+                    stats['points'] += len(batch)
+                except Exception as error:  # pylint: disable=broad-except
+                    LOG.warning("Writing %d points to %s failed: %s",
+                                len(batch), self._sink_names[index], error)
+                    stats['errors'] += 1
+                    stats['failed'] += len(batch)
+            self.batches += 1
+            self.flushed += len(batch)
+
+    def _flush_loop(self):
+        '''
+        flush batches by size or time until stopped
+        '''
+
+        condition = self._condition
+        while True:
+            with condition:
+                while len(self._buffer) < self.batch_size and \
+                        not self._stopping:
+                    remaining = self._last_flush + self.flush_interval - \
+                        time.time()
+                    if remaining <= 0:
+                        break
+                    condition.wait(remaining)
+                stopping = self._stopping
+                batch = self._take()
+            if batch:
+                self._write(batch)
+            if stopping and not batch:
+                return
+
+    def start(self, client=None, queue_name=None, **kwargs):
+        '''
+        start the flusher thread and, with a client, subscribe to the
+        CheckResult events on another thread
+
+        The subscription reconnects by itself, see ``Events.subscribe``.
+
+        :param client: the client
+        :type client: Client
+        :param queue_name: the event queue name
+        :type queue_name: string
+        :param kwargs: further arguments for ``Events.subscribe``
+        '''
+
+        self._running = True
+        self._stopping = False
+        self._last_flush = time.time()
+        self._thread = threading.Thread(
+            target=self._flush_loop,
+            name='icinga2api-metrics-flush'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+        if client is not None:
+            kwargs.setdefault('reconnect', True)
+            kwargs['decode'] = True
+            self._subscriber = threading.Thread(
+                target=self._subscribe,
+                args=(client.events.subscribe(
+                    ['CheckResult'], queue_name or 'icinga2api-metrics',
+                    **kwargs),),
+                name='icinga2api-metrics'
+            )
+            self._subscriber.daemon = True
+            self._subscriber.start()
+
+    def _subscribe(self, events):
+        try:
+            for event in events:
+                if self._stopping:
+                    break
+                self.handle(event)
+        except Exception as error:  # pylint: disable=broad-except
+            LOG.error("Metrics subscription stopped: %s", error)
+
+    def stop(self, timeout=None):
+        '''
+        stop reading, flush the buffered points and close the sinks
+
+        The subscription notices the stop with the next event.
+
+        :param timeout: seconds to wait for every thread
+        :type timeout: float
+        '''
+
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._subscriber is not None:
+            self._subscriber.join(timeout)
+            self._subscriber = None
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+    def stats(self):
+        '''
+        return pipeline metrics
+
+        :returns: received, buffered, dropped and flushed points, the number
+                  of batches and of blocked producers and per sink the
+                  written batches and points, errors and failed points,
+                  keyed by the sink's name and, if several sinks share it,
+                  their position
+        :rtype: dictionary
+        '''
+
+        with self._condition:
+            return {
+                'received': self.received,
+                'buffered': len(self._buffer),
+                'dropped': self.dropped,
+                'blocked': self.blocked,
+                'flushed': self.flushed,
+                'batches': self.batches,
+                'sinks': dict(
+                    (name, dict(stats))
+                    for name, stats in zip(self._sink_names,
+                                           self._sink_stats)),
+            }
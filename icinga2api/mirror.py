@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API object mirror
+
+Local in-memory copy of hosts and services, seeded once with Objects.iter_list
+and kept current by the event stream.
+'''
+
+from __future__ import division, print_function
+import logging
+import threading
+import time
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.filters import filter_objects
+from icinga2api.query import ObjectIndex
+
+LOG = logging.getLogger(__name__)
+
+HOST_ATTRS = [
+    'name', 'display_name', 'address', 'groups', 'zone',
+    'state', 'state_type', 'last_hard_state', 'last_check',
+    'last_state_change', 'acknowledgement', 'downtime_depth',
+    'last_check_result',
+]
+
+SERVICE_ATTRS = HOST_ATTRS[:2] + ['host_name'] + HOST_ATTRS[3:]
+
+SERVICE_JOINS = ['host.groups']
+
+MIRROR_EVENT_TYPES = [
+    'CheckResult',
+    'StateChange',
+    'AcknowledgementSet',
+    'AcknowledgementCleared',
+    'DowntimeTriggered',
+    'DowntimeRemoved',
+    'ObjectCreated',
+    'ObjectDeleted',
+]
+
+
+class _Stopped(Exception):
+    '''
+    ends the subscription of a stopped mirror
+    '''
+
+
+class ObjectMirror(object):
+    '''
+    Icinga 2 API object mirror class
+
+    The mirrored objects have the same layout as the results of
+    Objects.list: ``{'name': ..., 'type': ..., 'attrs': {...}, 'joins': {...}}``.
+    '''
+
+    def __init__(self,
+                 client,
+                 queue='icinga2api-mirror',
+                 host_attrs=None,
+                 service_attrs=None,
+                 service_joins=None,
+                 resync_delay=5,
+                 idle_timeout=None):
+        '''
+        initialize object
+
+        :param client: the client used for seeding and the event stream
+        :type client: Client
+        :param queue: the event queue name
+        :type queue: string
+        :param host_attrs: host attributes to mirror
+        :type host_attrs: list
+        :param service_attrs: service attributes to mirror
+        :type service_attrs: list
+        :param service_joins: joins to fetch with the services
+        :type service_joins: list
+        :param resync_delay: seconds to wait before reconnecting after the
+                             event stream broke
+        :type resync_delay: float
+        :param idle_timeout: reconnect after this many seconds without data
+                             on the event stream
+        :type idle_timeout: float
+        '''
+
+        self.client = client
+        self.queue = queue
+        self.attrs = {
+            'Host': host_attrs or HOST_ATTRS,
+            'Service': service_attrs or SERVICE_ATTRS,
+        }
+        self.joins = {
+            'Host': None,
+            'Service': service_joins or SERVICE_JOINS,
+        }
+        self.resync_delay = resync_delay
+        self.idle_timeout = idle_timeout
+        self.objects = {'Host': {}, 'Service': {}}
+        self.index = ObjectIndex()
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._last_update = None
+        self._last_sync = None
+        self._gap_start = None
+        self._seeded = threading.Event()
+        self._seed_error = None
+        self._events = 0
+        self._resyncs = 0
+        self._lag_last = None
+        self._lag_sum = 0.0
+        self._lag_max = 0.0
+
+    def sync(self):
+        '''
+        (re)load all mirrored objects from the API
+        '''
+
+        objects = {}
+        for object_type in ('Host', 'Service'):
+            objects[object_type] = dict(
+                (result['name'], result)
+                for result in self.client.objects.iter_list(
+                    object_type,
+                    attrs=self.attrs[object_type],
+                    joins=self.joins[object_type]
+                )
+            )
+        with self._lock:
+            for object_type, by_name in objects.items():
+                self._replace(object_type, by_name)
+            self._last_sync = self._last_update = time.time()
+        LOG.debug("Mirror synced %s hosts and %s services",
+                  len(objects['Host']), len(objects['Service']))
+
+    def _replace(self, object_type, by_name):
+        '''
+        replace all objects of a type
+        '''
+
+        for name in self.objects[object_type]:
+            if name not in by_name:
+                self.index.remove(object_type, name)
+        self.objects[object_type] = by_name
+        for result in by_name.values():
+            self.index.add(result)
+
+    def _store(self, result):
+        '''
+        add or replace one object
+        '''
+
+        self.objects[result['type']][result['name']] = result
+        self.index.add(result)
+
+    def _remove(self, object_type, name):
+        '''
+        remove one object
+        '''
+
+        self.index.remove(object_type, name)
+        return self.objects[object_type].pop(name, None)
+
+    def _changed(self, result):
+        '''
+        called after the attributes of an object were updated by an event
+        '''
+
+        self.index.update(result)
+
+    def start(self, timeout=60):
+        '''
+        follow the event stream in a background thread and seed the mirror
+
+        The objects are loaded after the event stream is open, so no change
+        between loading and subscribing is lost. Returns after the first
+        load.
+
+        :param timeout: seconds to wait for the first load
+        :type timeout: float
+        '''
+
+        if self._thread is not None:
+            raise Icinga2ApiException('Mirror is already running.')
+        self._stop.clear()
+        self._seeded.clear()
+        self._seed_error = None
+        self._thread = threading.Thread(target=self._run,
+                                        name='icinga2api-mirror')
+        self._thread.daemon = True
+        self._thread.start()
+        if not self._seeded.wait(timeout) or self._seed_error is not None:
+            error = self._seed_error
+            self.stop(0)
+            raise Icinga2ApiException(
+                'Mirror could not load the objects: {0}'.format(
+                    error or 'timeout'))
+
+    def stop(self, timeout=None):
+        '''
+        stop following the event stream
+
+        The stream is closed after the next event, pass a timeout to not
+        wait longer than that.
+
+        :param timeout: seconds to wait for the background thread
+        :type timeout: float
+        '''
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        '''
+        apply the event stream, (re)load the objects after every connect
+        '''
+
+        while not self._stop.is_set():
+            # the subscription reconnects by itself, a failed resync ends it
+            try:
+                for event in self.client.events.subscribe(
+                        MIRROR_EVENT_TYPES,
+                        self.queue,
+                        decode=True,
+                        reconnect=True,
+                        idle_timeout=self.idle_timeout,
+                        on_connect=self._on_connect,
+                        reconnect_delay=self.resync_delay):
+                    self.apply(event)
+                    if self._stop.is_set():
+                        return
+            except _Stopped:
+                return
+            except Exception as error:  # pylint: disable=broad-except
+                LOG.warning("Mirror event stream broke: %s", error)
+            if self._gap_start is None:
+                self._gap_start = time.time()
+            self._stop.wait(self.resync_delay)
+
+    def _on_connect(self, gap):
+        '''
+        load the objects after the event stream (re)connected
+        '''
+
+        if self._stop.is_set():
+            raise _Stopped()
+        seeded = self._seeded.is_set()
+        if seeded:
+            if gap is None and self._gap_start is not None:
+                gap = time.time() - self._gap_start
+            LOG.info("Mirror resyncing after a gap of %.1fs", gap or 0.0)
+        try:
+            self.sync()
+        except Exception as error:
+            if seeded:
+                raise
+            self._seed_error = error
+            self._stop.set()
+            self._seeded.set()
+            raise _Stopped()
+        if seeded:
+            self._resyncs += 1
+        self._gap_start = None
+        self._seeded.set()
+
+    def apply(self, event):
+        '''
+        apply one decoded event to the mirrored objects
+
+        :param event: the event
+        :type event: Event
+        '''
+
+        handler = getattr(self, '_apply_' + (event.type or ''), None)
+        if handler is None:
+            return
+        args = ()
+        fetch = getattr(self, '_fetch_' + event.type, None)
+        if fetch is not None:
+            # requests are made outside the lock to not block the readers
+            args = (fetch(event),)
+        with self._lock:
+            handler(event, *args)
+            now = time.time()
+            self._last_update = now
+            self._events += 1
+            if event.timestamp:
+                lag = now - event.timestamp
+                self._lag_last = lag
+                self._lag_sum += lag
+                self._lag_max = max(self._lag_max, lag)
+
+    def _lookup(self, event):
+        '''
+        return the mirrored object an event belongs to
+        '''
+
+        if event.service:
+            return self.objects['Service'].get(event.object_name)
+        return self.objects['Host'].get(event.host)
+
+    def _apply_CheckResult(self, event):  # pylint: disable=invalid-name
+        result = self._lookup(event)
+        if result is None:
+            return
+        attrs = result['attrs']
+        check_result = event.get('check_result') or {}
+        attrs['last_check_result'] = check_result
+        if check_result.get('execution_end'):
+            attrs['last_check'] = check_result['execution_end']
+        vars_after = check_result.get('vars_after') or {}
+        if 'state' in vars_after:
+            attrs['state'] = vars_after['state']
+            attrs['state_type'] = vars_after.get('state_type',
+                                                 attrs.get('state_type'))
+        elif event.service:
+            attrs['state'] = check_result.get('state')
+        elif check_result.get('state') is not None:
+            # host states are UP (0) for OK/WARNING, DOWN (1) otherwise
+            attrs['state'] = 0.0 if check_result['state'] <= 1 else 1.0
+        if event.get('acknowledgement') is not None:
+            attrs['acknowledgement'] = event['acknowledgement']
+        if event.get('downtime_depth') is not None:
+            attrs['downtime_depth'] = event['downtime_depth']
+        self._changed(result)
+
+    def _apply_StateChange(self, event):  # pylint: disable=invalid-name
+        result = self._lookup(event)
+        if result is None:
+            return
+        attrs = result['attrs']
+        attrs['state'] = event.state
+        attrs['state_type'] = event.state_type
+        attrs['last_state_change'] = event.timestamp
+        if event.get('acknowledgement') is not None:
+            attrs['acknowledgement'] = event['acknowledgement']
+        if event.get('downtime_depth') is not None:
+            attrs['downtime_depth'] = event['downtime_depth']
+        self._changed(result)
+
+    def _apply_AcknowledgementSet(self, event):  # pylint: disable=invalid-name
+        result = self._lookup(event)
+        if result is None:
+            return
+        result['attrs']['acknowledgement'] = \
+            event.acknowledgement_type or 1.0
+        self._changed(result)
+
+    def _apply_AcknowledgementCleared(self, event):  # pylint: disable=invalid-name
+        result = self._lookup(event)
+        if result is None:
+            return
+        result['attrs']['acknowledgement'] = 0.0
+        self._changed(result)
+
+    def _apply_DowntimeTriggered(self, event):  # pylint: disable=invalid-name
+        # a flexible downtime starts its window before it is in effect
+        result = self._lookup(event)
+        if result is None:
+            return
+        attrs = result['attrs']
+        attrs['downtime_depth'] = (attrs.get('downtime_depth') or 0) + 1
+        self._changed(result)
+
+    def _apply_DowntimeRemoved(self, event):  # pylint: disable=invalid-name
+        result = self._lookup(event)
+        if result is None:
+            return
+        attrs = result['attrs']
+        # only triggered downtimes were counted towards the depth
+        if (event.downtime or {}).get('trigger_time') and \
+                attrs.get('downtime_depth'):
+            attrs['downtime_depth'] -= 1
+            self._changed(result)
+
+    def _fetch_ObjectCreated(self, event):  # pylint: disable=invalid-name
+        object_type = event.object_type
+        if object_type not in self.objects:
+            return None
+        try:
+            return self.client.objects.get(
+                object_type,
+                event.object_name,
+                attrs=self.attrs[object_type],
+                joins=self.joins[object_type]
+            )
+        except Icinga2ApiException as error:
+            LOG.warning("Mirror could not fetch %s %s: %s",
+                        object_type, event.object_name, error)
+            return None
+
+    def _apply_ObjectCreated(self, event, result):  # pylint: disable=invalid-name,unused-argument
+        if result is not None:
+            self._store(result)
+
+    def _apply_ObjectDeleted(self, event):  # pylint: disable=invalid-name
+        if event.object_type in self.objects:
+            self._remove(event.object_type, event.object_name)
+
+    def get(self, object_type, name):
+        '''
+        return a mirrored object
+
+        :param object_type: Host or Service
+        :type object_type: string
+        :param name: the object name
+        :type name: string
+        :returns: the object or None
+        :rtype: dictionary
+        '''
+
+        return self.objects[object_type].get(name)
+
+    def query(self, object_type=None, filters=None, filter_vars=None,
+              **criteria):
+        '''
+        return the mirrored objects matching all criteria, see
+        ``icinga2api.query.ObjectIndex.query``
+
+        A filter expression is evaluated locally on the objects found by
+        the criteria, see ``icinga2api.filters``.
+
+        example 1:
+        query('Service', state=2, host_group='linux-servers',
+              acknowledged=False)
+
+        example 2:
+        query('Service', state=2, filters='match("*prod*", host.name)')
+
+        :param filters: filter expression
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dictionary
+        :returns: the matching objects
+        :rtype: list
+        '''
+
+        results = self.index.query(object_type, **criteria)
+        if filters:
+            results = filter_objects(results, filters, filter_vars)
+        return results
+
+    @property
+    def hosts(self):
+        '''
+        all mirrored hosts by name
+        '''
+
+        return self.objects['Host']
+
+    @property
+    def services(self):
+        '''
+        all mirrored services by name
+        '''
+
+        return self.objects['Service']
+
+    def stats(self):
+        '''
+        return mirror metrics
+
+        update_lag is the delay between an event's timestamp and applying
+        it, staleness the time since the last sync or applied event.
+
+        :returns: object counts, event counts, update lag and staleness
+        :rtype: dictionary
+        '''
+
+        now = time.time()
+        gap_start = self._gap_start
+        subscription = self.client.events.subscriptions.get(self.queue)
+        if gap_start is None and subscription is not None:
+            gap_start = subscription.disconnected_since
+        with self._lock:
+            return {
+                'hosts': len(self.objects['Host']),
+                'services': len(self.objects['Service']),
+                'events': self._events,
+                'resyncs': self._resyncs,
+                'reconnects': subscription.reconnects
+                              if subscription is not None else 0,
+                'connected': self._thread is not None and
+                             gap_start is None,
+                'last_sync': self._last_sync,
+                'staleness': now - self._last_update
+                             if self._last_update else None,
+                'gap': now - gap_start
+                       if gap_start is not None else None,
+                'update_lag': self._lag_last,
+                'update_lag_avg': self._lag_sum / self._events
+                                  if self._events else None,
+                'update_lag_max': self._lag_max,
+            }
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API subscription multiplexer
+
+Runs many event subscriptions on one asyncio loop. Subscriptions with the same
+server side filter share one stream with the union of their types, the types
+and client side filters of each subscription are applied to the shared stream.
+'''
+
+import asyncio
+import logging
+import queue
+import threading
+
+from icinga2api.filters import compile_filter, event_variables
+
+LOG = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class Subscription(object):
+    '''
+    one subscriber of a multiplexed stream
+    '''
+
+    def __init__(self, name, types, match=None, callback=None,
+                 filters=None, filter_vars=None, match_vars=None):
+        '''
+        initialize object, see ``SubscriptionManager.add``
+        '''
+
+        self.name = name
+        self.types = frozenset(types)
+        if isinstance(match, str):
+            match = self._compile(match, match_vars)
+        self.match = match
+        self.callback = callback
+        self.filters = filters
+        self.filter_vars = filter_vars
+        self.events = 0
+
+    @staticmethod
+    def _compile(expression, match_vars):
+        '''
+        return a match function evaluating a filter expression
+        '''
+
+        function = compile_filter(expression)
+
+        def match(event):
+            return function(event_variables(event), match_vars)
+        return match
+
+    @property
+    def stream_key(self):
+        '''
+        subscriptions with the same key can share a stream
+        '''
+
+        filter_vars = self.filter_vars
+        if filter_vars is not None:
+            filter_vars = tuple(sorted(
+                (key, repr(value)) for key, value in filter_vars.items()))
+        return (self.filters, filter_vars)
+
+    def accepts(self, event):
+        '''
+        return True if the event is meant for this subscription
+        '''
+
+        if event.type not in self.types:
+            return False
+        return self.match is None or bool(self.match(event))
+
+    def __repr__(self):
+        return '<Subscription {0}>'.format(self.name)
+
+
+class SubscriptionManager(object):
+    '''
+    multiplex event subscriptions over few streams on one asyncio loop
+
+    example 1:
+    manager = SubscriptionManager(async_client, 'monitor')
+    manager.add(['StateChange'], name='tickets',
+                match=lambda event: event.state == 2)
+    manager.add(['CheckResult', 'StateChange'], name='metrics')
+    async for subscription, event in manager:
+        print(subscription.name, event.host)
+
+    example 2:
+    manager.add(['StateChange'], callback=create_ticket)
+    manager.start()
+    '''
+
+    def __init__(self, client, queue_prefix='icinga2api-multiplex',
+                 queue_size=10000, **kwargs):
+        '''
+        initialize object
+
+        :param client: the asyncio client
+        :type client: AsyncClient
+        :param queue_prefix: the event queue names are the prefix and the
+                             number of the stream
+        :type queue_prefix: string
+        :param queue_size: the maximum number of events waiting to be
+                           iterated, the streams are not read while it is
+                           full; events of subscriptions without callback are
+                           dropped and counted while the manager is not
+                           iterated
+        :type queue_size: int
+        :param kwargs: further arguments for ``AsyncEvents.subscribe``, the
+                       streams reconnect by default
+        '''
+
+        self.client = client
+        self.queue_prefix = queue_prefix
+        self.queue_size = queue_size
+        self.subscribe_args = dict(kwargs)
+        self.subscribe_args.setdefault('reconnect', True)
+        self.subscriptions = []
+        self.events = 0
+        self.dropped = 0
+        self._queue = None
+        self._iterating = False
+        self._done = False
+        self._sync_queue = None
+        self._tasks = []
+        self._loop = None
+        self._thread = None
+
+    def add(self, types, name=None, match=None, callback=None,
+            filters=None, filter_vars=None, match_vars=None):
+        '''
+        add a subscription, before the manager is run
+
+        :param types: the event types
+        :type types: list
+        :param name: the name, defaults to a number
+        :type name: string
+        :param match: client side filter, a function called with every
+                      decoded event of the types or a filter expression
+                      evaluated locally, see ``icinga2api.filters``
+        :type match: callable or string
+        :param callback: called with every matching event, may be a
+                         coroutine function; without a callback the events
+                         are returned by iterating the manager
+        :type callback: callable
+        :param filters: server side filter expression, subscriptions with
+                        different filters need separate streams
+        :type filters: string
+        :param filter_vars: variables of the server side filter
+        :type filter_vars: dictionary
+        :param match_vars: variables of the client side filter expression
+        :type match_vars: dictionary
+        :returns: the subscription
+        :rtype: Subscription
+        '''
+
+        if name is None:
+            name = str(len(self.subscriptions))
+        subscription = Subscription(
+            name, types, match, callback, filters, filter_vars, match_vars)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def streams(self):
+        '''
+        return the streams needed for the subscriptions
+
+        :returns: (queue name, types, filters, filter_vars, subscriptions)
+                  of every stream
+        :rtype: list
+        '''
+
+        groups = {}
+        for subscription in self.subscriptions:
+            groups.setdefault(subscription.stream_key, []).append(subscription)
+
+        streams = []
+        for number, subscriptions in enumerate(groups.values()):
+            types = set()
+            for subscription in subscriptions:
+                types.update(subscription.types)
+            streams.append((
+                '{0}-{1}'.format(self.queue_prefix, number),
+                sorted(types),
+                subscriptions[0].filters,
+                subscriptions[0].filter_vars,
+                subscriptions
+            ))
+        return streams
+
+    async def run(self):
+        '''
+        read all streams until they end or the manager is closed
+        '''
+
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+        self._done = False
+        self._tasks = [
+            asyncio.ensure_future(self._read(*stream))
+            for stream in self.streams()
+        ]
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            self._done = True
+            try:
+                self._queue.put_nowait(_STOP)
+            except asyncio.QueueFull:
+                # the iterator stops once it took the remaining events
+                pass
+
+    async def _read(self, queue_name, types, filters, filter_vars,
+                    subscriptions):
+        '''
+        deliver the events of one stream to its subscriptions
+        '''
+
+        LOG.debug("Subscribing %s to %s for %s",
+                  queue_name, ', '.join(types), subscriptions)
+        async for event in self.client.events.subscribe(
+                types, queue_name, filters, filter_vars, decode=True,
+                **self.subscribe_args):
+            self.events += 1
+            for subscription in subscriptions:
+                try:
+                    if not subscription.accepts(event):
+                        continue
+                except Exception:  # pylint: disable=broad-except
+                    LOG.exception("Filter of %s failed", subscription)
+                    continue
+                if subscription.callback is None:
+                    if self._iterating:
+                        subscription.events += 1
+                        await self._queue.put((subscription, event))
+                    else:
+                        self.dropped += 1
+                    continue
+                subscription.events += 1
+                try:
+                    result = subscription.callback(event)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception:  # pylint: disable=broad-except
+                    LOG.exception("Callback of %s failed", subscription)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        '''
+        run the manager and return (subscription, event) of every event of
+        the subscriptions without callback
+        '''
+
+        self._queue = asyncio.Queue(self.queue_size)
+        self._iterating = True
+        task = asyncio.ensure_future(self.run())
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _STOP:
+                    break
+                yield item
+                if self._done and self._queue.empty():
+                    break
+        finally:
+            self._iterating = False
+            await self.close()
+            if task.done() and not task.cancelled() and task.exception():
+                raise task.exception()
+
+    async def close(self):
+        '''
+        stop reading the streams
+        '''
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def start(self):
+        '''
+        run the manager on a background thread with its own loop
+
+        The callbacks are called on that thread, events of subscriptions
+        without callback are returned by ``iter_events``.
+        '''
+
+        self._loop = asyncio.new_event_loop()
+        self._sync_queue = queue.Queue(self.queue_size)
+        self._thread = threading.Thread(
+            target=self._run_thread,
+            name='icinga2api-multiplex'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run_thread(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._forward())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._sync_queue.put(_STOP)
+            self._loop.run_until_complete(self.client.close())
+            self._loop.close()
+
+    async def _forward(self):
+        '''
+        hand the iterated events over to the synchronous queue
+        '''
+
+        if all(subscription.callback is not None
+               for subscription in self.subscriptions):
+            await self.run()
+            return
+        async for item in self:
+            await self._loop.run_in_executor(None, self._sync_queue.put, item)
+
+    def iter_events(self):
+        '''
+        return (subscription, event) of every event of the subscriptions
+        without callback, while the manager runs on its thread
+
+        :returns: the events
+        :rtype: tuple
+        '''
+
+        while True:
+            item = self._sync_queue.get()
+            if item is _STOP:
+                return
+            yield item
+
+    def stop(self, timeout=None):
+        '''
+        stop the manager started with ``start``
+
+        :param timeout: seconds to wait for the thread
+        :type timeout: float
+        '''
+
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(
+            lambda: asyncio.ensure_future(self.close()))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        '''
+        return multiplexer metrics
+
+        :returns: the number of streams, read and dropped events and events
+                  per subscription
+        :rtype: dictionary
+        '''
+
+        return {
+            'streams': len(self._tasks),
+            'events': self.events,
+            'dropped': self.dropped,
+            'subscriptions': dict(
+                (subscription.name, subscription.events)
+                for subscription in self.subscriptions),
+        }
@@ -30,10 +30,71 @@ from __future__ import print_function
 import logging
 
 from icinga2api.base import Base
+from icinga2api.bulk import run_bulk_tiers
+from icinga2api.cache import MISSING, ObjectCache
+from icinga2api.columnar import ColumnarResult
 from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.stream import STREAM_CHUNK_SIZE, iter_json_array
+from icinga2api.sync import diff_objects, query_attrs
 
 LOG = logging.getLogger(__name__)
 
+# object types by dependency, every tier only references earlier ones
+OBJECT_TIERS = (
+    ('Endpoint',),
+    ('Zone',),
+    ('ApiUser', 'CheckCommand', 'EventCommand', 'NotificationCommand',
+     'TimePeriod', 'HostGroup', 'ServiceGroup', 'UserGroup'),
+    ('Host', 'User'),
+    ('Service',),
+    ('Dependency', 'Notification', 'ScheduledDowntime'),
+)
+TIER_OF_TYPE = dict(
+    (object_type, tier)
+    for tier, object_types in enumerate(OBJECT_TIERS)
+    for object_type in object_types
+)
+
+# url paths of the object types
+OBJECT_TYPES = {
+    'ApiListener': 'apilisteners',
+    'ApiUser': 'apiusers',
+    'CheckCommand': 'checkcommands',
+    'Arguments': 'argumentss',
+    'CheckerComponent': 'checkercomponents',
+    'CheckResultReader': 'checkresultreaders',
+    'Comment': 'comments',
+    'CompatLogger': 'compatloggers',
+    'Dependency': 'dependencys',
+    'Downtime': 'downtimes',
+    'Endpoint': 'endpoints',
+    'EventCommand': 'eventcommands',
+    'ExternalCommandListener': 'externalcommandlisteners',
+    'FileLogger': 'fileloggers',
+    'GelfWriter': 'gelfwriters',
+    'GraphiteWriter': 'graphitewriters',
+    'Host': 'hosts',
+    'HostGroup': 'hostgroups',
+    'IcingaApplication': 'icingaapplications',
+    'IdoMySqlConnection': 'idomysqlconnections',
+    'IdoPgSqlConnection': 'idopgsqlconnections',
+    'LiveStatusListener': 'livestatuslisteners',
+    'Notification': 'notifications',
+    'NotificationCommand': 'notificationcommands',
+    'NotificationComponent': 'notificationcomponents',
+    'OpenTsdbWriter': 'opentsdbwriters',
+    'PerfdataWriter': 'perfdatawriters',
+    'ScheduledDowntime': 'scheduleddowntimes',
+    'Service': 'services',
+    'ServiceGroup': 'servicegroups',
+    'StatusDataWriter': 'statusdatawriters',
+    'SyslogLogger': 'syslogloggers',
+    'TimePeriod': 'timeperiods',
+    'User': 'users',
+    'UserGroup': 'usergroups',
+    'Zone': 'zones',
+}
+
 
 class Objects(Base):
     '''
@@ -42,57 +103,78 @@ class Objects(Base):
 
     base_url_path = 'v1/objects'
 
+    def __init__(self, manager):
+        '''
+        initialize object
+        '''
+
+        super(Objects, self).__init__(manager)
+        self.cache = None
+
+    def enable_cache(self, ttl=60, max_entries=1024):
+        '''
+        cache the results of list() and get()
+
+        Results are shared between callers and must not be modified. create(),
+        update() and delete() drop the affected results.
+
+        example 1:
+        enable_cache(ttl=10, max_entries=5000)
+
+        :param ttl: seconds a cached result stays valid
+        :type ttl: float
+        :param max_entries: maximum number of cached results
+        :type max_entries: int
+        :returns: the cache
+        :rtype: ObjectCache
+        '''
+
+        self.cache = ObjectCache(ttl, max_entries)
+        return self.cache
+
+    def disable_cache(self):
+        '''
+        stop caching results
+        '''
+
+        self.cache = None
+
+    def _invalidate_cache(self, object_type, cascade=False):
+        '''
+        drop the cached results affected by a change of object_type
+        '''
+
+        if self.cache is None:
+            return
+        if cascade:
+            # dependent objects of other types are deleted too
+            self.cache.invalidate()
+        else:
+            self.cache.invalidate(object_type)
+
+    def _write(self, object_type, method, url_path, payload, cascade=False):
+        '''
+        make a modifying request and drop the affected cached results
+        '''
+
+        try:
+            return self._request(method, url_path, payload)
+        finally:
+            self._invalidate_cache(object_type, cascade)
+
     @staticmethod
     def _convert_object_type(object_type=None):
         '''
         check if the object_type is a valid Icinga 2 object type
         '''
 
-        type_conv = {
-            'ApiListener': 'apilisteners',
-            'ApiUser': 'apiusers',
-            'CheckCommand': 'checkcommands',
-            'Arguments': 'argumentss',
-            'CheckerComponent': 'checkercomponents',
-            'CheckResultReader': 'checkresultreaders',
-            'Comment': 'comments',
-            'CompatLogger': 'compatloggers',
-            'Dependency': 'dependencys',
-            'Downtime': 'downtimes',
-            'Endpoint': 'endpoints',
-            'EventCommand': 'eventcommands',
-            'ExternalCommandListener': 'externalcommandlisteners',
-            'FileLogger': 'fileloggers',
-            'GelfWriter': 'gelfwriters',
-            'GraphiteWriter': 'graphitewriters',
-            'Host': 'hosts',
-            'HostGroup': 'hostgroups',
-            'IcingaApplication': 'icingaapplications',
-            'IdoMySqlConnection': 'idomysqlconnections',
-            'IdoPgSqlConnection': 'idopgsqlconnections',
-            'LiveStatusListener': 'livestatuslisteners',
-            'Notification': 'notifications',
-            'NotificationCommand': 'notificationcommands',
-            'NotificationComponent': 'notificationcomponents',
-            'OpenTsdbWriter': 'opentsdbwriters',
-            'PerfdataWriter': 'perfdatawriters',
-            'ScheduledDowntime': 'scheduleddowntimes',
-            'Service': 'services',
-            'ServiceGroup': 'servicegroups',
-            'StatusDataWriter': 'statusdatawriters',
-            'SyslogLogger': 'syslogloggers',
-            'TimePeriod': 'timeperiods',
-            'User': 'users',
-            'UserGroup': 'usergroups',
-            'Zone': 'zones',
-        }
-        if object_type not in type_conv:
+        if object_type not in OBJECT_TYPES:
             raise Icinga2ApiException(
                 'Icinga 2 object type "{}" does not exist.'.format(
                     object_type
                 ))
 
-        return type_conv[object_type]
+        return OBJECT_TYPES[object_type]
 
     def get(self,
             object_type,
@@ -168,6 +250,142 @@ class Objects(Base):
         list('Service', joins=True)
         '''
 
+        url_path, payload = self._list_request(
+            object_type,
+            name,
+            attrs,
+            filters,
+            filter_vars,
+            joins
+        )
+
+        if self.cache is None:
+            return self._request('GET', url_path, payload)['results']
+
+        key = self.cache.make_key(
+            object_type, name, attrs, filters, filter_vars, joins)
+        results = self.cache.get(key)
+        if results is MISSING:
+            results = self._request('GET', url_path, payload)['results']
+            self.cache.set(key, results)
+        return results
+
+    def iter_list(self,
+                  object_type,
+                  name=None,
+                  attrs=None,
+                  filters=None,
+                  filter_vars=None,
+                  joins=None,
+                  chunk_size=STREAM_CHUNK_SIZE):
+        '''
+        get objects by type or name, one at a time
+
+        Same as list() but the response is parsed while it arrives and the
+        objects are yielded one by one, so the memory usage does not grow
+        with the number of objects.
+
+        example 1:
+        for service in iter_list('Service', attrs=['state']):
+            print(service['name'], service['attrs']['state'])
+
+        :param object_type: type of the object
+        :type object_type: string
+        :param name: list object with this name
+        :type name: string
+        :param attrs: only return these attributes
+        :type attrs: list
+        :param filters: filters matched object(s)
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dict
+        :param joins: show joined object
+        :type joins: list
+        :param chunk_size: number of bytes to read at once
+        :type chunk_size: int
+        :returns: the objects
+        :rtype: dictionary
+        '''
+
+        url_path, payload = self._list_request(
+            object_type,
+            name,
+            attrs,
+            filters,
+            filter_vars,
+            joins
+        )
+
+        stream = self._request('GET', url_path, payload, stream=True)
+        try:
+            for result in iter_json_array(stream.iter_content(chunk_size)):
+                yield result
+        finally:
+            stream.close()
+
+    def list_columnar(self,
+                      object_type,
+                      attrs,
+                      name=None,
+                      filters=None,
+                      filter_vars=None,
+                      joins=None):
+        '''
+        get objects by type or name as columns
+
+        The response is streamed like in iter_list() and every attribute is
+        stored as one column: ``array('d')`` for numbers, interned strings
+        for text. Joined attributes are named like the join.
+
+        example 1:
+        services = list_columnar('Service', ['zone', 'latency', 'execution_time'])
+        services.mean('latency', by='zone')
+        services.percentile('execution_time', 99)
+
+        example 2:
+        services = list_columnar('Service', ['state'], joins=['host.zone'])
+        services.column('host.zone')
+
+        :param object_type: type of the object
+        :type object_type: string
+        :param attrs: the attributes to return as columns
+        :type attrs: list
+        :param name: list object with this name
+        :type name: string
+        :param filters: filters matched object(s)
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dict
+        :param joins: joined attributes to return as columns
+        :type joins: list
+        :returns: the columnar result
+        :rtype: ColumnarResult
+        '''
+
+        if not attrs:
+            raise Icinga2ApiException('attrs are required for columns.')
+
+        return ColumnarResult.from_results(
+            self.iter_list(object_type, name, attrs, filters, filter_vars,
+                           joins),
+            attrs,
+            joins
+        )
+
+    def _list_request(self,
+                      object_type,
+                      name=None,
+                      attrs=None,
+                      filters=None,
+                      filter_vars=None,
+                      joins=None):
+        '''
+        build url path and payload of a list request
+
+        :returns: the url path and the payload
+        :rtype: tuple
+        '''
+
         object_type_url_path = self._convert_object_type(object_type)
         url_path = '{}/{}'.format(self.base_url_path, object_type_url_path)
         if name:
@@ -185,7 +403,7 @@ class Objects(Base):
         elif joins:
             payload['joins'] = joins
 
-        return self._request('GET', url_path, payload)['results']
+        return url_path, payload
 
     def create(self,
                object_type,
@@ -228,7 +446,7 @@ class Objects(Base):
             name
         )
 
-        return self._request('PUT', url_path, payload)
+        return self._write(object_type, 'PUT', url_path, payload)
 
     def update(self,
                object_type,
@@ -257,7 +475,7 @@ class Objects(Base):
             name
         )
 
-        return self._request('POST', url_path, attrs)
+        return self._write(object_type, 'POST', url_path, {'attrs': attrs})
 
     def delete(self,
                object_type,
@@ -300,4 +518,142 @@ class Objects(Base):
         if name:
             url += '/{}'.format(name)
 
-        return self._request('DELETE', url, payload)
+        return self._write(object_type, 'DELETE', url, payload, cascade)
+
+    def bulk(self, operations, max_in_flight=10):
+        '''
+        create, update and delete many objects concurrently
+
+        The operations are run in tiers by object type so that referenced
+        objects exist first: endpoints, zones, commands, time periods and
+        groups, hosts and users, services, then dependencies, notifications
+        and scheduled downtimes. Deletions follow in reverse order. The
+        operations of a tier are sent concurrently, at most max_in_flight
+        at the same time. A failing operation does not abort the others.
+
+        example 1:
+        bulk = bulk([
+            {'object_type': 'Host', 'name': 'web01',
+             'templates': ['generic-host'], 'attrs': {'address': '10.0.0.1'}},
+            {'object_type': 'Service', 'name': 'web01!http',
+             'templates': ['generic-service'],
+             'attrs': {'check_command': 'http'}},
+            {'action': 'delete', 'object_type': 'Host', 'name': 'web99'},
+        ], max_in_flight=20)
+        for item in bulk.failed:
+            print(item.item['name'], item.error)
+        print(bulk.stats())
+
+        :param operations: every operation with the arguments of create(),
+                           update() or delete() and the action ``create``
+                           (default), ``update`` or ``delete``
+        :type operations: iterable of dictionaries
+        :param max_in_flight: maximum number of concurrent requests
+        :type max_in_flight: int
+        :returns: the outcome of every operation, in the input order
+        :rtype: BulkResult
+        '''
+
+        return run_bulk_tiers(
+            self._bulk_operation,
+            self._bulk_tiers(operations),
+            max_in_flight
+        )
+
+    @staticmethod
+    def _bulk_tiers(operations):
+        '''
+        group the operations into tiers of (position, operation)
+        '''
+
+        last = len(OBJECT_TIERS)
+        tiers = {}
+        for index, operation in enumerate(operations):
+            action = operation.get('action', 'create')
+            if action not in ('create', 'update', 'delete'):
+                raise Icinga2ApiException(
+                    'Unknown bulk action "{0}".'.format(action))
+            tier = TIER_OF_TYPE.get(operation['object_type'], last)
+            if action == 'delete':
+                tier = 2 * last + 1 - tier
+            tiers.setdefault(tier, []).append((index, operation))
+        return [tiers[tier] for tier in sorted(tiers)]
+
+    def _bulk_operation(self, operation):
+        '''
+        run one operation of bulk()
+        '''
+
+        action = operation.get('action', 'create')
+        if action == 'create':
+            return self.create(operation['object_type'],
+                               operation['name'],
+                               operation.get('templates'),
+                               operation.get('attrs'))
+        if action == 'update':
+            return self.update(operation['object_type'],
+                               operation['name'],
+                               operation.get('attrs'))
+        return self.delete(operation['object_type'],
+                           operation.get('name'),
+                           operation.get('filters'),
+                           operation.get('filter_vars'),
+                           operation.get('cascade', True))
+
+    def sync(self,
+             desired,
+             filters=None,
+             filter_vars=None,
+             delete=False,
+             cascade=False,
+             max_in_flight=10,
+             dry_run=False):
+        '''
+        bring the objects to a desired state with the least requests
+
+        The current objects of every desired type are fetched with one
+        list() each, restricted to the compared attributes. Only missing
+        objects are created and only changed attributes are updated, see
+        ``icinga2api.sync.diff_objects``.
+
+        example 1:
+        sync([{'object_type': 'Host', 'name': 'web01',
+               'templates': ['generic-host'],
+               'attrs': {'address': '10.0.0.1', 'vars.managed': 'cmdb'}}],
+             filters={'Host': 'host.vars.managed == "cmdb"'},
+             delete=True)
+
+        :param desired: the desired objects with object_type, name and
+                        optionally templates and attrs
+        :type desired: list of dictionaries
+        :param filters: filter expression by object type, restricting the
+                        current objects which are compared and deleted
+        :type filters: dictionary
+        :param filter_vars: variables used in the filters expressions
+        :type filter_vars: dictionary
+        :param delete: delete the current objects which are not desired
+        :type delete: bool
+        :param cascade: delete dependent objects with them
+        :type cascade: bool
+        :param max_in_flight: maximum number of concurrent requests
+        :type max_in_flight: int
+        :param dry_run: only return the operations
+        :type dry_run: bool
+        :returns: the outcome of every operation, or the operations with
+                  dry_run
+        :rtype: BulkResult or list
+        '''
+
+        current = []
+        for object_type, attrs in query_attrs(desired).items():
+            current.extend(self.list(
+                object_type,
+                attrs=attrs or ['name'],
+                filters=(filters or {}).get(object_type),
+                filter_vars=filter_vars
+            ))
+        operations = diff_objects(desired, current, delete, cascade)
+        LOG.debug("Sync needs %d operations", len(operations))
+        if dry_run:
+            return operations
+        return self.bulk(operations, max_in_flight)
@@ -0,0 +1,481 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API performance data
+
+Parser and serializer for the Nagios plugin performance data format:
+
+    'label'=value[UOM];[warn];[crit];[min];[max]
+
+Icinga 2 returns the performance data of a check result as a list of these
+strings, plugins print them space separated. Thresholds are ranges like ``10``,
+``10:``, ``~:10``, ``10:20`` or ``@10:20``.
+'''
+
+from __future__ import print_function
+import logging
+import re
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+# one value: a quoted or plain label, the value with its unit and up to four
+# thresholds and limits
+_PERFDATA = re.compile(r'''
+    (?:'((?:[^']|'')*)'|([^'=\s][^=\s]*))
+    =(?:U|([-+]?(?:\d+(?:[.,]\d*)?|[.,]\d+)(?:[eE][-+]?\d+)?)([^;\s]*))
+    (?:;([^;\s]*))?(?:;([^;\s]*))?(?:;([^;\s]*))?(?:;([^;\s]*))?;*
+    (?=\s|$)
+''', re.VERBOSE)
+
+# thresholds and limits repeat for every check result of a check, they are
+# parsed once
+_CACHE_SIZE = 4096
+_EMPTY_FIELDS = [''] * 4
+_NUMBER_END = frozenset('0123456789.')
+_UNIT_CHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ%/'
+_RANGES = {}
+_NUMBERS = {}
+_THRESHOLDS = {}
+
+
+def _number(text):
+    '''
+    return the float of a number, None if it is empty or not a number
+    '''
+
+    try:
+        return _NUMBERS[text]
+    except KeyError:
+        pass
+    try:
+        number = float(text.replace(',', '.'))
+    except ValueError:
+        number = None
+    if len(_NUMBERS) > _CACHE_SIZE:
+        _NUMBERS.clear()
+    _NUMBERS[text] = number
+    return number
+
+
+class Range(object):
+    '''
+    a threshold range, alerting outside of start..end or, with ``@``, inside
+    '''
+
+    __slots__ = ('start', 'end', 'inside')
+
+    def __init__(self, start=0.0, end=None, inside=False):
+        '''
+        initialize object
+
+        :param start: the lower bound, None for negative infinity
+        :type start: float
+        :param end: the upper bound, None for infinity
+        :type end: float
+        :param inside: alert inside the range instead of outside
+        :type inside: bool
+        '''
+
+        self.start = start
+        self.end = end
+        self.inside = inside
+
+    @classmethod
+    def parse(cls, text):
+        '''
+        parse a range, the parsed ranges are cached
+
+        :param text: the range, e.g. ``10:20``
+        :type text: string
+        :returns: the range, None for an empty text
+        :rtype: Range
+        '''
+
+        if not text:
+            return None
+        try:
+            return _RANGES[text]
+        except KeyError:
+            pass
+
+        inside = text.startswith('@')
+        body = text[1:] if inside else text
+        if ':' in body:
+            start, end = body.split(':', 1)
+            start = None if start == '~' else (_number(start) if start
+                                               else 0.0)
+            end = _number(end) if end else None
+        else:
+            start, end = 0.0, _number(body)
+        if end is None and body and not body.endswith(':'):
+            raise Icinga2ApiException('Invalid range "{0}".'.format(text))
+        value = cls(start, end, inside)
+
+        if len(_RANGES) > _CACHE_SIZE:
+            _RANGES.clear()
+        _RANGES[text] = value
+        return value
+
+    def alerts(self, value):
+        '''
+        return True if the value violates the threshold
+
+        :param value: the value
+        :type value: float
+        :rtype: bool
+        '''
+
+        within = (self.start is None or value >= self.start) and \
+            (self.end is None or value <= self.end)
+        return within if self.inside else not within
+
+    def __str__(self):
+        text = '@' if self.inside else ''
+        if self.start is None:
+            text += '~:'
+        elif self.start != 0 or self.end is None:
+            text += _format_number(self.start) + ':'
+        if self.end is not None:
+            text += _format_number(self.end)
+        return text
+
+    def __eq__(self, other):
+        return isinstance(other, Range) and \
+            (self.start, self.end, self.inside) == \
+            (other.start, other.end, other.inside)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.start, self.end, self.inside))
+
+    def __repr__(self):
+        return '<Range {0}>'.format(self)
+
+
+def _format_number(number):
+    '''
+    format a number without a needless fraction
+    '''
+
+    if number == int(number) and abs(number) < 1e15:
+        return str(int(number))
+    return repr(number)
+
+
+class PerfdataValue(object):
+    '''
+    one performance data value
+    '''
+
+    __slots__ = ('label', 'value', 'unit', 'warn', 'crit', 'min', 'max')
+
+    def __init__(self, label, value, unit=None, warn=None, crit=None,
+                 min=None, max=None):  # pylint: disable=redefined-builtin
+        '''
+        initialize object
+
+        :param label: the label
+        :type label: string
+        :param value: the value, None if it is unknown (``U``)
+        :type value: float
+        :param unit: the unit of measurement, e.g. ``ms``, ``%``, ``B``
+                     or ``c`` for counters
+        :type unit: string
+        :param warn: the warning threshold
+        :type warn: Range
+        :param crit: the critical threshold
+        :type crit: Range
+        :param min: the minimum value
+        :type min: float
+        :param max: the maximum value
+        :type max: float
+        '''
+
+        self.label = label
+        self.value = value
+        self.unit = unit
+        self.warn = warn
+        self.crit = crit
+        self.min = min
+        self.max = max
+
+    @property
+    def counter(self):
+        '''
+        True if the value is a continuous counter
+        '''
+
+        return self.unit == 'c'
+
+    def as_dict(self):
+        '''
+        return the value as dictionary with the ranges as strings
+
+        :rtype: dictionary
+        '''
+
+        return {
+            'label': self.label,
+            'value': self.value,
+            'unit': self.unit,
+            'warn': str(self.warn) if self.warn is not None else None,
+            'crit': str(self.crit) if self.crit is not None else None,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    def __str__(self):
+        label = self.label
+        if "'" in label or '=' in label or ' ' in label:
+            label = "'{0}'".format(label.replace("'", "''"))
+        fields = [
+            'U' if self.value is None else _format_number(self.value) +
+            (self.unit or ''),
+            '' if self.warn is None else str(self.warn),
+            '' if self.crit is None else str(self.crit),
+            '' if self.min is None else _format_number(self.min),
+            '' if self.max is None else _format_number(self.max),
+        ]
+        while len(fields) > 1 and not fields[-1]:
+            fields.pop()
+        return '{0}={1}'.format(label, ';'.join(fields))
+
+    def __eq__(self, other):
+        return isinstance(other, PerfdataValue) and \
+            all(getattr(self, name) == getattr(other, name)
+                for name in self.__slots__)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<PerfdataValue {0}>'.format(self)
+
+
+def _from_dict(data):
+    '''
+    convert a PerfdataValue object as returned by the API
+    '''
+
+    def threshold(value):
+        if value is None:
+            return None
+        return Range(0.0, float(value))
+
+    return PerfdataValue(
+        data['label'], data.get('value'), data.get('unit') or None,
+        threshold(data.get('warn')), threshold(data.get('crit')),
+        data.get('min'), data.get('max'))
+
+
+def parse_perfdata(perfdata, strict=False):
+    '''
+    parse performance data
+
+    example 1:
+    parse_perfdata("rta=0.5ms;100;500;0 'packet loss'=0%;80;100")
+
+    example 2:
+    parse_perfdata(event.check_result.performance_data)
+
+    :param perfdata: a space separated string or a list of strings or
+                     PerfdataValue dictionaries as returned by the API
+    :type perfdata: string or list
+    :param strict: raise on malformed values instead of skipping them
+    :type strict: bool
+    :returns: the values
+    :rtype: list of PerfdataValue
+    '''
+
+    if not perfdata:
+        return []
+    if not isinstance(perfdata, (list, tuple)):
+        perfdata = [perfdata]
+
+    values = []
+    # consecutive plain values are parsed in one go
+    tokens = []
+    for item in perfdata:
+        if isinstance(item, dict):
+            if tokens:
+                _parse_plain(tokens, values, strict)
+                tokens = []
+            values.append(_from_dict(item))
+            continue
+        if "'" not in item:
+            tokens += item.split()
+            continue
+        if item[0] == "'" and item.count("'") == 2 and \
+                item.find("'=") > 0 and item.find(' ', item.find("'=")) < 0:
+            # one value with a quoted label as returned by the API
+            tokens.append(item)
+            continue
+        if tokens:
+            _parse_plain(tokens, values, strict)
+            tokens = []
+        _parse_quoted(item, values, strict)
+    if tokens:
+        _parse_plain(tokens, values, strict)
+    return values
+
+
+def _thresholds(text):
+    '''
+    parse the thresholds and limits following the value
+    '''
+
+    warn, crit, minimum, maximum = (text.split(';') + _EMPTY_FIELDS)[:4]
+    thresholds = (
+        Range.parse(warn),
+        Range.parse(crit),
+        _number(minimum) if minimum else None,
+        _number(maximum) if maximum else None)
+    if len(_THRESHOLDS) > _CACHE_SIZE:
+        _THRESHOLDS.clear()
+    _THRESHOLDS[text] = thresholds
+    return thresholds
+
+
+def _parse_plain(tokens, values, strict):
+    '''
+    parse performance data split on spaces, the tokens are plain values or
+    single values with a quoted label, which is split on semicolons instead
+    of matching the full expression
+    '''
+
+    append = values.append
+    cache = _THRESHOLDS
+    number_end = _NUMBER_END
+    new = object.__new__
+    value_class = PerfdataValue
+    for token in tokens:
+        if token[0] != "'":
+            label, _, fields = token.partition('=')
+        else:
+            quote = token.find("'=")
+            label, fields = token[1:quote], token[quote + 2:]
+        value, _, rest = fields.partition(';')
+        try:
+            if not label:
+                raise ValueError(token)
+            if value[-1] in number_end:
+                # most values have no unit
+                unit = None
+                number = float(value)
+            elif value == 'U':
+                number = unit = None
+            else:
+                number = value.rstrip(_UNIT_CHARS)
+                unit = value[len(number):]
+                number = float(number)
+            thresholds = cache.get(rest) or _thresholds(rest)
+        except (ValueError, IndexError, Icinga2ApiException):
+            # e.g. decimal commas, fall back to the full expression
+            _parse_quoted(token, values, strict)
+            continue
+        # calling the class costs more than parsing the value, the slots
+        # are set directly
+        result = new(value_class)
+        result.label = label
+        result.value = number
+        result.unit = unit
+        result.warn, result.crit, result.min, result.max = thresholds
+        append(result)
+
+
+def _parse_quoted(item, values, strict):
+    '''
+    parse performance data with the full expression
+    '''
+
+    position = 0
+    for found in _PERFDATA.finditer(item):
+        if found.start() != position and \
+                item[position:found.start()].strip():
+            _invalid(item[position:found.start()], strict)
+        position = found.end()
+        quoted, label, number, unit, warn, crit, minimum, maximum = \
+            found.groups()
+        if quoted is not None:
+            label = quoted.replace("''", "'")
+        if number is not None:
+            number = _number(number)
+        try:
+            values.append(PerfdataValue(
+                label,
+                number,
+                unit or None,
+                Range.parse(warn),
+                Range.parse(crit),
+                _number(minimum) if minimum else None,
+                _number(maximum) if maximum else None))
+        except Icinga2ApiException as error:
+            _invalid(found.group(0), strict, error)
+    if item[position:].strip():
+        _invalid(item[position:], strict)
+
+
+def _invalid(text, strict, error=None):
+    '''
+    raise or log a malformed part of the performance data
+    '''
+
+    if strict:
+        raise error or Icinga2ApiException(
+            'Invalid performance data "{0}".'.format(text.strip()))
+    LOG.debug("Skipping invalid performance data %r", text)
+
+
+def parse_perfdata_batch(batch, strict=False):
+    '''
+    parse the performance data of many check results
+
+    :param batch: the performance data of every check result
+    :type batch: iterable
+    :param strict: raise on malformed values instead of skipping them
+    :type strict: bool
+    :returns: the values of every check result
+    :rtype: list of lists
+    '''
+
+    return [parse_perfdata(perfdata, strict) for perfdata in batch]
+
+
+def format_perfdata(values):
+    '''
+    serialize performance data values, e.g. for
+    ``Actions.process_check_result``
+
+    :param values: the values
+    :type values: iterable of PerfdataValue
+    :returns: one string per value
+    :rtype: list
+    '''
+
+    return [str(value) for value in values]
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API local object queries
+
+Secondary indexes over Host and Service results (as returned by Objects.list
+or kept by ObjectMirror) answering state questions without scanning every
+object or asking the API.
+'''
+
+from __future__ import print_function
+import logging
+import threading
+
+LOG = logging.getLogger(__name__)
+
+INDEXED_FIELDS = (
+    'type',
+    'state',
+    'state_type',
+    'host_name',
+    'group',
+    'host_group',
+    'acknowledged',
+    'in_downtime',
+)
+
+
+def _index_values(result):
+    '''
+    return the indexed values of one object
+
+    :returns: tuples of (field, value)
+    :rtype: list
+    '''
+
+    object_type = result.get('type')
+    attrs = result.get('attrs') or {}
+    groups = attrs.get('groups') or ()
+    if object_type == 'Host':
+        host_name = result.get('name')
+        host_groups = groups
+    else:
+        host_name = attrs.get('host_name')
+        host = (result.get('joins') or {}).get('host') or {}
+        host_groups = host.get('groups') or ()
+
+    values = [
+        ('type', object_type),
+        ('state', attrs.get('state')),
+        ('state_type', attrs.get('state_type')),
+        ('host_name', host_name),
+        ('acknowledged', bool(attrs.get('acknowledgement'))),
+        ('in_downtime', bool(attrs.get('downtime_depth'))),
+    ]
+    values.extend(('group', group) for group in groups)
+    values.extend(('host_group', group) for group in host_groups)
+    return values
+
+
+class ObjectIndex(object):
+    '''
+    Icinga 2 API object index class
+
+    Services need the ``host_name`` and ``groups`` attributes and the
+    ``host.groups`` join to be found by host and host group.
+    '''
+
+    def __init__(self, results=None):
+        '''
+        initialize object
+
+        :param results: objects as returned by Objects.list
+        :type results: iterable
+        '''
+
+        self.objects = {}
+        self._indexes = dict((field, {}) for field in INDEXED_FIELDS)
+        self._values = {}
+        self._lock = threading.Lock()
+        if results is not None:
+            for result in results:
+                self.add(result)
+
+    @staticmethod
+    def _key(object_type, name):
+        return (object_type, name)
+
+    def add(self, result):
+        '''
+        add or re-index an object
+
+        Call this again after changing the attributes of an indexed object.
+
+        :param result: the object as returned by Objects.list
+        :type result: dictionary
+        '''
+
+        key = self._key(result.get('type'), result.get('name'))
+        values = _index_values(result)
+        with self._lock:
+            self._unindex(key)
+            self.objects[key] = result
+            self._values[key] = values
+            for field, value in values:
+                self._indexes[field].setdefault(value, set()).add(key)
+
+    update = add
+
+    def remove(self, object_type, name):
+        '''
+        remove an object
+
+        :param object_type: Host or Service
+        :type object_type: string
+        :param name: the object name
+        :type name: string
+        :returns: the removed object or None
+        :rtype: dictionary
+        '''
+
+        key = self._key(object_type, name)
+        with self._lock:
+            self._unindex(key)
+            return self.objects.pop(key, None)
+
+    def clear(self):
+        '''
+        remove all objects
+        '''
+
+        with self._lock:
+            self.objects.clear()
+            self._values.clear()
+            for index in self._indexes.values():
+                index.clear()
+
+    def _unindex(self, key):
+        '''
+        remove a key from all indexes, the lock must be held
+        '''
+
+        for field, value in self._values.pop(key, ()):
+            keys = self._indexes[field].get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._indexes[field][value]
+
+    def _candidates(self, field, value):
+        '''
+        return the keys matching one criterion, lists/tuples/sets match any
+        of their values
+        '''
+
+        index = self._indexes[field]
+        if isinstance(value, (list, tuple, set, frozenset)):
+            keys = set()
+            for item in value:
+                keys.update(index.get(item, ()))
+            return keys
+        return index.get(value, set())
+
+    def _match(self, object_type, criteria):
+        '''
+        intersect the matching keys, starting with the smallest set
+        '''
+
+        if object_type is not None:
+            criteria['type'] = object_type
+        candidates = [
+            self._candidates(field, value)
+            for field, value in criteria.items()
+            if value is not None
+        ]
+        if not candidates:
+            return set(self.objects)
+        candidates.sort(key=len)
+        keys = set(candidates[0])
+        for other in candidates[1:]:
+            if not keys:
+                break
+            keys.intersection_update(other)
+        return keys
+
+    def query(self,
+              object_type=None,
+              state=None,
+              state_type=None,
+              host_name=None,
+              group=None,
+              host_group=None,
+              acknowledged=None,
+              in_downtime=None):
+        '''
+        return all objects matching every given criterion
+
+        A list of values matches any of them.
+
+        example 1:
+        query('Service', state=2, host_group='linux-servers',
+              acknowledged=False)
+
+        example 2:
+        query('Host', state=1, in_downtime=False)
+
+        :param object_type: Host or Service
+        :type object_type: string
+        :param state: the state(s)
+        :type state: int or list
+        :param state_type: 0 soft, 1 hard
+        :type state_type: int
+        :param host_name: the host or the host of the service
+        :type host_name: string or list
+        :param group: host group of a host, service group of a service
+        :type group: string or list
+        :param host_group: host group of the host or the service's host
+        :type host_group: string or list
+        :param acknowledged: the problem is acknowledged
+        :type acknowledged: bool
+        :param in_downtime: the object is in a downtime
+        :type in_downtime: bool
+        :returns: the matching objects
+        :rtype: list
+        '''
+
+        criteria = {
+            'state': state,
+            'state_type': state_type,
+            'host_name': host_name,
+            'group': group,
+            'host_group': host_group,
+            'acknowledged': acknowledged,
+            'in_downtime': in_downtime,
+        }
+        with self._lock:
+            keys = self._match(object_type, criteria)
+            return [self.objects[key] for key in keys]
+
+    def count(self, object_type=None, **criteria):
+        '''
+        return the number of objects matching every given criterion,
+        see query()
+
+        :returns: the number of matching objects
+        :rtype: int
+        '''
+
+        with self._lock:
+            return len(self._match(object_type, criteria))
+
+    def __len__(self):
+        return len(self.objects)
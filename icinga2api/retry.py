@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API retries
+
+Retry policy with exponential backoff and jitter, and a circuit breaker which
+fails fast while the API endpoint is down.
+'''
+
+from __future__ import print_function
+import calendar
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
+
+LOG = logging.getLogger(__name__)
+
+# responses of an endpoint that is down or overloaded, other errors (e.g. 500
+# for an object that already exists) come from a healthy API
+FAILURE_STATUSES = (502, 503, 504)
+
+
+class RetryPolicy(object):
+    '''
+    Icinga 2 API retry policy class
+
+    Only GET requests (sent as POST with X-HTTP-Method-Override) are
+    idempotent. Other requests are retried when the server certainly did not
+    process them: connect errors and 429/503 responses.
+    '''
+
+    def __init__(self,
+                 retries=3,
+                 backoff_factor=0.5,
+                 backoff_max=30,
+                 jitter=True,
+                 retry_statuses=(429, 502, 503, 504),
+                 retry_non_idempotent=False):
+        '''
+        initialize object
+
+        :param retries: maximum number of retries per request
+        :type retries: int
+        :param backoff_factor: the delay before retry n is
+                               backoff_factor * 2 ** n seconds
+        :type backoff_factor: float
+        :param backoff_max: maximum delay between two attempts in seconds
+        :type backoff_max: float
+        :param jitter: wait a random time between 0 and the delay
+        :type jitter: bool
+        :param retry_statuses: HTTP status codes to retry
+        :type retry_statuses: tuple
+        :param retry_non_idempotent: retry POST, PUT and DELETE requests on
+                                     every error, too
+        :type retry_non_idempotent: bool
+        '''
+
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+        self.retry_non_idempotent = retry_non_idempotent
+
+    @staticmethod
+    def is_idempotent(method):
+        '''
+        return True if the request may be sent twice
+
+        :param method: the HTTP method
+        :type method: string
+        :rtype: bool
+        '''
+
+        return method.upper() == 'GET'
+
+    def should_retry(self,
+                     method,
+                     attempt,
+                     status=None,
+                     error=None,
+                     connect_error=False):
+        '''
+        decide whether to retry a failed attempt
+
+        :param method: the HTTP method
+        :type method: string
+        :param attempt: number of retries done so far
+        :type attempt: int
+        :param status: the HTTP status code
+        :type status: int
+        :param error: the connection error
+        :type error: Exception
+        :param connect_error: the connection could not be established
+        :type connect_error: bool
+        :rtype: bool
+        '''
+
+        if attempt >= self.retries:
+            return False
+        safe = self.retry_non_idempotent or self.is_idempotent(method)
+        if error is not None:
+            return safe or connect_error
+        if status in self.retry_statuses:
+            # 429 and 503 are returned before the request is processed
+            return safe or status in (429, 503)
+        return False
+
+    def delay(self, attempt, retry_after=None):
+        '''
+        return the seconds to wait before the next attempt
+
+        :param attempt: number of retries done so far
+        :type attempt: int
+        :param retry_after: the Retry-After header of the response
+        :type retry_after: string
+        :returns: the delay
+        :rtype: float
+        '''
+
+        delay = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        retry_after = self.parse_retry_after(retry_after)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    @staticmethod
+    def parse_retry_after(value):
+        '''
+        parse a Retry-After header, seconds or HTTP date
+
+        :param value: the header value
+        :type value: string
+        :returns: the seconds to wait or None
+        :rtype: float
+        '''
+
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return None
+        if parsed[9] is None:
+            retry_at = calendar.timegm(parsed[:9])
+        else:
+            retry_at = mktime_tz(parsed)
+        return max(0.0, retry_at - time.time())
+
+
+class CircuitBreaker(object):
+    '''
+    Icinga 2 API circuit breaker class
+
+    After failure_threshold consecutive failures the circuit opens and every
+    request fails immediately. After reset_timeout seconds one trial request
+    is let through (half open); its success closes the circuit again.
+    '''
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        '''
+        initialize object
+
+        :param failure_threshold: consecutive failures opening the circuit
+        :type failure_threshold: int
+        :param reset_timeout: seconds until a trial request is allowed
+        :type reset_timeout: float
+        '''
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        '''
+        return True if a request may be sent
+
+        :rtype: bool
+        '''
+
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and \
+                    time.time() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        '''
+        record a successful request
+        '''
+
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self.opened_at = None
+
+    def record_failure(self):
+        '''
+        record a failed request
+        '''
+
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or \
+                    self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    LOG.warning("Circuit breaker opened after %s failures",
+                                self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def stats(self):
+        '''
+        return the circuit breaker state
+
+        :returns: state, consecutive failures, trips and rejected requests
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
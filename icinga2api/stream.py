@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API stream helpers
+'''
+
+from __future__ import print_function
+import codecs
+import json
+import logging
+import re
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+# read the event stream in large chunks, for chunked transfer encoding
+# urllib3 returns each chunk as soon as it arrived
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class MessageSplitter(object):
+    '''
+    split byte chunks into messages
+
+    The chunks are collected in one reusable buffer and decoded only once a
+    complete message is available, so multi-byte UTF-8 characters spanning
+    two chunks are decoded correctly.
+    '''
+
+    __slots__ = ('buf', 'delimiter')
+
+    def __init__(self, delimiter=b'\n'):
+        '''
+        initialize object
+
+        :param delimiter: the message delimiter
+        :type delimiter: bytes
+        '''
+
+        self.buf = bytearray()
+        self.delimiter = delimiter
+
+    def split(self, chunk):
+        '''
+        feed a chunk and return the messages completed by it
+
+        :param chunk: the raw chunk as read from the socket
+        :type chunk: bytes
+        :returns: the complete messages
+        :rtype: list
+        '''
+
+        messages = []
+        buf = self.buf
+        delimiter = self.delimiter
+        end = chunk.find(delimiter)
+        if end == -1:
+            buf += chunk
+            return messages
+        if buf:
+            # complete the message started in an earlier chunk
+            buf += memoryview(chunk)[:end]
+            messages.append(buf.decode('utf-8'))
+            del buf[:]
+        else:
+            messages.append(chunk[:end].decode('utf-8'))
+        start = end + 1
+        end = chunk.find(delimiter, start)
+        while end != -1:
+            messages.append(chunk[start:end].decode('utf-8'))
+            start = end + 1
+            end = chunk.find(delimiter, start)
+        if start < len(chunk):
+            buf += memoryview(chunk)[start:]
+        return messages
+
+    def flush(self):
+        '''
+        return the incomplete message left in the buffer
+
+        :returns: the rest of the stream
+        :rtype: list
+        '''
+
+        if not self.buf:
+            return []
+        message = self.buf.decode('utf-8')
+        del self.buf[:]
+        return [message]
+
+
+def iter_messages(chunks, delimiter=b'\n'):
+    '''
+    split a stream of byte chunks into messages
+
+    :param chunks: the raw chunks as read from the socket
+    :type chunks: iterable
+    :param delimiter: the message delimiter
+    :type delimiter: bytes
+    :returns: the messages
+    :rtype: string
+    '''
+
+    splitter = MessageSplitter(delimiter)
+    for chunk in chunks:
+        if chunk:
+            for message in splitter.split(chunk):
+                yield message
+    for message in splitter.flush():
+        yield message
+
+
+class JsonArrayParser(object):
+    '''
+    incrementally parse the array stored under key in a JSON document
+
+    Only the element being parsed and the unparsed rest of the current chunk
+    are kept in memory. Chunks are fed as they arrive and the completed
+    elements are returned, so the parser works for blocking and asyncio
+    streams alike.
+    '''
+
+    __slots__ = ('key', 'decoder', 'text_decoder', 'start_pattern', 'buf',
+                 'in_array', 'done')
+
+    whitespace = ' \t\n\r,'
+
+    def __init__(self, key='results'):
+        '''
+        initialize object
+
+        :param key: the key of the array, the first occurrence is used
+        :type key: string
+        '''
+
+        self.key = key
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.start_pattern = re.compile(
+            r'"{0}"\s*:\s*\['.format(re.escape(key)))
+        self.buf = ''
+        self.in_array = False
+        self.done = False
+
+    def feed(self, chunk, final=False):
+        '''
+        feed a chunk and return the elements completed by it
+
+        :param chunk: the raw chunk of the document
+        :type chunk: bytes
+        :param final: the chunk is the last one
+        :type final: bool
+        :returns: the completed elements
+        :rtype: list
+        '''
+
+        elements = []
+        if self.done:
+            return elements
+        buf = self.buf + self.text_decoder.decode(chunk, final=final)
+        pos = 0
+
+        if not self.in_array:
+            match = self.start_pattern.search(buf)
+            if not match:
+                # keep enough to match a key split between two chunks
+                self.buf = buf[-(len(self.key) + 64):]
+                if final:
+                    self.done = True
+                return elements
+            pos = match.end()
+            self.in_array = True
+
+        whitespace = self.whitespace
+        while True:
+            while pos < len(buf) and buf[pos] in whitespace:
+                pos += 1
+            if pos == len(buf):
+                break
+            if buf[pos] == ']':
+                self.done = True
+                self.buf = ''
+                return elements
+            try:
+                element, pos = self.decoder.raw_decode(buf, pos)
+            except ValueError:
+                if final:
+                    raise Icinga2ApiException(
+                        'Invalid JSON in "{0}" array at: {1}'.format(
+                            self.key, buf[pos:pos + 80]))
+                # the element is not complete yet
+                break
+            elements.append(element)
+
+        self.buf = buf[pos:]
+        if final:
+            raise Icinga2ApiException(
+                'Unexpected end of "{0}" array.'.format(self.key))
+        return elements
+
+
+def iter_json_array(chunks, key='results'):
+    '''
+    incrementally parse the array stored under key in a JSON document
+
+    :param chunks: the raw chunks of the document
+    :type chunks: iterable
+    :param key: the key of the array, the first occurrence is used
+    :type key: string
+    :returns: the array elements
+    :rtype: dictionary
+    '''
+
+    parser = JsonArrayParser(key)
+    for chunk in chunks:
+        for element in parser.feed(chunk):
+            yield element
+        if parser.done:
+            return
+    for element in parser.feed(b'', final=True):
+        yield element
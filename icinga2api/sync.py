@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API desired state sync
+
+Computes the minimal create, update and delete operations to bring the objects
+returned by ``Objects.list`` to a desired state.
+'''
+
+from __future__ import print_function
+import logging
+import re
+
+from icinga2api.columnar import STRING_TYPES
+
+LOG = logging.getLogger(__name__)
+
+_DURATION = re.compile(r'^\s*(?:\d+(?:\.\d+)?\s*(?:ms|s|m|h|d)\s*)+$')
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)\s*(ms|s|m|h|d)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+_DURATIONS = {}
+
+
+def _duration(value):
+    '''
+    return the seconds of an Icinga 2 duration like "5m", else None
+    '''
+
+    try:
+        return _DURATIONS[value]
+    except KeyError:
+        pass
+    seconds = None
+    if _DURATION.match(value):
+        seconds = sum(float(number) * _DURATION_UNITS[unit]
+                      for number, unit in _DURATION_PART.findall(value))
+    if len(_DURATIONS) > 1024:
+        _DURATIONS.clear()
+    _DURATIONS[value] = seconds
+    return seconds
+
+
+def _equal(desired, current):
+    '''
+    compare a desired attribute value with the one returned by the API,
+    which returns durations in seconds
+    '''
+
+    if desired == current:
+        return True
+    if isinstance(desired, STRING_TYPES) and isinstance(current, (int, float)) and \
+            not isinstance(current, bool):
+        return _duration(desired) == current
+    return False
+
+
+def _lookup(attrs, path):
+    '''
+    return the value of an attribute path like "vars.os"
+    '''
+
+    value = attrs
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def query_attrs(desired):
+    '''
+    return the top level attributes needed to compare the desired objects
+
+    :param desired: the desired objects
+    :type desired: iterable of dictionaries
+    :returns: the attribute names by object type
+    :rtype: dictionary
+    '''
+
+    attrs = {}
+    for spec in desired:
+        names = attrs.setdefault(spec['object_type'], set())
+        for path in spec.get('attrs') or ():
+            names.add(path.split('.', 1)[0])
+    return dict((object_type, sorted(names))
+                for object_type, names in attrs.items())
+
+
+def diff_objects(desired, current, delete=False, cascade=False):
+    '''
+    return the operations turning the current objects into the desired ones
+
+    New objects are created with all attributes and templates, existing
+    objects are updated with the changed attributes only. Attributes which
+    are not in the desired state are left alone. Every object is looked up
+    by type and name once, so the diff takes linear time.
+
+    example 1:
+    diff_objects(
+        [{'object_type': 'Host', 'name': 'web01',
+          'attrs': {'address': '10.0.0.1', 'vars.os': 'Linux'}}],
+        client.objects.list('Host', attrs=['address', 'vars']),
+        delete=True)
+
+    :param desired: the desired objects with object_type, name and
+                    optionally templates and attrs, attribute names may be
+                    paths like "vars.os"
+    :type desired: iterable of dictionaries
+    :param current: the current objects as returned by ``Objects.list``
+    :type current: iterable of dictionaries
+    :param delete: delete current objects which are not desired
+    :type delete: bool
+    :param cascade: delete dependent objects with them
+    :type cascade: bool
+    :returns: the operations for ``Objects.bulk``
+    :rtype: list
+    '''
+
+    existing = dict(((result['type'], result['name']), result['attrs'])
+                    for result in current)
+    operations = []
+    seen = set()
+    for spec in desired:
+        key = (spec['object_type'], spec['name'])
+        seen.add(key)
+        attrs = spec.get('attrs') or {}
+        current_attrs = existing.get(key)
+        if current_attrs is None:
+            operation = {
+                'action': 'create',
+                'object_type': spec['object_type'],
+                'name': spec['name'],
+                'attrs': attrs,
+            }
+            if spec.get('templates'):
+                operation['templates'] = spec['templates']
+            operations.append(operation)
+            continue
+        changed = dict(
+            (path, value) for path, value in attrs.items()
+            if not _equal(value, _lookup(current_attrs, path)))
+        if changed:
+            operations.append({
+                'action': 'update',
+                'object_type': spec['object_type'],
+                'name': spec['name'],
+                'attrs': changed,
+            })
+
+    if delete:
+        for key in existing:
+            if key not in seen:
+                operations.append({
+                    'action': 'delete',
+                    'object_type': key[0],
+                    'name': key[1],
+                    'cascade': cascade,
+                })
+    return operations
@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API transport
+
+The transport owns the HTTP connection pool of a client and is shared by all
+API classes (objects, actions, events and status).
+'''
+
+from __future__ import print_function
+import logging
+import threading
+import time
+import sys
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import ConnectTimeout, RequestException
+from urllib3.exceptions import NewConnectionError
+# pylint: disable=import-error,no-name-in-module
+if sys.version_info >= (3, 0):
+    from urllib.parse import urljoin
+else:
+    from urlparse import urljoin
+# pylint: enable=import-error,no-name-in-module
+
+from icinga2api.endpoints import ROUND_ROBIN, EndpointPool
+from icinga2api.exceptions import Icinga2ApiCircuitOpenException
+from icinga2api.instrumentation import RequestInfo, call_hooks
+from icinga2api.retry import FAILURE_STATUSES
+
+LOG = logging.getLogger(__name__)
+
+
+class PoolingAdapter(HTTPAdapter):
+    '''
+    HTTP adapter which keeps the connection counters of discarded pools
+    '''
+
+    def __init__(self, *args, **kwargs):
+        '''
+        initialize object
+        '''
+
+        self.retired_requests = 0
+        self.retired_connections = 0
+        super(PoolingAdapter, self).__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        '''
+        create the pool manager and hook into the disposal of its pools
+        '''
+
+        super(PoolingAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pools.dispose_func = self._retire_pool
+
+    def _retire_pool(self, pool):
+        '''
+        remember the counters of a pool before it is closed
+        '''
+
+        self.retired_requests += pool.num_requests
+        self.retired_connections += pool.num_connections
+        pool.close()
+
+    def pool_counters(self):
+        '''
+        sum up the counters of all pools ever used by this adapter
+
+        :returns: number of requests and number of new connections
+        :rtype: tuple
+        '''
+
+        num_requests = self.retired_requests
+        num_connections = self.retired_connections
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+        return num_requests, num_connections
+
+
+class Transport(object):
+    '''
+    Icinga 2 API transport class
+
+    Keeps one keep-alive ``requests.Session`` per client instead of opening a
+    new connection for every request.
+    '''
+
+    def __init__(self,
+                 manager,
+                 pool_connections=10,
+                 pool_maxsize=10,
+                 pool_block=False,
+                 max_idle=None,
+                 retry_policy=None,
+                 circuit_breaker=None,
+                 write_url=None,
+                 balancing=ROUND_ROBIN,
+                 health_check_interval=None,
+                 hooks=None):
+        '''
+        initialize object
+
+        :param manager: the client owning this transport
+        :type manager: Client
+        :param pool_connections: number of per-host pools to keep
+        :type pool_connections: int
+        :param pool_maxsize: maximum number of connections kept per host
+        :type pool_maxsize: int
+        :param pool_block: block instead of opening extra connections when
+                           pool_maxsize connections per host are in use
+        :type pool_block: bool
+        :param max_idle: close all pooled connections after this many seconds
+                         without a request
+        :type max_idle: float
+        :param retry_policy: retry failed requests
+        :type retry_policy: RetryPolicy
+        :param circuit_breaker: fail fast while the API is down
+        :type circuit_breaker: CircuitBreaker
+        :param write_url: preferred endpoint for writes
+        :type write_url: string
+        :param balancing: spread reads 'round-robin' or by 'least-latency'
+        :type balancing: string
+        :param health_check_interval: check all endpoints in a background
+                                      thread every this many seconds
+        :type health_check_interval: float
+        :param hooks: called around every request, see
+                      ``icinga2api.instrumentation.RequestHook``
+        :type hooks: list
+        '''
+
+        self.manager = manager
+        self.hooks = list(hooks or [])
+        self.endpoints = EndpointPool(
+            manager.urls,
+            strategy=balancing,
+            write_url=write_url
+        )
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.retries = 0
+        self.failovers = 0
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.max_idle = max_idle
+        self.session = None
+        self.adapter = None
+        self._last_used = None
+        self._lock = threading.Lock()
+        self._retired_requests = 0
+        self._retired_connections = 0
+        self._health_check_stop = threading.Event()
+        self._health_check_thread = None
+        if health_check_interval:
+            self._health_check_thread = threading.Thread(
+                target=self._run_health_checks,
+                args=(health_check_interval,),
+                name='icinga2api-health-check'
+            )
+            self._health_check_thread.daemon = True
+            self._health_check_thread.start()
+
+    def _create_session(self):
+        '''
+        create a session object
+        '''
+
+        session = requests.Session()
+        # prefer certificate authentification
+        if self.manager.certificate and self.manager.key:
+            # certificate and key are in different files
+            session.cert = (self.manager.certificate, self.manager.key)
+        elif self.manager.certificate:
+            # certificate and key are in the same file
+            session.cert = self.manager.certificate
+        elif self.manager.username and self.manager.password:
+            # use username and password
+            session.auth = (self.manager.username, self.manager.password)
+        session.headers = {
+            'User-Agent': 'Python-icinga2api/{0}'.format(self.manager.version),
+            'Accept': 'application/json'
+        }
+        adapter = PoolingAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        return session, adapter
+
+    def _close_session(self):
+        '''
+        close the current session and keep its connection counters
+        '''
+
+        if self.session is None:
+            return
+        self.session.close()
+        num_requests, num_connections = self.adapter.pool_counters()
+        self._retired_requests += num_requests
+        self._retired_connections += num_connections
+        self.session = None
+        self.adapter = None
+
+    def _get_session(self):
+        '''
+        return the pooled session, recreate it after max_idle seconds
+        '''
+
+        with self._lock:
+            now = time.time()
+            if self.session is not None and self.max_idle is not None and \
+                    now - self._last_used > self.max_idle:
+                LOG.debug("Transport idle for more than %ss, closing pool",
+                          self.max_idle)
+                self._close_session()
+            if self.session is None:
+                self.session, self.adapter = self._create_session()
+            self._last_used = now
+            return self.session
+
+    def request(self, method, url_path, payload=None, stream=False,
+                timeout=None):
+        '''
+        send a request over the pooled session
+
+        :param method: the HTTP method
+        :type method: string
+        :param url_path: the requested url path
+        :type url_path: string
+        :param payload: the payload to send
+        :type payload: dictionary
+        :param stream: do not read the response body
+        :type stream: bool
+        :param timeout: overrides the client's timeout, a tuple sets the
+                        connect and read timeout
+        :type timeout: float or tuple
+        :returns: the response
+        :rtype: requests.Response
+        '''
+
+        # create arguments for the request
+        request_args = {
+            'headers': {'X-HTTP-Method-Override': method.upper()},
+            'timeout': timeout or self.manager.timeout,
+            'verify': self._verify(),
+        }
+        payload_size = 0
+        if payload:
+            request_args['data'] = self.manager.codec.dumps(payload)
+            request_args['headers']['Content-Type'] = 'application/json'
+            payload_size = len(request_args['data'])
+        if stream:
+            request_args['stream'] = True
+
+        # event streams are reads, although sent with POST
+        write = not stream and method.upper() != 'GET'
+        attempt = 0
+        tried = set()
+        while True:
+            endpoint = self.endpoints.select(write, tried)
+            if endpoint is None:
+                tried.clear()
+                endpoint = self.endpoints.select(write)
+            request_args['url'] = urljoin(endpoint.url, url_path)
+            LOG.debug("Request URL: %s", request_args['url'])
+
+            if self.circuit_breaker is not None and \
+                    not self.circuit_breaker.allow():
+                raise Icinga2ApiCircuitOpenException(
+                    'Circuit breaker is open, not sending "{0}".'.format(
+                        request_args['url']))
+
+            info = None
+            if self.hooks:
+                info = RequestInfo(method, url_path, endpoint.url, attempt,
+                                   payload_size)
+                call_hooks(self.hooks, 'before_send', info)
+
+            try:
+                response = self._get_session().post(**request_args)
+            except RequestException as error:
+                if info is not None:
+                    info.finish()
+                    call_hooks(self.hooks, 'on_error', info, error)
+                self._record(endpoint, False)
+                connect_error = self._is_connect_error(error)
+                if self._failover(endpoint, tried, not write or connect_error):
+                    continue
+                if not self._retry(method, attempt, error=error,
+                                   connect_error=connect_error):
+                    raise
+                tried.clear()
+                attempt += 1
+                continue
+
+            status = response.status_code
+            self._record(endpoint, status not in FAILURE_STATUSES,
+                         response.elapsed.total_seconds())
+            response.hook_info = info
+            if info is not None:
+                info.status = status
+                info.timings['server'] = response.elapsed.total_seconds()
+            if status in (502, 503, 504) and self._failover(
+                    endpoint, tried, not write or status == 503):
+                self.finish_request(info)
+                response.close()
+                continue
+            if not self._retry(method, attempt,
+                               status=status,
+                               retry_after=response.headers.get(
+                                   'Retry-After'),
+                               response=response):
+                return response
+            self.finish_request(info)
+            tried.clear()
+            attempt += 1
+
+    def finish_request(self, info, response_size=None):
+        '''
+        call the after_response hooks for a request
+
+        :param info: the request, None without hooks
+        :type info: RequestInfo
+        :param response_size: the size of the response body in bytes
+        :type response_size: int
+        '''
+
+        if info is None:
+            return
+        if response_size is not None:
+            info.response_size = response_size
+        info.finish()
+        call_hooks(self.hooks, 'after_response', info)
+
+    def _failover(self, endpoint, tried, allowed):
+        '''
+        switch to another endpoint for the same request
+
+        :param endpoint: the failed endpoint
+        :type endpoint: Endpoint
+        :param tried: the endpoints already tried for this request
+        :type tried: set
+        :param allowed: the request may be sent again
+        :type allowed: bool
+        :returns: True if another endpoint should be tried
+        :rtype: bool
+        '''
+
+        tried.add(endpoint)
+        if not allowed or not self.endpoints.has_alternative(tried):
+            return False
+        LOG.debug("Failing over from %s", endpoint.url)
+        self.failovers += 1
+        return True
+
+    def _verify(self):
+        '''
+        return the verify argument of a request
+
+        It is passed with every request, as REQUESTS_CA_BUNDLE and
+        CURL_CA_BUNDLE override the session's verify setting.
+        '''
+
+        if self.manager.ca_certificate:
+            return self.manager.ca_certificate
+        return False
+
+    def check_endpoints(self):
+        '''
+        check the health of every endpoint and update its state
+
+        :returns: True for every healthy endpoint url
+        :rtype: dictionary
+        '''
+
+        health = {}
+        for endpoint in self.endpoints.endpoints:
+            try:
+                response = self._get_session().post(
+                    url=urljoin(endpoint.url, 'v1/status/IcingaApplication'),
+                    headers={'X-HTTP-Method-Override': 'GET'},
+                    timeout=self.manager.timeout,
+                    verify=self._verify(),
+                )
+                response.close()
+                healthy = response.status_code == 200
+            except RequestException as error:
+                LOG.debug("Health check of %s failed: %s", endpoint.url, error)
+                healthy = False
+            if healthy:
+                self.endpoints.record_success(
+                    endpoint, response.elapsed.total_seconds())
+            else:
+                self.endpoints.record_failure(endpoint)
+            health[endpoint.url] = healthy
+        return health
+
+    def _run_health_checks(self, interval):
+        '''
+        check the endpoints until the transport is closed
+        '''
+
+        while not self._health_check_stop.wait(interval):
+            try:
+                self.check_endpoints()
+            except Exception as error:  # pylint: disable=broad-except
+                LOG.warning("Health check failed: %s", error)
+
+    @staticmethod
+    def _is_connect_error(error):
+        '''
+        return True if the request was certainly not sent
+        '''
+
+        if isinstance(error, ConnectTimeout):
+            return True
+        if isinstance(error, RequestsConnectionError) and error.args:
+            reason = getattr(error.args[0], 'reason', None)
+            return isinstance(reason, NewConnectionError)
+        return False
+
+    def _record(self, endpoint, success, duration=None):
+        '''
+        report the outcome of an attempt to the endpoint pool and the
+        circuit breaker
+        '''
+
+        if success:
+            self.endpoints.record_success(endpoint, duration)
+        else:
+            self.endpoints.record_failure(endpoint)
+        if self.circuit_breaker is None:
+            return
+        if success:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+
+    def _retry(self, method, attempt, status=None, error=None,
+               connect_error=False, retry_after=None, response=None):
+        '''
+        wait before retrying if the retry policy allows another attempt
+
+        :returns: True if the request should be sent again
+        :rtype: bool
+        '''
+
+        policy = self.retry_policy
+        if policy is None or not policy.should_retry(
+                method, attempt, status, error, connect_error):
+            return False
+        delay = policy.delay(attempt, retry_after)
+        LOG.debug("Retrying %s request in %.2fs (attempt %s): %s",
+                  method, delay, attempt + 1, error or status)
+        if response is not None:
+            response.close()
+        self.retries += 1
+        time.sleep(delay)
+        return True
+
+    def stats(self):
+        '''
+        return connection reuse counters
+
+        :returns: number of requests, new and reused connections
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            num_requests = self._retired_requests
+            num_connections = self._retired_connections
+            if self.adapter is not None:
+                pool_requests, pool_connections = self.adapter.pool_counters()
+                num_requests += pool_requests
+                num_connections += pool_connections
+
+        return {
+            'requests': num_requests,
+            'new_connections': num_connections,
+            'reused_connections': num_requests - num_connections,
+            'retries': self.retries,
+            'failovers': self.failovers,
+        }
+
+    def close(self):
+        '''
+        close all pooled connections
+        '''
+
+        self._health_check_stop.set()
+        with self._lock:
+            self._close_session()
@@ -14,7 +14,18 @@ setup(
     description=DESCRIPTION,
     author=AUTHOR,
     author_email=AUTHOR_EMAIL,
-    install_requires=["requests"],
+    install_requires=[
+        "requests",
+        "futures; python_version < '3'",
+    ],
+    extras_require={
+        "async": ["aiohttp"],
+        "numpy": ["numpy"],
+        "opentelemetry": ["opentelemetry-api"],
+        "orjson": ["orjson"],
+        "msgspec": ["msgspec"],
+        "ujson": ["ujson"],
+    },
     keywords="Icinga api",
     license="2-Clause BSD",
     url=URL,
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of icinga2api, run against the fake API server of
+``icinga2api.fakeserver``
+'''
+
+import time
+
+
+def wait_for(condition, timeout=10):
+    '''
+    wait until condition() is true
+    '''
+
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.01)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the bulk and chunked actions against the fake API server
+'''
+
+import unittest
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from icinga2api.bulk import ChunkError
+from icinga2api.client import Client
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.fakeserver import FakeIcinga2Server
+from icinga2api.instrumentation import RequestHook
+
+if aiohttp is not None:
+    import asyncio
+    from icinga2api.asyncclient import AsyncClient
+
+NAMES = ['host{0:06d}.example.com'.format(number) for number in range(8)]
+BAD = NAMES[5]
+
+
+def failing_action(calls):
+    '''
+    return an action failing for every chunk containing BAD
+    '''
+
+    def remove_acknowledgement(object_type, filters, filter_vars):
+        names = filter_vars['names']
+        calls.append(len(names))
+        if BAD in names:
+            raise Icinga2ApiException('No objects found.')
+        return {'results': [{'code': 200, 'name': name} for name in names]}
+    return remove_acknowledgement
+
+
+def partially_failing_action(calls):
+    '''
+    return an action answering 200 with a failed result for BAD
+    '''
+
+    def acknowledge_problem(object_type, filters, filter_vars):
+        names = filter_vars['names']
+        calls.append(len(names))
+        return {'results': [
+            {'code': 409, 'status': "Host '{0}' is UP.".format(name)}
+            if name == BAD else
+            {'code': 200, 'status':
+             "Successfully acknowledged problem for object '{0}'.".format(
+                 name)}
+            for name in names]}
+    return acknowledge_problem
+
+
+class CountingHook(RequestHook):
+    '''
+    count the sent requests
+    '''
+
+    def __init__(self):
+        self.sent = 0
+
+    def before_send(self, info):
+        self.sent += 1
+
+
+class ActionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIcinga2Server(hosts=8, services_per_host=2)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.client = Client(self.server.url, 'root', 'icinga')
+
+    def test_process_check_results(self):
+        results = [{'object_type': 'Service',
+                    'name': '{0}!ping4'.format(name),
+                    'exit_status': 2,
+                    'plugin_output': 'PING CRITICAL'}
+                   for name in NAMES]
+        results.append({'object_type': 'Service',
+                        'name': 'missing.example.com!ping4',
+                        'exit_status': 0,
+                        'plugin_output': 'PING OK'})
+        bulk = self.client.actions.process_check_results(
+            results, max_in_flight=4)
+        self.assertEqual(len(bulk), 9)
+        self.assertEqual([item.index for item in bulk.failed], [8])
+        services = self.client.objects.list(
+            'Service', filters='service.state == 2')
+        self.assertEqual(len(services), 8)
+
+    def test_run_chunked(self):
+        bulk = self.client.actions.acknowledge_problems(
+            'Host', NAMES, 'icingaadmin', 'known', chunk_size=3)
+        self.assertFalse(bulk.failed)
+        self.assertEqual(len(bulk.merged_results()), 8)
+        hosts = self.client.objects.list(
+            'Host', filters='host.acknowledgement > 0')
+        self.assertEqual(len(hosts), 8)
+
+    def test_run_chunked_keeps_applied_objects(self):
+        calls = []
+        self.client.actions.remove_acknowledgement = failing_action(calls)
+        bulk = self.client.actions.run_chunked(
+            'remove_acknowledgement', 'Host', NAMES, chunk_size=8)
+        self.assertEqual(calls, [8, 4, 4, 2, 1, 1, 2])
+        self.assertEqual(len(bulk.failed), 1)
+        self.assertIsInstance(bulk.failed[0].error, ChunkError)
+        self.assertEqual(len(bulk.merged_results()), 7)
+        self.assertEqual(list(bulk.object_errors()), [BAD])
+
+    def test_run_chunked_reports_failed_results(self):
+        calls = []
+        self.client.actions.acknowledge_problem = \
+            partially_failing_action(calls)
+        bulk = self.client.actions.run_chunked(
+            'acknowledge_problem', 'Host', NAMES, chunk_size=8)
+        self.assertEqual(calls, [8])
+        self.assertEqual(len(bulk.merged_results()), 7)
+        errors = bulk.object_errors()
+        self.assertEqual(list(errors), [BAD])
+        self.assertIn('409', str(errors[BAD]))
+
+    def test_non_idempotent_chunks_are_not_resent(self):
+        self.server.stop()
+        server = FakeIcinga2Server(hosts=4, latency=0.3)
+        server.start()
+        self.addCleanup(server.stop)
+        hook = CountingHook()
+        client = Client(server.url, 'root', 'icinga', timeout=0.1,
+                        hooks=[hook])
+        bulk = client.actions.schedule_downtimes(
+            'Host', NAMES[:4], 'icingaadmin', 'maintenance',
+            1500000000, 1500003600, 3600, chunk_size=4)
+        self.assertEqual(hook.sent, 1)
+        self.assertEqual(sorted(bulk.object_errors()), NAMES[:4])
+        bulk = client.actions.run_chunked(
+            'remove_acknowledgement', 'Host', NAMES[:4], chunk_size=4)
+        # 4, 2 and 2, then every name on its own
+        self.assertEqual(hook.sent, 1 + 7)
+        self.assertEqual(len(bulk.object_errors()), 4)
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncActionsTest(unittest.TestCase):
+
+    def test_run_chunked_keeps_applied_objects(self):
+        calls = []
+
+        async def run():
+            client = AsyncClient('http://127.0.0.1:1/', 'root', 'icinga')
+            action = failing_action(calls)
+
+            async def remove_acknowledgement(**kwargs):
+                return action(**kwargs)
+            client.actions.remove_acknowledgement = remove_acknowledgement
+            try:
+                return await client.actions.run_chunked(
+                    'remove_acknowledgement', 'Host', NAMES, chunk_size=8)
+            finally:
+                await client.close()
+
+        bulk = asyncio.run(run())
+        self.assertEqual(calls, [8, 4, 4, 2, 1, 1, 2])
+        self.assertEqual(len(bulk.merged_results()), 7)
+        self.assertEqual(list(bulk.object_errors()), [BAD])
+
+    def test_run_chunked_reports_failed_results(self):
+        calls = []
+
+        async def run():
+            client = AsyncClient('http://127.0.0.1:1/', 'root', 'icinga')
+            action = partially_failing_action(calls)
+
+            async def acknowledge_problem(**kwargs):
+                return action(**kwargs)
+            client.actions.acknowledge_problem = acknowledge_problem
+            try:
+                return await client.actions.run_chunked(
+                    'acknowledge_problem', 'Host', NAMES, chunk_size=8)
+            finally:
+                await client.close()
+
+        bulk = asyncio.run(run())
+        self.assertEqual(calls, [8])
+        self.assertEqual(len(bulk.merged_results()), 7)
+        self.assertEqual(list(bulk.object_errors()), [BAD])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the asyncio client against the fake API server
+'''
+
+import asyncio
+import unittest
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.fakeserver import FakeIcinga2Server
+
+if aiohttp is not None:
+    from icinga2api.asyncclient import AsyncClient
+
+HOST = 'host000001.example.com'
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncClientTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeIcinga2Server(hosts=20, services_per_host=3)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def run_client(self, test):
+        '''
+        run a coroutine function with a client on a new loop
+        '''
+
+        async def run():
+            async with AsyncClient(self.server.url, 'root', 'icinga') \
+                    as client:
+                return await test(client)
+        return asyncio.run(run())
+
+    def test_list_and_get(self):
+        async def test(client):
+            hosts = await client.objects.list('Host', attrs=['name'])
+            host = await client.objects.get('Host', HOST)
+            with self.assertRaises(Icinga2ApiException):
+                await client.objects.get('Host', 'missing.example.com')
+            return hosts, host
+        hosts, host = self.run_client(test)
+        self.assertEqual(len(hosts), 20)
+        self.assertEqual(host['name'], HOST)
+
+    def test_iter_list_and_list_columnar(self):
+        async def test(client):
+            names = [result['name'] async for result in
+                     client.objects.iter_list('Service', attrs=['name'])]
+            columns = await client.objects.list_columnar(
+                'Service', ['host_name'])
+            return names, columns
+        names, columns = self.run_client(test)
+        self.assertEqual(len(names), 60)
+        self.assertEqual(len(columns), 60)
+        self.assertEqual(columns.column('host_name').count(HOST), 3)
+
+    def test_create_and_delete(self):
+        async def test(client):
+            await client.objects.create('Host', 'async.example.com',
+                                        attrs={'address': '192.0.2.1'})
+            host = await client.objects.get('Host', 'async.example.com')
+            await client.objects.delete('Host', 'async.example.com')
+            return host
+        host = self.run_client(test)
+        self.assertEqual(host['attrs']['address'], '192.0.2.1')
+
+    def test_subscribe(self):
+        name = HOST + '!disk'
+
+        async def test(client):
+            events = client.events.subscribe(
+                ['CheckResult'], 'test-async', decode=True)
+            first = asyncio.ensure_future(events.__anext__())
+            while not self.server.stats()['subscribers']:
+                await asyncio.sleep(0.01)
+            await client.actions.process_check_result(
+                'Service', name, 1, 'DISK WARNING', ['/=90%;80;95'])
+            event = await asyncio.wait_for(first, 10)
+            await events.aclose()
+            return event
+        event = self.run_client(test)
+        self.assertEqual(event.object_name, name)
+        self.assertEqual(event.check_result.exit_status, 1)
+
+    def test_status(self):
+        async def test(client):
+            return await client.status.list()
+        self.assertTrue(self.run_client(test)['results'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the synchronous client against the fake API server
+'''
+
+import json
+import threading
+import unittest
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from requests.adapters import HTTPAdapter
+
+from icinga2api.client import Client
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.fakeserver import FakeIcinga2Server
+from tests import wait_for
+
+HOST = 'host000001.example.com'
+
+
+class ClientTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeIcinga2Server(hosts=20, services_per_host=3)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.client = Client(self.server.url, 'root', 'icinga')
+
+    def test_list(self):
+        hosts = self.client.objects.list('Host', attrs=['name', 'state'])
+        self.assertEqual(len(hosts), 20)
+        self.assertEqual(set(hosts[0]['attrs']), set(['name', 'state']))
+        services = self.client.objects.list(
+            'Service', filters='host.name == name',
+            filter_vars={'name': HOST})
+        self.assertEqual(len(services), 3)
+
+    def test_get(self):
+        host = self.client.objects.get('Host', HOST)
+        self.assertEqual(host['name'], HOST)
+        with self.assertRaises(Icinga2ApiException):
+            self.client.objects.get('Host', 'missing.example.com')
+
+    def test_iter_list_matches_list(self):
+        names = [result['name'] for result in
+                 self.client.objects.iter_list('Service', attrs=['name'])]
+        self.assertEqual(
+            names,
+            [result['name'] for result in
+             self.client.objects.list('Service', attrs=['name'])])
+
+    def test_list_columnar(self):
+        columns = self.client.objects.list_columnar(
+            'Service', ['state', 'host_name'])
+        self.assertEqual(len(columns), 60)
+        self.assertEqual(columns.column('host_name').count(HOST), 3)
+
+    def test_create_update_delete(self):
+        self.client.objects.create('Host', 'created.example.com',
+                                   attrs={'address': '192.0.2.1'})
+        self.client.objects.update('Host', 'created.example.com',
+                                   {'address': '192.0.2.2'})
+        host = self.client.objects.get('Host', 'created.example.com')
+        self.assertEqual(host['attrs']['address'], '192.0.2.2')
+        self.client.objects.delete('Host', 'created.example.com')
+        with self.assertRaises(Icinga2ApiException):
+            self.client.objects.get('Host', 'created.example.com')
+
+    def test_sync_sends_the_changed_attrs(self):
+        bodies = []
+        send = HTTPAdapter.send
+
+        def record(adapter, request, **kwargs):
+            if request.url.endswith('/v1/objects/hosts/' + HOST) and \
+                    request.headers['X-HTTP-Method-Override'] == 'POST':
+                bodies.append(json.loads(request.body))
+            return send(adapter, request, **kwargs)
+        HTTPAdapter.send = record
+        self.addCleanup(setattr, HTTPAdapter, 'send', send)
+
+        bulk = self.client.objects.sync([
+            {'object_type': 'Host', 'name': HOST,
+             'attrs': {'address': '192.0.2.9'}}])
+        self.assertEqual(bulk.failed, [])
+        self.assertEqual(bodies, [{'attrs': {'address': '192.0.2.9'}}])
+        host = self.client.objects.get('Host', HOST)
+        self.assertEqual(host['attrs']['address'], '192.0.2.9')
+
+    def test_process_check_result_publishes_events(self):
+        name = HOST + '!ping4'
+        events = queue.Queue()
+
+        def read():
+            for event in self.client.events.subscribe(
+                    ['StateChange'], 'test-client', decode=True):
+                events.put(event)
+                return
+
+        thread = threading.Thread(target=read)
+        thread.daemon = True
+        thread.start()
+        wait_for(lambda: self.server.stats()['subscribers'])
+        self.client.actions.process_check_result(
+            'Service', name, 2, 'PING CRITICAL', ['rta=5000ms;3000;5000'])
+        event = events.get(timeout=10)
+        self.assertEqual(event.object_name, name)
+        self.assertEqual(event.state, 2)
+        self.assertEqual(event.check_result.perfdata[0].value, 5000.0)
+        service = self.client.objects.get('Service', name, attrs=['state'])
+        self.assertEqual(service['attrs']['state'], 2)
+
+    def test_status(self):
+        self.assertTrue(self.client.status.list()['results'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the request metrics against the fake API server
+'''
+
+import unittest
+
+from icinga2api.client import Client
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.fakeserver import FakeIcinga2Server
+from icinga2api.instrumentation import MetricsCollector, PrometheusExporter
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIcinga2Server(hosts=5, services_per_host=2)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.metrics = MetricsCollector()
+        self.client = Client(self.server.url, 'root', 'icinga',
+                             hooks=[self.metrics])
+
+    def test_counts_requests_by_api_path(self):
+        self.client.objects.list('Host')
+        for number in range(3):
+            self.client.objects.get(
+                'Host', 'host{0:06d}.example.com'.format(number))
+        with self.assertRaises(Icinga2ApiException):
+            self.client.objects.get('Host', 'missing.example.com')
+        self.client.actions.process_check_result(
+            'Host', 'host000000.example.com', 0, 'UP')
+
+        endpoint, = self.metrics.stats().values()
+        paths = endpoint['paths']
+        self.assertEqual(sorted(paths), ['v1/actions/process-check-result',
+                                         'v1/objects/hosts'])
+        hosts = paths['v1/objects/hosts']
+        self.assertEqual(hosts['requests'], {'GET 200': 4, 'GET 404': 1})
+        self.assertEqual(hosts['latency']['total']['count'], 5)
+        self.assertEqual(
+            paths['v1/actions/process-check-result']['requests'],
+            {'POST 200': 1})
+
+    def test_prometheus_labels(self):
+        self.client.objects.get('Host', 'host000000.example.com')
+        text = PrometheusExporter(self.metrics).render()
+        self.assertIn(
+            'icinga2api_requests_total{{endpoint="{0}",method="GET",'
+            'path="v1/objects/hosts",status="200"}} 1'.format(
+                self.server.url), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the metrics sinks
+'''
+
+import os
+import unittest
+
+from requests.adapters import HTTPAdapter
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.fakeserver import FakeIcinga2Server
+from icinga2api.metrics import InfluxSink, Point
+
+
+class InfluxSinkTest(unittest.TestCase):
+
+    def test_passes_verify_with_every_request(self):
+        sent = []
+        send = HTTPAdapter.send
+
+        def record(adapter, request, **kwargs):
+            sent.append(kwargs.get('verify'))
+            return send(adapter, request, **kwargs)
+
+        os.environ['REQUESTS_CA_BUNDLE'] = '/nonexistent/ca.pem'
+        self.addCleanup(os.environ.pop, 'REQUESTS_CA_BUNDLE', None)
+        HTTPAdapter.send = record
+        self.addCleanup(setattr, HTTPAdapter, 'send', send)
+        with FakeIcinga2Server(hosts=1) as server:
+            sink = InfluxSink(server.url, 'icinga2', verify=False)
+            # the fake server has no write endpoint
+            with self.assertRaises(Icinga2ApiException):
+                sink.write([Point('web01', 'ping4', 'rta', 0.5, 1500000000)])
+            sink.close()
+        self.assertEqual(sent, [False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the object mirror against the fake API server
+'''
+
+import threading
+import time
+import unittest
+
+from icinga2api.client import Client
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.fakeserver import FakeIcinga2Server
+from icinga2api.mirror import ObjectMirror
+from tests import wait_for
+
+HOST = 'host000001.example.com'
+
+
+class MirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIcinga2Server(hosts=10, services_per_host=2)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.client = Client(self.server.url, 'root', 'icinga')
+        self.mirror = ObjectMirror(self.client, resync_delay=0.1)
+        self.addCleanup(self.mirror.stop, 0)
+
+    def test_start_subscribes_before_seeding(self):
+        subscribers = []
+        iter_list = self.client.objects.iter_list
+
+        def record(*args, **kwargs):
+            subscribers.append(self.server.stats()['subscribers'])
+            return iter_list(*args, **kwargs)
+        self.client.objects.iter_list = record
+        self.mirror.start()
+        self.assertEqual(subscribers, [1, 1])
+        stats = self.mirror.stats()
+        self.assertEqual((stats['hosts'], stats['services']), (10, 20))
+        self.assertEqual(stats['resyncs'], 0)
+
+    def test_applies_events(self):
+        self.mirror.start()
+        name = HOST + '!ping4'
+        self.client.actions.process_check_result(
+            'Service', name, 2, 'PING CRITICAL')
+        wait_for(lambda: self.mirror.get('Service', name)['attrs']['state']
+                 == 2)
+        self.assertEqual(
+            [result['name'] for result in
+             self.mirror.query('Service', state=2)], [name])
+
+    def test_counts_only_triggered_downtimes(self):
+        self.mirror.start()
+        name = HOST + '!ping4'
+
+        def publish(event_type, trigger_time):
+            self.server.publish({'type': event_type,
+                                 'timestamp': time.time(),
+                                 'downtime': {'host_name': HOST,
+                                              'service_name': 'ping4',
+                                              'trigger_time': trigger_time}})
+
+        def depth():
+            return self.mirror.get('Service', name)['attrs'].get(
+                'downtime_depth')
+
+        # a flexible downtime removed before it was triggered, the mirror
+        # does not subscribe to DowntimeStarted
+        publish('DowntimeStarted', 0)
+        publish('DowntimeRemoved', 0)
+        wait_for(lambda: self.mirror.stats()['events'] == 1)
+        self.assertFalse(depth())
+        publish('DowntimeTriggered', 1500000000)
+        wait_for(lambda: depth() == 1)
+        publish('DowntimeRemoved', 1500000000)
+        wait_for(lambda: depth() == 0)
+
+    def test_fetches_created_objects_outside_the_lock(self):
+        self.mirror.start()
+        locked = []
+        get = self.client.objects.get
+
+        def record(*args, **kwargs):
+            def try_lock():
+                if self.mirror._lock.acquire(False):
+                    self.mirror._lock.release()
+                    locked.append(False)
+                else:
+                    locked.append(True)
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            return get(*args, **kwargs)
+        self.client.objects.get = record
+
+        self.client.objects.create('Host', 'created.example.com',
+                                   attrs={'address': '192.0.2.1'})
+        self.server.publish({'type': 'ObjectCreated',
+                             'timestamp': time.time(),
+                             'object_type': 'Host',
+                             'object_name': 'created.example.com'})
+        wait_for(lambda: self.mirror.get('Host', 'created.example.com'))
+        self.assertEqual(locked, [False])
+
+        self.server.publish({'type': 'ObjectDeleted',
+                             'timestamp': time.time(),
+                             'object_type': 'Host',
+                             'object_name': 'created.example.com'})
+        wait_for(lambda: not self.mirror.get('Host', 'created.example.com'))
+
+    def test_start_raises_when_the_api_is_down(self):
+        self.server.stop()
+        mirror = ObjectMirror(self.client, resync_delay=0.1)
+        self.addCleanup(mirror.stop, 1)
+        with self.assertRaises(Icinga2ApiException):
+            mirror.start(timeout=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the subscription multiplexer against the fake API server
+'''
+
+import asyncio
+import unittest
+
+from icinga2api.fakeserver import FakeIcinga2Server
+
+try:
+    from icinga2api.asyncclient import AsyncClient
+    from icinga2api.multiplex import SubscriptionManager
+except ImportError:
+    AsyncClient = None
+
+
+@unittest.skipIf(AsyncClient is None, 'aiohttp is not installed')
+class MultiplexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIcinga2Server(hosts=10, services_per_host=2,
+                                        event_burst=40)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def run_client(self, test):
+        async def run():
+            async with AsyncClient(self.server.url, 'root', 'icinga') \
+                    as client:
+                return await test(client)
+        return asyncio.run(asyncio.wait_for(run(), 30))
+
+    def test_run_does_not_stall_on_uniterated_subscriptions(self):
+        async def test(client):
+            manager = SubscriptionManager(client, queue_size=5,
+                                          reconnect=False)
+            seen = []
+            manager.add(['CheckResult'], callback=seen.append)
+            manager.add(['CheckResult'], name='queued')
+            await manager.run()
+            return seen, manager.stats()
+        seen, stats = self.run_client(test)
+        self.assertEqual(len(seen), 40)
+        self.assertEqual(stats['streams'], 1)
+        self.assertEqual(stats['dropped'], 40)
+        self.assertEqual(stats['subscriptions']['queued'], 0)
+
+    def test_iteration_delivers_every_event(self):
+        async def test(client):
+            manager = SubscriptionManager(client, queue_size=5,
+                                          reconnect=False)
+            manager.add(['CheckResult'], name='queued')
+            names = []
+            async for subscription, event in manager:
+                names.append(subscription.name)
+                await asyncio.sleep(0)
+            return names, manager.stats()
+        names, stats = self.run_client(test)
+        self.assertEqual(names, ['queued'] * 40)
+        self.assertEqual(stats['dropped'], 0)
+        self.assertEqual(stats['subscriptions']['queued'], 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
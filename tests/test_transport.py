@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the requests transport against the fake API server
+'''
+
+import os
+import socket
+import unittest
+
+from requests.adapters import HTTPAdapter
+
+from icinga2api.client import Client
+from icinga2api.exceptions import (
+    Icinga2ApiCircuitOpenException,
+    Icinga2ApiException
+)
+from icinga2api.fakeserver import FakeIcinga2Server
+from icinga2api.retry import CircuitBreaker, RetryPolicy
+
+
+def unused_url():
+    '''
+    return the URL of a port nothing listens on
+    '''
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return 'http://127.0.0.1:{0}/'.format(port)
+
+
+class TransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIcinga2Server(hosts=5, services_per_host=2)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def test_reuses_connections(self):
+        client = Client(self.server.url, 'root', 'icinga')
+        for _ in range(3):
+            self.assertEqual(len(client.objects.list('Host')), 5)
+        stats = client.transport.stats()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['new_connections'], 1)
+
+    def test_error_status_raises(self):
+        client = Client(self.server.url, 'root', 'icinga')
+        with self.assertRaises(Icinga2ApiException):
+            client.objects.get('Host', 'missing.example.com')
+
+    def test_fails_over_to_the_next_endpoint(self):
+        client = Client([unused_url(), self.server.url], 'root', 'icinga')
+        for _ in range(4):
+            self.assertEqual(len(client.objects.list('Host')), 5)
+        self.assertGreaterEqual(client.transport.stats()['failovers'], 1)
+
+    def test_retries_injected_errors(self):
+        self.server.stop()
+        server = FakeIcinga2Server(hosts=5, error_rate=0.5, seed=1)
+        server.start()
+        self.addCleanup(server.stop)
+        client = Client(server.url, 'root', 'icinga',
+                        retry_policy=RetryPolicy(retries=10,
+                                                 backoff_factor=0))
+        for _ in range(10):
+            self.assertEqual(len(client.objects.list('Host')), 5)
+
+    def test_application_errors_keep_the_circuit_closed(self):
+        client = Client(self.server.url, 'root', 'icinga',
+                        circuit_breaker=CircuitBreaker(failure_threshold=5))
+        bulk = client.objects.bulk(
+            [{'object_type': 'Host', 'name': 'host000000.example.com',
+              'attrs': {'address': '192.0.2.1'}}] * 5)
+        self.assertEqual(len(bulk.failed), 5)
+        self.assertEqual(client.transport.circuit_breaker.stats()['state'],
+                         CircuitBreaker.CLOSED)
+        self.assertEqual(len(client.objects.list('Host')), 5)
+
+    def test_application_errors_keep_the_endpoint_up(self):
+        client = Client(self.server.url, 'root', 'icinga')
+        with self.assertRaises(Icinga2ApiException):
+            client.objects.create('Host', 'host000000.example.com',
+                                  attrs={'address': '192.0.2.1'})
+        endpoint, = client.transport.endpoints.stats()
+        self.assertTrue(endpoint['available'])
+        self.assertEqual(endpoint['errors'], 0)
+
+    def test_marks_endpoints_down_after_consecutive_failures(self):
+        down = unused_url()
+        client = Client([down, self.server.url], 'root', 'icinga',
+                        balancing='least-latency')
+        available = []
+        for _ in range(3):
+            client.objects.list('Host')
+            available.append(client.transport.endpoints.stats()[0]
+                             ['available'])
+        self.assertEqual(available, [True, True, False])
+
+    def test_unavailable_endpoint_opens_the_circuit(self):
+        client = Client(unused_url(), 'root', 'icinga',
+                        circuit_breaker=CircuitBreaker(failure_threshold=2))
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                client.objects.list('Host')
+        with self.assertRaises(Icinga2ApiCircuitOpenException):
+            client.objects.list('Host')
+
+    def test_passes_verify_with_every_request(self):
+        sent = []
+        send = HTTPAdapter.send
+
+        def record(adapter, request, **kwargs):
+            sent.append(kwargs.get('verify'))
+            return send(adapter, request, **kwargs)
+
+        os.environ['REQUESTS_CA_BUNDLE'] = '/nonexistent/ca.pem'
+        self.addCleanup(os.environ.pop, 'REQUESTS_CA_BUNDLE', None)
+        HTTPAdapter.send = record
+        self.addCleanup(setattr, HTTPAdapter, 'send', send)
+        client = Client(self.server.url, 'root', 'icinga')
+        client.objects.list('Host')
+        client.transport.check_endpoints()
+        self.assertEqual(sent, [False, False])
+
+
+if __name__ == '__main__':
+    unittest.main()